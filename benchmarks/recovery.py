@@ -0,0 +1,115 @@
+# benchmarks/recovery.py
+"""
+Проверки восстановления:
+
+  - журнал после сбоя во время записи: в конец data/<таблица>.log
+    дописывается недописанная строка (обычная запись и пачка транзакции),
+    после чего таблица меняется и перечитывается. Недописанная строка
+    должна быть отброшена, а новые записи — читаться;
+  - откат транзакции: после begin, insert, загрузки других таблиц
+    (с вытеснением из буфера) и rollback db_meta.json не должен измениться.
+
+    python benchmarks/recovery.py                 # код возврата 1 при ошибке
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from run import ROOT
+
+# недописанные хвосты журнала: обрыв внутри записи и внутри пачки
+PARTIAL_LINES = [
+    b'{"op": "insert", "row": {"ID": 2, "x"',
+    b'{"op": "batch", "records": [{"op": "delete", "ids": [1]}',
+]
+
+
+def check(partial: bytes) -> str | None:
+    """Сбой с хвостом partial; None — журнал восстановился, иначе ошибка."""
+    sys.path.insert(0, str(ROOT))
+    from src.primitive_db import utils
+    from src.primitive_db.table import TableData
+
+    schema = {"ID": "int", "x": "int"}
+    table = TableData(schema, name="t")
+    table.append_row({"ID": 1, "x": 10})
+    utils.save_table_data("t", table)
+
+    with utils.log_path("t").open("ab") as f:
+        f.write(partial)
+
+    table = utils.load_table_data("t", {"columns": schema})
+    table.append_row({"ID": 3, "x": 30})
+    utils.save_table_data("t", table)
+
+    try:
+        rows = list(utils.load_table_data("t", {"columns": schema}))
+    except ValueError as e:
+        return f"журнал не читается: {e}"
+    expected = [{"ID": 1, "x": 10}, {"ID": 3, "x": 30}]
+    if rows != expected:
+        return f"ожидалось {expected}, прочитано {rows}"
+    return None
+
+
+def check_rollback() -> str | None:
+    """
+    Вытеснение других таблиц во время транзакции не должно записывать
+    её изменения метаданных (счётчик ID, статистику) до commit.
+    """
+    sys.path.insert(0, str(ROOT))
+    from src.primitive_db import engine
+    from src.primitive_db.buffer import TableBuffer
+
+    # пакетный режим: изменения копятся в памяти, бюджет — одна таблица
+    buffer = TableBuffer(memory_budget=1, flush_every=0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name in ("a", "b", "c"):
+            engine.execute(f"create_table {name} n:int", buffer)
+            engine.execute(f"insert into {name} values (1), (2)", buffer)
+        buffer.flush_all()
+        before = Path(engine.META_FILE).read_bytes()
+
+        engine.execute("insert into b values (3)", buffer)
+        engine.execute("begin", buffer)
+        engine.execute("insert into a values (3), (4)", buffer)
+        engine.execute("select from b", buffer)
+        engine.execute("select from c", buffer)
+        during = Path(engine.META_FILE).read_bytes()
+        engine.execute("rollback", buffer)
+    if during != before:
+        return "db_meta.json изменился до commit"
+    return None
+
+
+def in_tempdir(check_func, *args) -> str | None:
+    with tempfile.TemporaryDirectory(prefix="primitive_db_recovery_") as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            return check_func(*args)
+        finally:
+            os.chdir(cwd)
+
+
+def main() -> int:
+    results = [
+        (f"{partial.decode()[:40]}...", in_tempdir(check, partial))
+        for partial in PARTIAL_LINES
+    ]
+    results.append(("rollback после вытеснения", in_tempdir(check_rollback)))
+
+    failed = False
+    for name, error in results:
+        status = "ok" if error is None else f"ОШИБКА: {error}"
+        print(f"{name}: {status}")
+        failed = failed or error is not None
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,449 @@
+# benchmarks/run.py
+"""
+Замеры путей хранения и запросов на синтетических таблицах.
+
+    python benchmarks/run.py                      # 10^3..10^5 строк, сравнение
+                                                  # с benchmarks/baseline.json
+    python benchmarks/run.py --sizes 3-7          # 10^3..10^7 строк
+    python benchmarks/run.py --save-baseline      # записать новую базу
+
+Таблица на N строк содержит столбцы всех типов ALLOWED_TYPES
+(ID:int, n:int, s:str, b:bool). Каждый размер меряется в двух свежих
+процессах во временном каталоге: «build» (вставка, запись снимков)
+и «query» (холодная и тёплая загрузка, select, update, delete),
+поэтому пиковая память (ru_maxrss) и холодная загрузка не зависят
+от предыдущих замеров. Результаты пишутся в JSON и сравниваются
+с базой: метрика хуже базы больше чем на порог — регрессия,
+и код возврата 1. Сеть не нужна.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+RESULTS = Path(__file__).resolve().parent / "results.json"
+
+# порог регрессии по умолчанию: на сколько метрика может быть хуже базы
+THRESHOLD = 0.3
+
+# разница меньше этой не считается регрессией (шум коротких замеров)
+NOISE = {"_ms": 1.0, "_mb": 4.0}
+
+# строк в одном insert_many при заполнении таблицы
+BATCH = 10_000
+
+# сколько строк вставляется по одной (insert) для замера одиночной вставки
+SINGLE_INSERTS = 1_000
+
+SEED = 42
+META_FILE = "db_meta.json"
+COLUMNS = ["n:int", "s:str", "b:bool"]
+
+
+def _import_db():
+    """Модули БД из src/ (как в pyproject: src.primitive_db)."""
+    sys.path.insert(0, str(ROOT))
+    from src.primitive_db import core, durability, utils
+    from src.primitive_db.decorators import set_auto_confirm
+    from src.primitive_db.predicates import parse_where, tokenize
+
+    set_auto_confirm(True)
+
+    def where(text: str) -> tuple:
+        return parse_where(tokenize(text))[0]
+
+    return core, durability, utils, where
+
+
+def _rows(rows: int, rng: random.Random):
+    """Строки таблицы пачками по BATCH: [n, s, b] без ID."""
+    distinct = max(rows // 10, 1)
+    for start in range(0, rows, BATCH):
+        yield [
+            [rng.randrange(rows), f"s{rng.randrange(distinct)}", rng.random() < 0.5]
+            for _ in range(min(BATCH, rows - start))
+        ]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _median_ms(samples: list[float]) -> float:
+    return statistics.median(samples) * 1000
+
+
+def calibrate(rounds: int = 5) -> float:
+    """
+    Время эталонной чистой Python-нагрузки (мс, медиана из rounds).
+    По отношению к эталону базы сравнение поправляется на скорость
+    машины: на общей или занятой машине всё медленнее в одно и то же
+    число раз, и это не регрессия.
+    """
+    rng = random.Random(SEED)
+    values = [rng.randrange(1 << 30) for _ in range(200_000)]
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        counts: dict = {}
+        for value in values:
+            key = f"k{value & 0xFFFF}"
+            counts[key] = counts.get(key, 0) + 1
+        sorted(values)
+        samples.append(time.perf_counter() - start)
+    return _median_ms(samples)
+
+
+# ===== замеры (выполняются в отдельных процессах) =====
+
+
+def build(rows: int, repeat: int) -> dict:
+    """Заполнение таблицы и запись снимков в обоих форматах."""
+    core, durability, utils, _ = _import_db()
+    rng = random.Random(SEED)
+    metadata: dict = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        core.create_table(metadata, "bench", COLUMNS)
+    table_data = core.TableData(metadata["bench"]["columns"], name="bench")
+
+    # скорость вставки — медиана по пачкам: одна медленная пачка
+    # (сборка мусора, соседи по машине) не портит весь замер
+    rates = []
+    for batch in _rows(rows, rng):
+        start = time.perf_counter()
+        core.insert_many(metadata, "bench", table_data, batch)
+        rates.append(len(batch) / (time.perf_counter() - start))
+
+    single_rates = []
+    for first in range(0, min(rows, SINGLE_INSERTS), 100):
+        start = time.perf_counter()
+        for i in range(first, min(first + 100, rows)):
+            core.insert(metadata, "bench", table_data, [i, f"s{i}", i % 2 == 0])
+        single_rates.append(
+            (min(first + 100, rows) - first) / (time.perf_counter() - start)
+        )
+
+    # журнал изменений: его запись — обычный путь сохранения после команды
+    start = time.perf_counter()
+    utils.LOG_COMPACT_THRESHOLD = float("inf")
+    utils.save_table_data("bench_log", table_data)
+    save_journal = time.perf_counter() - start
+    durability.flush_pending()
+
+    result = {
+        "insert_batch_rows_per_s": statistics.median(rates),
+        "insert_single_rows_per_s": statistics.median(single_rates),
+        "save_journal_ms": save_journal * 1000,
+    }
+    for fmt, suffix in (("json", "json"), ("binary", "bin")):
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            utils.write_snapshot(f"bench_{suffix}", table_data, fmt)
+            samples.append(time.perf_counter() - start)
+        result[f"snapshot_{suffix}_ms"] = _median_ms(samples)
+        result[f"file_{suffix}_mb"] = (
+            utils.snapshot_path(f"bench_{suffix}", fmt).stat().st_size / 2**20
+        )
+
+    for suffix, fmt in (("json", "json"), ("bin", "binary")):
+        metadata[f"bench_{suffix}"] = dict(metadata["bench"], format=fmt)
+    utils.save_metadata(META_FILE, metadata)
+    result["peak_rss_build_mb"] = _peak_rss_mb()
+    return result
+
+
+def query(rows: int, repeat: int) -> dict:
+    """Загрузка и запросы к таблицам, записанным build."""
+    core, _, utils, where = _import_db()
+    rng = random.Random(SEED + 1)
+    metadata = utils.load_metadata(META_FILE)
+    total = metadata["bench"]["sequence"]
+    result = {}
+
+    # холодная загрузка — первая в процессе, тёплая — повторная
+    # (файлы уже в кэше страниц ОС)
+    for suffix in ("json", "bin"):
+        name = f"bench_{suffix}"
+        start = time.perf_counter()
+        table_data = utils.load_table_data(name, metadata[name])
+        result[f"load_cold_{suffix}_ms"] = (time.perf_counter() - start) * 1000
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            utils.load_table_data(name, metadata[name])
+            samples.append(time.perf_counter() - start)
+        result[f"load_warm_{suffix}_ms"] = _median_ms(samples)
+
+    table_data = utils.load_table_data("bench_json", metadata["bench_json"])
+    width = max(rows // 100, 1)
+    distinct = max(rows // 10, 1)
+
+    def range_clause() -> str:
+        lo = rng.randrange(rows)
+        return f"n between {lo} and {lo + width}"
+
+    queries = {
+        "select_point_ms": lambda: f"ID = {rng.randint(1, total)}",
+        "select_eq_int_ms": lambda: f"n = {rng.randrange(rows)}",
+        "select_eq_str_ms": lambda: f's = "s{rng.randrange(distinct)}"',
+        "select_eq_bool_ms": lambda: f"b = {rng.choice(['true', 'false'])}",
+        "select_range_ms": range_clause,
+    }
+    for metric, make in queries.items():
+        samples = []
+        for _ in range(repeat):
+            clause = where(make())
+            # запрос меряется трижды без кэша результатов, берётся лучшее
+            # время: так меньше шума от планировщика ОС
+            runs = []
+            for _ in range(3):
+                core.select_cache.clear()
+                start = time.perf_counter()
+                core.select("bench_json", table_data, clause)
+                runs.append(time.perf_counter() - start)
+            samples.append(min(runs))
+        result[metric] = _median_ms(samples)
+
+    clause = where("n < 100")
+    core.select("bench_json", table_data, clause)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        core.select("bench_json", table_data, clause)
+        samples.append(time.perf_counter() - start)
+    result["select_cached_ms"] = _median_ms(samples)
+
+    # изменения: точечные по ID и по диапазону 1% строк
+    changes = {
+        "update_point_ms": lambda text: core.update(table_data, {"s": "x"}, text),
+        "update_range_ms": lambda text: core.update(table_data, {"b": True}, text),
+        "delete_point_ms": lambda text: core.delete(table_data, text),
+        "delete_range_ms": lambda text: core.delete(table_data, text),
+    }
+    for metric, change in changes.items():
+        samples = []
+        for _ in range(repeat):
+            if metric.endswith("point_ms"):
+                clause = where(f"ID = {rng.randint(1, total)}")
+            else:
+                clause = where(range_clause())
+            start = time.perf_counter()
+            change(clause)
+            samples.append(time.perf_counter() - start)
+        result[metric] = _median_ms(samples)
+
+    result["peak_rss_query_mb"] = _peak_rss_mb()
+    return result
+
+
+WORKERS = {"build": build, "query": query}
+
+
+def _run_worker(worker: str, rows: int, repeat: int, workdir: Path) -> dict:
+    out = workdir / f"{worker}.json"
+    subprocess.run(
+        [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "--worker", worker,
+            "--rows", str(rows),
+            "--repeat", str(repeat),
+            "--out", str(out),
+        ],
+        cwd=workdir,
+        check=True,
+    )
+    return json.loads(out.read_text(encoding="utf-8"))
+
+
+def run_size(rows: int, repeat: int) -> dict:
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        workdir = Path(tmp)
+        result = _run_worker("build", rows, repeat, workdir)
+        result.update(_run_worker("query", rows, repeat, workdir))
+    return {name: round(value, 3) for name, value in sorted(result.items())}
+
+
+# ===== сравнение с базой =====
+
+
+def _lower_is_better(metric: str) -> bool:
+    return not metric.endswith("_per_s")
+
+
+def compare(results: dict, baseline: dict) -> list[dict]:
+    """
+    Сравнивает метрики с базой по размерам, которые есть в обоих.
+    Возвращает строки сравнения; regression=True — хуже базы больше порога.
+    """
+    thresholds = baseline.get("thresholds", {})
+    # во сколько раз эта машина сейчас медленнее, чем при записи базы
+    base_calibration = baseline["meta"].get("calibration_ms")
+    calibration = results["meta"].get("calibration_ms")
+    slowdown = calibration / base_calibration if base_calibration else 1.0
+    rows = []
+    for size, metrics in results["results"].items():
+        base_metrics = baseline["results"].get(size)
+        if base_metrics is None:
+            continue
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if base is None:
+                continue
+            threshold = thresholds.get(metric, thresholds.get("default", THRESHOLD))
+            if metric.endswith("_ms"):
+                base *= slowdown
+            elif metric.endswith("_per_s"):
+                base /= slowdown
+            if _lower_is_better(metric):
+                change = (value - base) / base if base else 0.0
+                noise = next(
+                    (v for suffix, v in NOISE.items() if metric.endswith(suffix)), 0.0
+                )
+                regression = change > threshold and value - base > noise
+            else:
+                change = (base - value) / base if base else 0.0
+                regression = change > threshold
+            rows.append({
+                "rows": size,
+                "metric": metric,
+                "value": value,
+                "baseline": round(base, 3),
+                "worse_by": round(change, 3),
+                "regression": regression,
+            })
+    return rows
+
+
+def print_comparison(rows: list[dict]) -> None:
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = ["строк", "метрика", "значение", "база", "хуже на", ""]
+    table.align = "r"
+    for row in rows:
+        table.add_row([
+            row["rows"],
+            row["metric"],
+            row["value"],
+            row["baseline"],
+            f"{row['worse_by']:+.0%}",
+            "РЕГРЕССИЯ" if row["regression"] else "",
+        ])
+    print(table)
+
+
+def parse_sizes(text: str) -> list[int]:
+    """"3-5" -> [10^3, 10^4, 10^5]; "1000,50000" -> как есть."""
+    if "-" in text:
+        lo, hi = text.split("-", 1)
+        return [10 ** power for power in range(int(lo), int(hi) + 1)]
+    return [int(size) for size in text.split(",")]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры primitive_db.")
+    parser.add_argument(
+        "--sizes",
+        default="3-5",
+        help='размеры таблиц: степени десяти "3-7" или список "1000,20000"',
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="повторов замера (берётся медиана)"
+    )
+    parser.add_argument("--output", default=str(RESULTS), help="файл результатов")
+    parser.add_argument("--baseline", default=str(BASELINE), help="файл базы")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="записать результаты как новую базу вместо сравнения",
+    )
+    # внутренние параметры процесса-замера
+    parser.add_argument("--worker", choices=WORKERS, help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.worker is not None:
+        result = WORKERS[args.worker](args.rows, args.repeat)
+        Path(args.out).write_text(json.dumps(result), encoding="utf-8")
+        return 0
+
+    results = {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    # эталон меряется до и после каждого размера: скорость общей машины
+    # меняется со временем, медиана ближе к условиям самих замеров
+    calibrations = [calibrate()]
+    for rows in parse_sizes(args.sizes):
+        print(f"Замер на {rows} строк...", flush=True)
+        results["results"][str(rows)] = run_size(rows, args.repeat)
+        calibrations.append(calibrate())
+    results["meta"]["calibration_ms"] = round(statistics.median(calibrations), 3)
+
+    Path(args.output).write_text(
+        json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+    print(f"Результаты записаны в {args.output}.")
+
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        thresholds = {"default": THRESHOLD}
+        if baseline_path.exists():
+            old = json.loads(baseline_path.read_text(encoding="utf-8"))
+            thresholds = old.get("thresholds", thresholds)
+        results["thresholds"] = thresholds
+        baseline_path.write_text(
+            json.dumps(results, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+        )
+        print(f"База записана в {baseline_path}.")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"Базы {baseline_path} нет: сравнивать не с чем (--save-baseline).")
+        return 0
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    rows = compare(results, baseline)
+    print_comparison(rows)
+    base_calibration = baseline["meta"].get("calibration_ms")
+    if base_calibration:
+        slowdown = results["meta"]["calibration_ms"] / base_calibration
+        print(f"База поправлена на скорость машины: x{slowdown:.2f}.")
+    regressions = [row for row in rows if row["regression"]]
+    if regressions:
+        print(f"Регрессий: {len(regressions)}.")
+        return 1
+    print("Регрессий нет.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
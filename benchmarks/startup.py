@@ -0,0 +1,129 @@
+# benchmarks/startup.py
+"""
+Бюджет запуска database: `database -c` запускается с `python -X importtime`
+в свежем процессе, и проверяются две вещи:
+
+  - время импорта модулей БД (вместе со стандартными модулями, которые
+    они тянут) не больше STARTUP_BUDGET_MS — бюджет поправляется
+    на скорость машины по эталону из benchmarks/baseline.json;
+  - тяжёлые модули из LAZY_MODULES не импортируются вовсе: они нужны
+    только своим командам (вывод таблицей, интерактивный режим,
+    параллельный просмотр, сервер, import).
+
+    python benchmarks/startup.py                  # код возврата 1 при нарушении
+    python benchmarks/startup.py --runs 20 --budget-ms 80
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from run import BASELINE, ROOT, calibrate
+
+# бюджет импорта на машине со скоростью эталона базы, мс
+STARTUP_BUDGET_MS = 60.0
+
+# команда, которой меряется запуск: не печатает таблицу и не трогает данные
+COMMAND = "list_tables"
+
+# модули, которых не должно быть в процессе `database -c COMMAND`
+LAZY_MODULES = [
+    "prettytable",
+    "prompt",
+    "multiprocessing",
+    "concurrent.futures",
+    "asyncio",
+    "csv",
+    "tempfile",
+]
+
+
+def import_times(workdir: Path) -> dict[str, int]:
+    """
+    Запускает `database -c COMMAND` с -X importtime.
+    Возвращает {модуль: накопленное время импорта, мкс} для всех модулей,
+    импортированных процессом.
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    # установленный пакет запускается из готового байт-кода (.pyc)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "src.primitive_db.main",
+         "-c", COMMAND],
+        cwd=workdir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            # отступ имени — глубина вложенности импорта
+            times[name.rstrip()] = int(cumulative)
+    return times
+
+
+def project_ms(times: dict[str, int]) -> float:
+    """Время импортов верхнего уровня из пакета src (мс)."""
+    return sum(
+        value for name, value in times.items()
+        if name.startswith(" src") and not name.startswith("  ")
+    ) / 1000
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10, help="сколько запусков")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=STARTUP_BUDGET_MS,
+        help="бюджет импорта на машине со скоростью эталона базы, мс",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    samples, imported = [], set()
+    with tempfile.TemporaryDirectory(prefix="primitive_db_startup_") as tmp:
+        # первый запуск только записывает .pyc и не считается
+        import_times(Path(tmp))
+        for _ in range(args.runs):
+            times = import_times(Path(tmp))
+            samples.append(project_ms(times))
+            imported.update(name.strip() for name in times)
+    startup = statistics.median(samples)
+
+    budget = args.budget_ms
+    if BASELINE.exists():
+        base = json.loads(BASELINE.read_text(encoding="utf-8"))
+        base_calibration = base["meta"].get("calibration_ms")
+        if base_calibration:
+            budget *= calibrate() / base_calibration
+
+    print(f"Импорт модулей БД: {startup:.1f} мс (медиана из {args.runs}), "
+          f"бюджет {budget:.1f} мс.")
+    failed = False
+    if startup > budget:
+        print("Бюджет запуска превышен.")
+        failed = True
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"При запуске импортируются тяжёлые модули: {', '.join(eager)}.")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
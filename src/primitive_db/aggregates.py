@@ -0,0 +1,125 @@
+# src/primitive_db/aggregates.py
+
+# Элемент списка select: (функция, столбец).
+#   ("count", None)     — count(*)
+#   ("sum"|"avg"|"min"|"max"|"count", столбец)
+#   ("column", столбец) — столбец группировки
+AGGREGATES = {"count", "sum", "min", "max", "avg"}
+
+# типы столбцов, для которых имеют смысл sum и avg
+_NUMERIC = {"int", "bool"}
+
+
+def label(item: tuple) -> str:
+    """Заголовок столбца результата: count(*), sum(age), name."""
+    func, column = item
+    if func == "column":
+        return column
+    return f"{func}({column or '*'})"
+
+
+def check_items(items: list[tuple], schema: dict[str, str], group_by=None) -> None:
+    """
+    Проверяет список select по схеме. Неизвестный столбец — KeyError,
+    неподходящий тип или столбец вне group by — ValueError.
+    """
+    if group_by is not None and group_by not in schema:
+        raise KeyError(group_by)
+    for func, column in items:
+        if column is None:
+            continue
+        if column not in schema:
+            raise KeyError(column)
+        if func == "column" and column != group_by:
+            raise ValueError(f"Столбец {column} должен быть в group by.")
+        if func in ("sum", "avg") and schema[column] not in _NUMERIC:
+            raise ValueError(f"{func} применим только к числам, а {column} — "
+                             f"{schema[column]}")
+
+
+def stats_answerable(items: list[tuple], schema: dict[str, str]) -> bool:
+    """Можно ли ответить по статистике таблицы, не читая строк."""
+    for func, column in items:
+        if func == "count":
+            continue
+        if func not in ("min", "max") or schema.get(column) != "int":
+            return False
+    return True
+
+
+def from_stats(items: list[tuple], stats: dict) -> dict:
+    """Строка результата по статистике таблицы (count, min/max int-столбцов)."""
+    row = {}
+    for item in items:
+        func, column = item
+        if func == "count":
+            row[label(item)] = stats["rows"]
+        else:
+            row[label(item)] = stats[func].get(column)
+    return row
+
+
+def aggregate(
+    table_data, items: list[tuple], positions, group_by: str | None = None
+) -> list[dict]:
+    """
+    Считает агрегаты за один проход по позициям строк.
+    Для каждой группы (ключ — значение столбца group_by) хранится
+    число строк и по каждому нужному столбцу [сумма, минимум, максимум].
+    Результат — строки в порядке первого появления групп.
+    """
+    columns = sorted({
+        column for func, column in items
+        if func not in ("count", "column") and column is not None
+    })
+    arrays = [table_data.columns[column] for column in columns]
+    sums = [table_data.schema[column] in _NUMERIC for column in columns]
+    keys = table_data.columns[group_by] if group_by is not None else None
+
+    groups: dict = {}
+    for pos in positions:
+        key = keys[pos] if keys is not None else None
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = [0, [[0, None, None] for _ in columns]]
+        state[0] += 1
+        for values, acc, summable in zip(arrays, state[1], sums):
+            value = values[pos]
+            if summable:
+                acc[0] += value
+            if acc[1] is None or value < acc[1]:
+                acc[1] = value
+            if acc[2] is None or value > acc[2]:
+                acc[2] = value
+
+    if not groups and group_by is None:
+        # агрегаты пустой выборки без группировки — одна строка
+        groups[None] = [0, [[0, None, None] for _ in columns]]
+
+    is_bool = {
+        column: table_data.schema[column] == "bool"
+        for column in [*columns, group_by] if column is not None
+    }
+    result = []
+    for key, (count, accs) in groups.items():
+        by_column = dict(zip(columns, accs))
+        row = {}
+        for item in items:
+            func, column = item
+            if func == "count":
+                value = count
+            elif func == "column":
+                value = bool(key) if is_bool[column] else key
+            else:
+                total, low, high = by_column[column]
+                if func == "sum":
+                    value = total
+                elif func == "avg":
+                    value = total / count if count else None
+                else:
+                    value = low if func == "min" else high
+                    if value is not None and is_bool[column]:
+                        value = bool(value)
+            row[label(item)] = value
+        result.append(row)
+    return result
@@ -0,0 +1,160 @@
+# src/primitive_db/binary.py
+
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+from .durability import atomic_open
+from .table import TableData
+
+# Формат файла data/<таблица>.bin:
+#   заголовок (HEADER): магия, версия, число строк, длина описания схемы;
+#   описание схемы (JSON): столбцы, их типы, смещения и размеры блоков,
+#   а также min/max int-столбцов (чтобы не считать их при открытии);
+#   блоки столбцов, выровненные по 8 байт:
+#     int  — row_count * 8 байт (array('q'));
+#     bool — row_count байт;
+#     str  — (row_count + 1) смещений по 8 байт и затем строки в UTF-8.
+MAGIC = b"PDB1"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQI")
+
+
+class MappedStrings:
+    """
+    Строковый столбец, читаемый прямо из отображённого файла.
+    Строка декодируется только при обращении к ней.
+    """
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, pos: int) -> str:
+        if pos < 0:
+            pos += len(self)
+        start, stop = self.offsets[pos], self.offsets[pos + 1]
+        return str(self.blob[start:stop], "utf-8")
+
+    def __iter__(self):
+        for pos in range(len(self)):
+            yield self[pos]
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
+
+
+def _column_blocks(data: TableData) -> dict[str, list[bytes]]:
+    """Готовит байты блоков каждого столбца."""
+    blocks: dict[str, list[bytes]] = {}
+    for name, type_name in data.schema.items():
+        column = data.columns[name]
+        if type_name == "int":
+            blocks[name] = [array("q", column).tobytes()]
+        elif type_name == "bool":
+            blocks[name] = [bytes(column)]
+        else:
+            encoded = [value.encode("utf-8") for value in column]
+            offsets = array("q", [0])
+            total = 0
+            for item in encoded:
+                total += len(item)
+                offsets.append(total)
+            blocks[name] = [offsets.tobytes(), b"".join(encoded)]
+    return blocks
+
+
+def write_binary(path: Path, data: TableData) -> None:
+    """
+    Записывает таблицу в двоичный формат.
+    Файл пишется во временный и затем подменяется целиком, поэтому
+    уже открытые через mmap копии продолжают видеть старые данные.
+    """
+    blocks = _column_blocks(data)
+    stats = data.stats()
+
+    # размер описания схемы зависит от смещений, а смещения — от размера
+    # описания, поэтому считаем до тех пор, пока размер не перестанет меняться
+    schema_len = 0
+    while True:
+        offset = _align(HEADER.size + schema_len)
+        columns = []
+        for name, type_name in data.schema.items():
+            sizes = [len(part) for part in blocks[name]]
+            columns.append(
+                {"name": name, "type": type_name, "offset": offset, "sizes": sizes}
+            )
+            offset = _align(offset + sum(sizes))
+        layout = json.dumps(
+            {
+                "byteorder": sys.byteorder,
+                "ids_sorted": data.ids_sorted,
+                "stats": {"min": stats["min"], "max": stats["max"]},
+                "columns": columns,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        if len(layout) == schema_len:
+            break
+        schema_len = len(layout)
+
+    with atomic_open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(data), len(layout)))
+        f.write(layout)
+        for column in columns:
+            f.write(b"\0" * (column["offset"] - f.tell()))
+            for part in blocks[column["name"]]:
+                f.write(part)
+
+
+def open_binary(
+    path: Path, schema: dict[str, str] | None = None, name: str = ""
+) -> TableData:
+    """
+    Открывает двоичную таблицу через mmap. Столбцы не читаются
+    целиком: страницы файла подгружаются по мере обращения к ним.
+    """
+    with path.open("rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, _, row_count, layout_len = HEADER.unpack_from(mapped, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Файл {path} не является таблицей в двоичном формате.")
+
+    layout = json.loads(mapped[HEADER.size:HEADER.size + layout_len])
+    if layout["byteorder"] != sys.byteorder:
+        raise ValueError(f"Файл {path} записан с другим порядком байт.")
+
+    view = memoryview(mapped)
+    columns = {}
+    file_schema = {}
+    for column in layout["columns"]:
+        col_name, type_name, offset = column["name"], column["type"], column["offset"]
+        file_schema[col_name] = type_name
+        if type_name == "int":
+            columns[col_name] = view[offset:offset + row_count * 8].cast("q")
+        elif type_name == "bool":
+            columns[col_name] = view[offset:offset + row_count]
+        else:
+            offsets_size, blob_size = column["sizes"]
+            offsets = view[offset:offset + offsets_size].cast("q")
+            blob = view[offset + offsets_size:offset + offsets_size + blob_size]
+            columns[col_name] = MappedStrings(offsets, blob)
+
+    if schema is not None and schema != file_schema:
+        raise ValueError(f"Схема файла {path} не совпадает с метаданными.")
+
+    table_data = TableData.from_columns(file_schema, columns, row_count, name)
+    table_data.ids_sorted = layout["ids_sorted"]
+    # файлы без статистики (старые) посчитают её сами при первом запросе
+    table_data._stats = layout.get("stats")
+    # mmap должен жить, пока на него ссылаются столбцы таблицы
+    table_data.source = mapped
+    return table_data
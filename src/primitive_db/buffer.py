@@ -0,0 +1,434 @@
+# src/primitive_db/buffer.py
+
+import copy
+import os
+from collections import OrderedDict
+
+from .durability import flush_pending
+from .locks import TableLocks, metadata_lock
+from .table import TableData
+from .utils import (
+    compact_table,
+    load_metadata,
+    load_table_data,
+    save_metadata,
+    save_table_data,
+    table_files,
+)
+
+# сколько памяти (в байтах) могут занимать загруженные таблицы
+MEMORY_BUDGET = 256 * 1024 * 1024
+
+# после скольких изменений грязная таблица сбрасывается на диск;
+# 1 — запись сразу после каждой команды, 0 — только при flush_all()
+FLUSH_EVERY = 1
+
+
+def file_signature(paths) -> tuple:
+    """
+    Отпечаток файлов: (размер, время изменения) для каждого пути.
+    Если файл поменяли снаружи, отпечаток изменится.
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            signature.append(None)
+        else:
+            signature.append((stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+
+class TableBuffer:
+    """
+    Держит загруженные таблицы в памяти между командами.
+
+    Таблица перечитывается с диска, только если её файлы изменились
+    снаружи (сверяется отпечаток файлов) или поменялось её описание
+    в метаданных. Когда суммарный объём таблиц превышает memory_budget,
+    вытесняются давно не использованные. Изменения сбрасываются на диск
+    по политике отложенной записи: раз в flush_every изменений,
+    при вытеснении и при flush_all().
+    """
+
+    def __init__(
+        self,
+        memory_budget: int = MEMORY_BUDGET,
+        flush_every: int = FLUSH_EVERY
+    ):
+        self.memory_budget = memory_budget
+        self.flush_every = flush_every
+        # имя таблицы -> {"data", "meta", "signature", "dirty", "nbytes"}
+        self._tables: OrderedDict[str, dict] = OrderedDict()
+        self._metadata: dict | None = None
+        self._metadata_signature: tuple | None = None
+        self._metadata_path: str | None = None
+        self._metadata_dirty = False
+        # таблицы, чьи описания в метаданных изменены этим сеансом
+        self._metadata_changed: set[str] = set()
+        # при отложенной записи изменения живут в памяти дольше одной
+        # команды, и таблица остаётся заблокированной до сброса на диск
+        self.locks = TableLocks(keep_exclusive=flush_every != 1)
+        # открытая транзакция: {"tables": {имя: образ для отката},
+        # "metadata": копия метаданных, ...}; None — транзакции нет
+        self.transaction: dict | None = None
+
+    # ===== метаданные =====
+
+    def load_metadata(self, filepath: str) -> dict:
+        """Возвращает метаданные, перечитывая файл только при его изменении."""
+        self._metadata_path = filepath
+        if self._metadata_dirty:
+            return self._metadata
+        signature = file_signature([filepath])
+        if self._metadata is None or signature != self._metadata_signature:
+            self._metadata = load_metadata(filepath)
+            self._metadata_signature = signature
+        return self._metadata
+
+    def save_metadata(
+        self, filepath: str, metadata: dict, table_name: str | None = None
+    ) -> None:
+        """
+        Сразу записывает метаданные (изменения схемы таблицы table_name).
+
+        Файл метаданных общий для всех таблиц, а другие процессы могли
+        поменять в нём свои таблицы, поэтому под блокировкой он
+        перечитывается, и в него переносятся только описания таблиц,
+        изменённых этим сеансом. Без table_name файл пишется целиком.
+        """
+        if table_name is not None:
+            self._metadata_changed.add(table_name)
+        with metadata_lock():
+            if table_name is not None or self._metadata_changed:
+                on_disk = load_metadata(filepath)
+                for name in self._metadata_changed:
+                    if name in metadata:
+                        on_disk[name] = metadata[name]
+                    else:
+                        on_disk.pop(name, None)
+                # вызывающий держит ссылку на metadata: обновляем на месте
+                metadata.clear()
+                metadata.update(on_disk)
+            save_metadata(filepath, metadata)
+            self._metadata_signature = file_signature([filepath])
+        self._metadata = metadata
+        self._metadata_path = filepath
+        self._metadata_dirty = False
+        self._metadata_changed.clear()
+
+    def mark_metadata(self, filepath: str, metadata: dict, table_name: str) -> None:
+        """
+        Отмечает мелкое изменение метаданных таблицы (счётчик ID).
+        Оно записывается вместе с таблицей, при её сбросе на диск
+        (см. flush): один раз на сброс, а не на каждую отметку.
+        """
+        self._metadata = metadata
+        self._metadata_path = filepath
+        self._metadata_dirty = True
+        self._metadata_changed.add(table_name)
+
+    def _flush_metadata(self) -> None:
+        if self._metadata_dirty:
+            self.save_metadata(self._metadata_path, self._metadata)
+
+    def _table_stats(self, data: TableData, exact: bool = False) -> dict:
+        """
+        Статистика таблицы для её описания в метаданных, чтобы info
+        и простые агрегаты не загружали таблицу.
+        Если обновление или удаление сбросило min/max, они не
+        пересчитываются (это проход по всем int-столбцам), а в метаданных
+        остаются число записей и отметка "stale"; exact — пересчитать.
+        """
+        if exact or data.stats_known():
+            return data.stats()
+        return {"rows": len(data), "stale": True}
+
+    def _set_stats(self, table_name: str, stats: dict) -> None:
+        """Кладёт stats в описание таблицы (записываются _flush_metadata)."""
+        if self._metadata is None or self._metadata_path is None:
+            return
+        table_meta = self._metadata.get(table_name)
+        if table_meta is not None and table_meta.get("stats") != stats:
+            table_meta["stats"] = stats
+            self._metadata_dirty = True
+            self._metadata_changed.add(table_name)
+
+    def _write_table(
+        self, table_name: str, data: TableData, write, exact: bool = False
+    ) -> None:
+        """
+        Записывает таблицу функцией write между двумя записями метаданных.
+        Счётчик ID попадает на диск раньше данных (ID не выдаются
+        повторно), а статистика — только после них: иначе после сбоя
+        между записями она учитывала бы строки, которых на диске нет.
+        До записи данных изменившаяся статистика сохраняется как
+        {"stale": True} (ничего не известно), после — настоящая.
+        """
+        stats = self._table_stats(data, exact)
+        table_meta = (self._metadata or {}).get(table_name)
+        if table_meta is not None and table_meta.get("stats") != stats:
+            self._set_stats(table_name, {"stale": True})
+        self._flush_metadata()
+        write()
+        self._set_stats(table_name, stats)
+        self._flush_metadata()
+
+    def row_count(self, table_name: str, table_meta: dict | None) -> int:
+        """Число строк таблицы: из метаданных, если её нет в памяти."""
+        if table_name not in self._tables and table_meta is not None \
+                and "rows" in table_meta.get("stats", {}):
+            return table_meta["stats"]["rows"]
+        return len(self.get(table_name, table_meta))
+
+    def stats(self, table_name: str, table_meta: dict | None) -> dict:
+        """
+        Статистика таблицы (число строк, min/max int-столбцов).
+        Если таблицы нет в памяти, берётся из метаданных без загрузки;
+        устаревшая ("stale") пересчитывается по таблице (в метаданные
+        она попадёт при flush_all или свёртке).
+        """
+        if table_name not in self._tables and table_meta is not None \
+                and "stats" in table_meta and "stale" not in table_meta["stats"]:
+            return table_meta["stats"]
+        return self.get(table_name, table_meta).stats()
+
+    # ===== таблицы =====
+
+    def peek(self, table_name: str) -> TableData | None:
+        """Таблица, если она уже в памяти, без загрузки и сверки с диском."""
+        entry = self._tables.get(table_name)
+        return None if entry is None else entry["data"]
+
+    def get(self, table_name: str, table_meta: dict | None) -> TableData:
+        """
+        Возвращает таблицу из памяти или загружает её с диска.
+        """
+        entry = self._tables.get(table_name)
+        if entry is not None:
+            if not entry["dirty"] and (
+                file_signature(table_files(table_name)) != entry["signature"]
+                or _storage_key(table_meta) != _storage_key(entry["meta"])
+            ):
+                # файлы изменились снаружи — копия в памяти устарела
+                self.discard(table_name)
+                entry = None
+            elif table_meta is not None and table_meta.get("indexes", {}) != (
+                entry["meta"] or {}
+            ).get("indexes", {}):
+                entry["data"].build_indexes(table_meta.get("indexes", {}))
+                entry["meta"] = _copy_meta(table_meta)
+
+        if entry is None:
+            data = load_table_data(table_name, table_meta)
+            entry = {
+                "data": data,
+                "meta": _copy_meta(table_meta),
+                "signature": file_signature(table_files(table_name)),
+                "dirty": 0,
+                "nbytes": data.nbytes(),
+            }
+            self._tables[table_name] = entry
+            self._evict(keep=table_name)
+
+        self._tables.move_to_end(table_name)
+        return entry["data"]
+
+    def save(self, table_name: str) -> None:
+        """
+        Отмечает, что таблица изменилась, и сбрасывает её на диск,
+        когда накопилось flush_every изменений.
+        """
+        entry = self._tables.get(table_name)
+        if entry is None:
+            return
+        entry["dirty"] += 1
+        # изменения транзакции ждут commit
+        if (
+            self.flush_every
+            and entry["dirty"] >= self.flush_every
+            and self.transaction is None
+        ):
+            self.flush(table_name)
+        entry["nbytes"] = entry["data"].nbytes()
+        self._evict(keep=table_name)
+
+    def flush(
+        self, table_name: str, atomic: bool = False, exact: bool = False
+    ) -> None:
+        """
+        Записывает накопленные изменения таблицы на диск
+        (atomic — одной записью журнала, см. save_table_data;
+        exact — пересчитать устаревшую статистику, см. _table_stats).
+        """
+        entry = self._tables.get(table_name)
+        if entry is None or not entry["dirty"]:
+            return
+        data = entry["data"]
+        self._write_table(
+            table_name, data, lambda: save_table_data(table_name, data, atomic), exact
+        )
+        entry["dirty"] = 0
+        entry["signature"] = file_signature(table_files(table_name))
+
+    def compact(self, table_name: str, table_meta: dict | None) -> None:
+        """Сворачивает журнал в снимок вместе с несохранёнными изменениями."""
+        data = self.get(table_name, table_meta)
+        self._write_table(
+            table_name, data, lambda: compact_table(table_name, data), exact=True
+        )
+        entry = self._tables[table_name]
+        entry["dirty"] = 0
+        entry["signature"] = file_signature(table_files(table_name))
+
+    def flush_all(self) -> None:
+        """
+        Записывает на диск все накопленные изменения. Устаревшая
+        статистика таблиц в памяти здесь пересчитывается.
+        """
+        for table_name in list(self._tables):
+            self.flush(table_name, exact=True)
+        # таблицы без изменений: их данные уже на диске
+        metadata = self._metadata or {}
+        for table_name, entry in self._tables.items():
+            if "stale" in metadata.get(table_name, {}).get("stats", {}):
+                self._set_stats(table_name, entry["data"].stats())
+        self._flush_metadata()
+        # в групповом режиме checkpoint и выход ждут сброса на диск
+        flush_pending()
+        # всё записано — таблицы можно отдать другим процессам
+        self.locks.release_all()
+
+    def release_saved(self) -> None:
+        """
+        Отдаёт другим процессам таблицы без несохранённых изменений:
+        сброшенные вытеснением или import, а также только прочитанные.
+        Зовётся между командами — посреди команды таблица могла бы
+        измениться снаружи. Внутри транзакции блокировки держатся до её конца.
+        """
+        if self.transaction is not None:
+            return
+        for table_name in self.locks.held():
+            entry = self._tables.get(table_name)
+            if entry is None or not entry["dirty"]:
+                self.locks.release(table_name)
+
+    # ===== транзакции =====
+
+    def begin(self, metadata: dict) -> None:
+        """
+        Начинает транзакцию. Изменения таблиц до commit живут только
+        в памяти, изменённые таблицы остаются заблокированными.
+        """
+        if self.transaction is not None:
+            raise ValueError("Транзакция уже начата.")
+        self.transaction = {
+            "tables": {},
+            "metadata": copy.deepcopy(metadata),
+            "metadata_dirty": self._metadata_dirty,
+            "metadata_changed": set(self._metadata_changed),
+        }
+        self.locks.keep_exclusive = True
+
+    def touch(self, table_name: str) -> None:
+        """
+        Запоминает, как откатить таблицу, перед её первым изменением
+        в транзакции. Таблицу без несохранённых изменений откатить
+        просто — перечитать с диска, копия нужна только для остальных.
+        """
+        tables = self.transaction["tables"]
+        if table_name in tables:
+            return
+        entry = self._tables.get(table_name)
+        if entry is None or not entry["dirty"]:
+            tables[table_name] = None
+        else:
+            tables[table_name] = dict(entry, data=entry["data"].copy())
+
+    def commit(self) -> list[str]:
+        """
+        Записывает изменения транзакции: метаданные, затем каждую
+        изменённую таблицу одной записью журнала. Возвращает имена таблиц.
+        """
+        transaction = self._end_transaction()
+        tables = list(transaction["tables"])
+        self._flush_metadata()
+        for table_name in tables:
+            self.flush(table_name, atomic=True)
+        flush_pending()
+        self._release_transaction_locks()
+        return tables
+
+    def rollback(self, metadata: dict) -> list[str]:
+        """
+        Отменяет изменения транзакции: таблицы перечитываются с диска
+        или возвращаются к образу, метаданные — к копии из begin.
+        Возвращает имена таблиц.
+        """
+        transaction = self._end_transaction()
+        for table_name, image in transaction["tables"].items():
+            if image is None:
+                self.discard(table_name)
+            else:
+                self._tables[table_name] = image
+        # вызывающий держит ссылку на metadata: восстанавливаем на месте
+        metadata.clear()
+        metadata.update(transaction["metadata"])
+        self._metadata = metadata
+        self._metadata_dirty = transaction["metadata_dirty"]
+        self._metadata_changed = transaction["metadata_changed"]
+        self._release_transaction_locks()
+        return list(transaction["tables"])
+
+    def _end_transaction(self) -> dict:
+        if self.transaction is None:
+            raise ValueError("Транзакция не начата.")
+        transaction, self.transaction = self.transaction, None
+        return transaction
+
+    def _release_transaction_locks(self) -> None:
+        self.locks.keep_exclusive = self.flush_every != 1
+        if not self.locks.keep_exclusive:
+            self.locks.release_all()
+
+    def discard(self, table_name: str) -> None:
+        """Забывает таблицу без записи изменений (drop_table, convert)."""
+        self._tables.pop(table_name, None)
+
+    def _evict(self, keep: str) -> None:
+        """Вытесняет давно не использованные таблицы сверх бюджета памяти."""
+        total = sum(entry["nbytes"] for entry in self._tables.values())
+        touched = self.transaction["tables"] if self.transaction else {}
+        for table_name in list(self._tables):
+            if total <= self.memory_budget:
+                break
+            if table_name == keep or table_name in touched:
+                # изменения транзакции нельзя сбрасывать до commit
+                continue
+            if self.transaction is not None and self._tables[table_name]["dirty"]:
+                # сброс записал бы и метаданные, а в них уже изменения
+                # транзакции: такие таблицы ждут commit или rollback
+                continue
+            self.flush(table_name)
+            total -= self._tables.pop(table_name)["nbytes"]
+
+
+def _copy_meta(table_meta: dict | None) -> dict | None:
+    if table_meta is None:
+        return None
+    return {
+        "columns": dict(table_meta["columns"]),
+        "indexes": dict(table_meta.get("indexes", {})),
+        "format": table_meta.get("format", "json"),
+    }
+
+
+def _storage_key(table_meta: dict | None) -> tuple | None:
+    """Часть описания таблицы, при изменении которой её надо перечитать."""
+    if table_meta is None:
+        return None
+    return (
+        tuple(table_meta["columns"].items()),
+        table_meta.get("format", "json"),
+    )
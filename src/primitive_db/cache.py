@@ -0,0 +1,115 @@
+# src/primitive_db/cache.py
+
+import sys
+from collections import OrderedDict
+from typing import Any, Callable
+
+from . import metrics
+
+# ограничения кэша результатов select
+MAX_ENTRIES = 128
+MAX_BYTES = 64 * 1024 * 1024
+
+
+def result_size(rows: list[dict]) -> int:
+    """Примерный объём памяти, занятый результатом select."""
+    total = sys.getsizeof(rows)
+    for row in rows:
+        total += sys.getsizeof(row)
+        total += sum(sys.getsizeof(value) for value in row.values())
+    return total
+
+
+class QueryCache:
+    """
+    Кэш результатов запросов с вытеснением давно не использованных (LRU).
+
+    Ключ записи — (таблица, версия таблицы, запрос). Версия меняется при
+    каждом изменении таблицы и при её перезагрузке с диска, поэтому
+    устаревший результат не может быть выдан. invalidate(table) сразу
+    освобождает записи только одной таблицы. Размер кэша ограничен
+    числом записей и суммарным объёмом результатов.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # таблицы, сброс которых отложен до конца транзакции
+        self._deferred: set[str] | None = None
+
+    def get_or_compute(
+        self,
+        table_name: str,
+        version: int,
+        query: Any,
+        compute: Callable[[], list[dict]]
+    ) -> list[dict]:
+        key = (table_name, version, query)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            metrics.count("cache_hits")
+            self._entries.move_to_end(key)
+            return entry[0]
+
+        self.misses += 1
+        metrics.count("cache_misses")
+        value = compute()
+        size = result_size(value)
+        if size <= self.max_bytes:
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def contains(self, table_name: str, version: int, query: Any) -> bool:
+        """Есть ли результат в кэше (без учёта в попаданиях и порядке LRU)."""
+        return (table_name, version, query) in self._entries
+
+    def invalidate(self, table_name: str) -> None:
+        """Удаляет все результаты по таблице table_name."""
+        if self._deferred is not None:
+            # старые результаты недоступны и так: в ключе версия таблицы
+            self._deferred.add(table_name)
+            return
+        for key in [key for key in self._entries if key[0] == table_name]:
+            self._bytes -= self._entries.pop(key)[1]
+            self.invalidations += 1
+
+    def defer_invalidation(self) -> None:
+        """Откладывает сброс результатов до end_deferred (транзакция)."""
+        self._deferred = set()
+
+    def end_deferred(self) -> None:
+        """Сбрасывает результаты по каждой изменённой таблице один раз."""
+        deferred, self._deferred = self._deferred or set(), None
+        for table_name in deferred:
+            self.invalidate(table_name)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,148 @@
+# src/primitive_db/client.py
+
+import json
+import socket
+import threading
+from itertools import count
+
+
+class Client:
+    """
+    Клиент сервера database serve с пулом соединений.
+
+        with Client(socket_path="/tmp/db.sock") as db:
+            print(db.execute("select from users where age > 30"))
+            db.execute_many([f"insert into t values ({i})" for i in range(100)])
+
+    Соединения не закрываются после запроса, а возвращаются в пул
+    (не больше pool_size открытых), поэтому запрос стоит один обмен
+    по уже открытому сокету. Клиентом можно пользоваться из нескольких
+    потоков: каждый поток берёт из пула своё соединение.
+
+    Режим вывода задаётся на запрос (output=...) или для клиента
+    (Client(output=...)) и отправляется с каждым запросом: состояние
+    соединения из пула на него не влияет, а команда output действует
+    только на свой запрос.
+    """
+
+    def __init__(
+        self,
+        socket_path: str | None = None,
+        host: str = "127.0.0.1",
+        port: int | None = None,
+        pool_size: int = 4,
+        timeout: float | None = 30.0,
+        output: str | None = None,
+    ):
+        if (socket_path is None) == (port is None):
+            raise ValueError("Укажите ровно одно из socket_path и port.")
+        self.socket_path = socket_path
+        self.address = (host, port)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        # режим вывода запросов по умолчанию; None — режим сервера
+        self.output = output
+        self._idle: list = []
+        self._opened = 0
+        self._ids = count(1)
+        self._cond = threading.Condition()
+
+    # ===== пул соединений =====
+
+    def _connect(self):
+        if self.socket_path is not None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            address = self.socket_path
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = self.address
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock, sock.makefile("rb")
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._opened >= self.pool_size:
+                self._cond.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._opened += 1
+        try:
+            return self._connect()
+        except OSError:
+            with self._cond:
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, conn, broken: bool = False) -> None:
+        with self._cond:
+            if broken:
+                conn[1].close()
+                conn[0].close()
+                self._opened -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    # ===== запросы =====
+
+    def request_many(self, commands: list[str], output: str | None = None) -> list:
+        """
+        Отправляет команды конвейером (все сразу, затем читает ответы)
+        и возвращает ответы сервера {"id", "ok", "output"} в том же порядке.
+        """
+        if output is None:
+            output = self.output
+        requests = []
+        for command in commands:
+            request = {"id": next(self._ids), "command": command}
+            if output is not None:
+                request["output"] = output
+            requests.append(request)
+        payload = "".join(
+            json.dumps(request, ensure_ascii=False) + "\n" for request in requests
+        ).encode("utf-8")
+
+        conn = self._acquire()
+        try:
+            conn[0].sendall(payload)
+            responses = []
+            for _ in requests:
+                line = conn[1].readline()
+                if not line:
+                    raise ConnectionError("Сервер закрыл соединение.")
+                responses.append(json.loads(line))
+        except BaseException:
+            self._release(conn, broken=True)
+            raise
+        # после exit сервер закрывает соединение — в пул его не возвращаем
+        closing = any(command.strip() == "exit" for command in commands)
+        self._release(conn, broken=closing)
+        return responses
+
+    def execute_many(self, commands: list[str], output: str | None = None) -> list[str]:
+        """Тексты ответов на команды, отправленные конвейером."""
+        return [response["output"] for response in self.request_many(commands, output)]
+
+    def execute(self, command: str, output: str | None = None) -> str:
+        """Выполняет одну команду и возвращает напечатанный сервером текст."""
+        return self.execute_many([command], output)[0]
+
+    def close(self) -> None:
+        with self._cond:
+            for sock, reader in self._idle:
+                reader.close()
+                sock.close()
+            self._opened -= len(self._idle)
+            self._idle.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,247 @@
+# src/primitive_db/compressed.py
+
+import json
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+from .durability import atomic_open
+from .table import TableData
+
+# Формат файла data/<таблица>.zbin — сжатая таблица по столбцам:
+#   заголовок (HEADER): магия, версия, число строк, длина описания;
+#   описание (JSON): кодек и уровень сжатия, столбцы, их кодировки
+#   и размеры блоков, min/max int-столбцов;
+#   сжатые блоки столбцов подряд:
+#     int  — array('q');
+#     bool — по биту на строку;
+#     str  — "dict": словарь различных значений (смещения + UTF-8)
+#            и номера значений (array 'B', 'H' или 'I' по размеру словаря);
+#            "plain": смещения + UTF-8, если различных значений больше
+#            половины строк и словарь не окупается.
+# Файл читается целиком (сжатым он меньше, и холодная загрузка упирается
+# в диск меньше), столбцы распаковываются при открытии; строковые
+# столбцы со словарём остаются номерами (DictColumn).
+MAGIC = b"PDZ1"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQI")
+
+# кодеки сжатия и уровни по умолчанию (для таблицы их задаёт
+# "compression" в db_meta.json: {"codec": "zlib", "level": 6})
+CODECS = {"zlib": 6, "lzma": 6}
+DEFAULT_CODEC = "zlib"
+
+# 0 и 1 в байтах столбца bool <-> символы двоичной записи числа
+_TO_BITS = bytes.maketrans(b"\x00\x01", b"01")
+_FROM_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+class DictColumn:
+    """
+    Строковый столбец со словарём: codes[pos] — номер значения
+    в values. Условия =, != и in сравнивают номера (см. predicates),
+    строки для них не собираются.
+    """
+
+    def __init__(self, codes: array, values: list[str]):
+        self.codes = codes
+        self.values = values
+        self._numbers: dict[str, int] | None = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, pos: int) -> str:
+        return self.values[self.codes[pos]]
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes)
+
+    def range(self, start: int, stop: int):
+        return map(self.values.__getitem__, self.codes[start:stop])
+
+    def code(self, value: str) -> int | None:
+        """Номер значения в словаре; None — такого значения в столбце нет."""
+        if self._numbers is None:
+            self._numbers = {value: number for number, value in enumerate(self.values)}
+        return self._numbers.get(value)
+
+
+def check_compression(compression: dict) -> dict:
+    """Проверяет {"codec", "level"} и дополняет уровнем по умолчанию."""
+    codec = compression.get("codec", DEFAULT_CODEC)
+    if codec not in CODECS:
+        raise ValueError(f"Неизвестный кодек: {codec}")
+    level = compression.get("level", CODECS[codec])
+    if not isinstance(level, int) or not 0 <= level <= 9:
+        raise ValueError(f"Уровень сжатия должен быть от 0 до 9: {level}")
+    return {"codec": codec, "level": level}
+
+
+def _compress(data: bytes, codec: str, level: int) -> bytes:
+    if codec == "lzma":
+        # импорт здесь: lzma нужен только таблицам с этим кодеком
+        import lzma
+
+        return lzma.compress(data, preset=level)
+    return zlib.compress(data, level)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "lzma":
+        import lzma
+
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+def _pack_bits(column) -> bytes:
+    """Столбец bool (байты 0/1) -> по биту на строку, младший бит — первая."""
+    if not len(column):
+        return b""
+    bits = bytes(column).translate(_TO_BITS)[::-1]
+    return int(bits, 2).to_bytes((len(column) + 7) // 8, "little")
+
+
+def _unpack_bits(packed: bytes, count: int) -> bytearray:
+    if not count:
+        return bytearray()
+    bits = format(int.from_bytes(packed, "little"), "b").zfill(count)
+    return bytearray(bits[::-1].encode("ascii").translate(_FROM_BITS))
+
+
+def _strings(values) -> list[bytes]:
+    """Строки -> [смещения, UTF-8 подряд]."""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = array("q", [0])
+    total = 0
+    for item in encoded:
+        total += len(item)
+        offsets.append(total)
+    return [offsets.tobytes(), b"".join(encoded)]
+
+
+def _read_strings(offsets_block: bytes, blob: bytes) -> list[str]:
+    offsets = array("q")
+    offsets.frombytes(offsets_block)
+    return [
+        sys.intern(str(blob[start:stop], "utf-8"))
+        for start, stop in zip(offsets, offsets[1:])
+    ]
+
+
+def _column_blocks(data: TableData, name: str) -> tuple[dict, list[bytes]]:
+    """Описание кодировки ({"encoding", ...}) и несжатые блоки столбца."""
+    type_name = data.schema[name]
+    column = data.columns[name]
+    if type_name == "int":
+        return {"encoding": "plain"}, [array("q", column).tobytes()]
+    if type_name == "bool":
+        return {"encoding": "bits"}, [_pack_bits(column)]
+
+    numbers: dict[str, int] = {}
+    codes = [numbers.setdefault(value, len(numbers)) for value in column]
+    if len(numbers) * 2 > len(codes):
+        return {"encoding": "plain"}, _strings(column)
+    if len(numbers) <= 1 << 8:
+        typecode = "B"
+    elif len(numbers) <= 1 << 16:
+        typecode = "H"
+    else:
+        typecode = "I"
+    blocks = [*_strings(numbers), array(typecode, codes).tobytes()]
+    return {"encoding": "dict", "typecode": typecode}, blocks
+
+
+def write_compressed(
+    path: Path, data: TableData, compression: dict | None = None
+) -> None:
+    """
+    Записывает таблицу в сжатый формат: столбцы кодируются
+    (словарь для str, биты для bool) и сжимаются кодеком compression.
+    """
+    settings = check_compression(compression or {})
+    codec, level = settings["codec"], settings["level"]
+    stats = data.stats()
+
+    columns, blocks = [], []
+    for name, type_name in data.schema.items():
+        encoding, raw = _column_blocks(data, name)
+        packed = [_compress(block, codec, level) for block in raw]
+        columns.append({
+            "name": name,
+            "type": type_name,
+            **encoding,
+            "sizes": [len(block) for block in packed],
+        })
+        blocks.extend(packed)
+
+    layout = json.dumps(
+        {
+            "byteorder": sys.byteorder,
+            "codec": codec,
+            "level": level,
+            "ids_sorted": data.ids_sorted,
+            "stats": {"min": stats["min"], "max": stats["max"]},
+            "columns": columns,
+        },
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    with atomic_open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(data), len(layout)))
+        f.write(layout)
+        for block in blocks:
+            f.write(block)
+
+
+def open_compressed(
+    path: Path, schema: dict[str, str] | None = None, name: str = ""
+) -> TableData:
+    """
+    Читает сжатую таблицу. int и bool распаковываются в array/bytearray,
+    строковые столбцы со словарём — в DictColumn (только для чтения:
+    перед первым изменением они разворачиваются в список строк).
+    """
+    raw = path.read_bytes()
+    magic, version, _, row_count, layout_len = HEADER.unpack_from(raw, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Файл {path} не является сжатой таблицей.")
+    layout = json.loads(raw[HEADER.size:HEADER.size + layout_len])
+    if layout["byteorder"] != sys.byteorder:
+        raise ValueError(f"Файл {path} записан с другим порядком байт.")
+
+    codec = layout["codec"]
+    offset = HEADER.size + layout_len
+    columns = {}
+    file_schema = {}
+    for column in layout["columns"]:
+        blocks = []
+        for size in column["sizes"]:
+            blocks.append(_decompress(raw[offset:offset + size], codec))
+            offset += size
+
+        col_name, type_name = column["name"], column["type"]
+        file_schema[col_name] = type_name
+        if type_name == "int":
+            values = array("q")
+            values.frombytes(blocks[0])
+        elif type_name == "bool":
+            values = _unpack_bits(blocks[0], row_count)
+        elif column["encoding"] == "dict":
+            codes = array(column["typecode"])
+            codes.frombytes(blocks[2])
+            values = DictColumn(codes, _read_strings(blocks[0], blocks[1]))
+        else:
+            values = _read_strings(blocks[0], blocks[1])
+        columns[col_name] = values
+
+    if schema is not None and schema != file_schema:
+        raise ValueError(f"Схема файла {path} не совпадает с метаданными.")
+
+    table_data = TableData.from_columns(file_schema, columns, row_count, name)
+    table_data.ids_sorted = layout["ids_sorted"]
+    table_data._stats = layout.get("stats")
+    return table_data
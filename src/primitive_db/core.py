@@ -1,8 +1,15 @@
 # src/primitive_db/core.py
 
-from typing import Any, Callable
+from itertools import chain, islice
 
+from . import aggregates, metrics
+from .cache import QueryCache
 from .decorators import confirm_action, handle_db_errors, log_time
+from .indexes import INDEX_KINDS
+from .join import hash_join
+from .parallel import parallel_positions, splits
+from .predicates import compile_where
+from .table import TableData
 
 ALLOWED_TYPES = {"int", "str", "bool"}
 
@@ -36,7 +43,12 @@ def create_table(metadata: dict, table_name: str, columns: list[str]) -> dict:
     else:
         full_schema = schema
 
-    metadata[table_name] = full_schema
+    metadata[table_name] = {
+        "columns": full_schema,
+        "indexes": {},
+        "sequence": 0,
+        "format": "json",
+    }
 
     cols_str = ", ".join(f"{name}:{typ}" for name, typ in full_schema.items())
     print(f'Таблица "{table_name}" успешно создана со столбцами: {cols_str}')
@@ -59,162 +71,356 @@ def drop_table(metadata: dict, table_name: str) -> dict:
     print(f'Таблица "{table_name}" успешно удалена.')
 
     return metadata
+
+@handle_db_errors
+def create_index(
+    metadata: dict,
+    table_name: str,
+    column: str,
+    kind: str = "hash"
+    ) -> dict:
+    """
+    Добавляет в метаданные индекс kind по столбцу column.
+    Сам индекс строится при загрузке таблицы.
+    """
+    if table_name not in metadata:
+        raise ValueError(f'Таблица "{table_name}" не существует.')
+    if column not in metadata[table_name]["columns"]:
+        raise KeyError(column)
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Неизвестный тип индекса: {kind}")
+
+    indexes = metadata[table_name].setdefault("indexes", {})
+    if column in indexes:
+        print(f'Ошибка: Индекс по столбцу "{column}" уже существует.')
+        return metadata
+
+    indexes[column] = kind
+    print(f'Индекс {kind} по столбцу "{column}" таблицы "{table_name}" создан.')
+    return metadata
+
+@handle_db_errors
+def drop_index(metadata: dict, table_name: str, column: str) -> dict:
+    """
+    Удаляет индекс по столбцу column из метаданных.
+    """
+    if table_name not in metadata:
+        raise ValueError(f'Таблица "{table_name}" не существует.')
+
+    indexes = metadata[table_name].get("indexes", {})
+    if column not in indexes:
+        print(f'Ошибка: Индекса по столбцу "{column}" нет.')
+        return metadata
+
+    del indexes[column]
+    print(f'Индекс по столбцу "{column}" таблицы "{table_name}" удалён.')
+    return metadata
     
 # ===== CRUD по данным таблиц =====
 
 #Ф-цтя приведения типов данных
+def _cast_bool(value) -> bool:
+    if isinstance(value, str):
+        v = value.strip().lower()
+        if v in ("true", "1", "yes"):
+            return True
+        if v in ("false", "0", "no"):
+            return False
+    return bool(value)
+
+# функции приведения для каждого типа столбца
+_CASTERS = {"int": int, "str": str, "bool": _cast_bool}
+
 def _cast_value(value, type_name: str):
-    if type_name == "int":
-        return int(value)
-    if type_name == "str":
-        return str(value)
-    if type_name == "bool":
-        if isinstance(value, str):
-            v = value.strip().lower()
-            if v in ("true", "1", "yes"):
-                return True
-            if v in ("false", "0", "no"):
-                return False
-        return bool(value)
-    return value
+    cast = _CASTERS.get(type_name)
+    if cast is None:
+        return value
+    return cast(value)
+
+def reserve_ids(
+    metadata: dict,
+    table_name: str,
+    table_data: TableData,
+    count: int = 1
+    ) -> int:
+    """
+    Резервирует count подряд идущих ID в счётчике таблицы
+    и возвращает первый из них. Счётчик хранится в метаданных
+    (metadata[table_name]["sequence"] — последний выданный ID),
+    поэтому ID не переиспользуются даже после удаления строк.
+    """
+    table_meta = metadata[table_name]
+
+    sequence = table_meta.get("sequence")
+    if sequence is None:
+        # таблица из старой версии: счётчик заводится один раз по данным
+        sequence = max(table_data.columns["ID"], default=0)
+
+    table_meta["sequence"] = sequence + count
+    return sequence + 1
 
 @handle_db_errors
 @log_time
 def insert(
     metadata: dict, 
     table_name: str, 
-    table_data: list[dict], 
+    table_data: TableData, 
     values: list
-    ) -> list[dict]:
+    ) -> TableData:
     """
     Добавляет новую запись в таблицу.
     """
+    return _insert_rows(metadata, table_name, table_data, [values])
+
+@handle_db_errors
+@log_time
+def insert_many(
+    metadata: dict,
+    table_name: str,
+    table_data: TableData,
+    rows: list[list]
+    ) -> TableData:
+    """
+    Добавляет в таблицу несколько записей за один раз:
+    значения приводятся к типам по столбцам, а ID выдаются одним блоком.
+    """
+    return _insert_rows(metadata, table_name, table_data, rows)
+
+def _insert_rows(
+    metadata: dict,
+    table_name: str,
+    table_data: TableData,
+    rows: list[list]
+    ) -> TableData:
     if table_name not in metadata:
         raise ValueError(f'Таблица "{table_name}" не существует.')
 
-    columns = metadata[table_name]          # dict: имя_столбца -> тип
+    columns = metadata[table_name]["columns"]   # dict: имя_столбца -> тип
     column_names = list(columns.keys())
 
     # считаем, что первый столбец — ID и заполняем его сами
     non_id_columns = column_names[1:]
 
-    if len(values) != len(non_id_columns):
-        raise ValueError(
-        "Количество значений не совпадает с количеством столбцов (без ID)."
-        )
-
-    # генерируем новый ID
-    if table_data:
-        max_id = max(row["ID"] for row in table_data)
-        new_id = max_id + 1
-    else:
-        new_id = 1
+    for values in rows:
+        if len(values) != len(non_id_columns):
+            raise ValueError(
+            "Количество значений не совпадает с количеством столбцов (без ID)."
+            )
 
-    row: dict = {"ID": new_id}
+    # приводим типы по столбцам: одна функция приведения на весь столбец
+    new_columns: dict[str, list] = {}
+    for i, col_name in enumerate(non_id_columns):
+        cast = _CASTERS[columns[col_name]]
+        new_columns[col_name] = [cast(values[i]) for values in rows]
 
-    for col_name, raw_value in zip(non_id_columns, values):
-        type_name = columns[col_name]
-        row[col_name] = _cast_value(raw_value, type_name)
+    # берём блок ID из счётчика таблицы одним изменением
+    first_id = reserve_ids(metadata, table_name, table_data, len(rows))
+    new_columns = {"ID": list(range(first_id, first_id + len(rows))), **new_columns}
 
-    table_data.append(row)
-    clear_select_cache()
+    table_data.append_columns(new_columns)
+    select_cache.invalidate(table_name)
     return table_data
 
 @handle_db_errors
 @log_time
 def select(
     table_name: str, 
-    table_data: list[dict], 
-    where_clause: dict | None = None
+    table_data: TableData, 
+    where_clause: tuple | dict | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+    columns: list[str] | None = None
     ) -> list[dict]:
     """
     Возвращает все записи или только те, что подходят под where.
+    where — дерево условия из parse_where (или словарь {столбец: значение}).
+    columns — проекция: в строки результата (и в кэш) попадают только
+    эти столбцы, остальные не читаются.
     Результаты одинаковых запросов кэшируются.
+    limit/offset применяются к результату (в кэше лежит полный результат).
     """
-    if where_clause is None:
-        key = (table_name, None)
-    else:
-        key = (table_name, tuple(sorted(where_clause.items())))
+    stop = None if limit is None else offset + limit
+    check_columns(columns, table_data.schema)
+
+    predicate = compile_where(where_clause, table_data.schema)
+    if predicate is None:
+        # без условия строки читаются прямо из столбцов, кэш не нужен
+        end = len(table_data) if stop is None else min(stop, len(table_data))
+        rows = [table_data.row(pos, columns) for pos in range(offset, end)]
+        metrics.count("rows_scanned", offset + len(rows))
+        return rows
 
     def compute() -> list[dict]:
-        if where_clause is None:
-            return table_data
-
-        result: list[dict] = []
-        for row in table_data:
-            ok = True
-            for k, v in where_clause.items():
-                if row.get(k) != v:
-                    ok = False
-                    break
-            if ok:
-                result.append(row)
-        return result
-
-    return select_cache(key, compute)
+        with metrics.timed("where"):
+            positions = list(_iter_positions(table_data, predicate))
+        return [table_data.row(pos, columns) for pos in positions]
+
+    rows = select_cache.get_or_compute(
+        table_name, table_data.version, select_key(predicate, columns), compute
+    )
+    if offset or stop is not None:
+        return rows[offset:stop]
+    return rows
 
 @handle_db_errors
-def update(table_data: list[dict], set_clause: dict, where_clause: dict) -> list[dict]:
+@log_time
+def aggregate(
+    table_name: str,
+    table_data: TableData,
+    items: list[tuple],
+    where_clause: tuple | dict | None = None,
+    group_by: str | None = None
+    ) -> list[dict]:
     """
-    Обновляет записи, подходящие под where полями из set
+    select count(*), sum(col), ... [where ...] [group by col]:
+    агрегаты считаются за один проход по подходящим строкам
+    с группировкой по хэшу значения столбца group_by.
     """
-    for row in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if row.get(key) != value:
-                match = False
-                break
+    aggregates.check_items(items, table_data.schema, group_by)
+    predicate = compile_where(where_clause, table_data.schema)
 
-        if not match:
-            continue
-
-        for key, value in set_clause.items():
-            row[key] = value
-    clear_select_cache()
-    return table_data
+    def compute() -> list[dict]:
+        positions = _iter_positions(table_data, predicate)
+        return aggregates.aggregate(table_data, items, positions, group_by)
+
+    query = (
+        "aggregate",
+        tuple(items),
+        group_by,
+        None if predicate is None else predicate.ast,
+    )
+    return select_cache.get_or_compute(
+        table_name, table_data.version, query, compute
+    )
 
 @handle_db_errors
-@confirm_action("удаление записей")
-def delete(table_data: list[dict], where_clause: dict) -> list[dict]:
+def aggregate_from_stats(schema: dict, stats: dict, items: list[tuple]) -> list[dict]:
     """
-    Удаляет записи, подходящие под where
+    Ответ на count(*), min/max int-столбцов по сохранённой статистике
+    таблицы — без чтения строк.
     """
-    new_data: list[dict] = []
-
-    for row in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if row.get(key) != value:
-                match = False
-                break
+    aggregates.check_items(items, schema)
+    return [aggregates.from_stats(items, stats)]
 
-        if not match:
-            new_data.append(row)
-    clear_select_cache()
-    return new_data
-
-def create_cacher():
+@handle_db_errors
+def iter_select(
+    table_data: TableData,
+    where_clause: tuple | dict | None = None,
+    limit: int | None = None,
+    offset: int = 0,
+    columns: list[str] | None = None
+    ):
     """
-    Создаёт замыкание cache_result с внутренним кэшем.
-    cache_result(key, value_func) -> результат, возможно из кэша.
+    Генератор строк select: строки отдаются по мере просмотра таблицы,
+    поэтому первая строка доступна сразу, независимо от размера результата.
+    Условие и столбцы проверяются по схеме сразу, до первой строки.
     """
-    cache: dict[Any, Any] = {}
+    stop = None if limit is None else offset + limit
+    check_columns(columns, table_data.schema)
+    positions = _iter_positions(table_data, where_clause)
+    return (table_data.row(pos, columns) for pos in islice(positions, offset, stop))
 
-    def cache_result(key: Any, value_func: Callable[[], Any]) -> Any:
-        if key in cache:
-            return cache[key]
-        value = value_func()
-        cache[key] = value
-        return value
+@handle_db_errors
+def join_select(
+    left_name: str,
+    left: TableData,
+    right_name: str,
+    right: TableData,
+    on: tuple[str, str],
+    where_clause: tuple | None = None,
+    limit: int | None = None,
+    offset: int = 0
+    ):
+    """
+    select from a join b on a.col = b.col: генератор строк соединения
+    со столбцами вида <таблица>.<столбец>. Условия проверяются сразу.
+    """
+    stop = None if limit is None else offset + limit
+    rows = hash_join(left_name, left, right_name, right, on, where_clause)
+    return islice(rows, offset, stop)
 
-    return cache_result 
+@handle_db_errors
+@log_time
+def update(
+    table_data: TableData,
+    set_clause: dict,
+    where_clause: tuple | dict
+    ) -> TableData:
+    """
+    Обновляет записи, подходящие под where полями из set
+    """
+    if "ID" in set_clause:
+        raise ValueError("Столбец ID изменять нельзя.")
+
+    changes = {
+        key: _cast_value(value, table_data.schema[key])
+        for key, value in set_clause.items()
+    }
+    positions = _find_positions(table_data, where_clause)
+    table_data.update_rows(positions, changes)
+    select_cache.invalidate(table_data.name)
+    return table_data
 
-select_cache = create_cacher()
+@handle_db_errors
+@confirm_action("удаление записей")
+@log_time
+def delete(table_data: TableData, where_clause: tuple | dict) -> TableData:
+    """
+    Удаляет записи, подходящие под where
+    """
+    positions = _find_positions(table_data, where_clause)
+    table_data.delete_rows(positions)
+    select_cache.invalidate(table_data.name)
+    return table_data
 
-def clear_select_cache() -> None:
+def _find_positions(table_data: TableData, where_clause) -> list[int]:
     """
-    Очищает кэш результатов select.
+    Находит позиции строк, подходящих под where.
     """
-    global select_cache
-    select_cache = create_cacher()
+    with metrics.timed("where"):
+        return list(_iter_positions(table_data, where_clause))
 
+def _iter_positions(table_data: TableData, where_clause):
+    """
+    Лениво перебирает позиции строк, подходящих под where.
+    Условие компилируется под схему таблицы; кандидаты берутся из
+    индексов и столбца ID, если это возможно, иначе — просмотр столбцов
+    (у сегментированной таблицы — только сегментов, которые не исключены
+    их min/max). Просмотр большой таблицы делится между процессами.
+    """
+    predicate = compile_where(where_clause, table_data.schema)
+    if predicate is None:
+        metrics.count("rows_scanned", len(table_data))
+        return iter(range(len(table_data)))
+    if not predicate.needs_scan(table_data):
+        return predicate.positions(table_data)
+    ranges = predicate.ranges(table_data)
+    rows = sum(stop - start for start, stop in ranges)
+    if splits(rows):
+        # процессы-исполнители считают строки в своих счётчиках
+        metrics.count("rows_scanned", rows)
+        return parallel_positions(table_data, predicate, ranges)
+    return chain.from_iterable(
+        predicate.positions(table_data, start, stop) for start, stop in ranges
+    )
+
+# кэш результатов select с LRU-вытеснением и сбросом по отдельной таблице
+select_cache = QueryCache()
+
+
+def check_columns(columns: list[str] | None, schema: dict[str, str]) -> None:
+    """Проверяет столбцы проекции по схеме: неизвестный столбец — KeyError."""
+    for column in columns or ():
+        if column not in schema:
+            raise KeyError(column)
+
+
+def select_key(predicate, columns: list[str] | None = None):
+    """
+    Ключ кэша select: дерево условия с приведёнными значениями (age = 28
+    и age = "28" попадают в одну запись) и столбцы проекции — строки
+    разных проекций кэшируются отдельно.
+    """
+    if columns is None:
+        return predicate.ast
+    return (predicate.ast, tuple(columns))
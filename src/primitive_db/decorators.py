@@ -1,6 +1,7 @@
-import time
 from functools import wraps
 
+from . import metrics
+
 
 def handle_db_errors(func):
     @wraps(func)
@@ -16,18 +17,62 @@ def handle_db_errors(func):
     return wrapper
 
 
+# подтверждать опасные действия без вопроса (пакетный режим)
+AUTO_CONFIRM = False
+
+# команды читаются из файла или stdin: ответ на вопрос нельзя читать
+# из stdin (им стала бы следующая строка скрипта), он читается с терминала
+SCRIPT_MODE = False
+
+TTY_PATH = "/dev/tty"
+
+
+def set_auto_confirm(value: bool, script: bool = False) -> None:
+    global AUTO_CONFIRM, SCRIPT_MODE
+    AUTO_CONFIRM = value
+    SCRIPT_MODE = script
+
+
+def _ask(question: str) -> str | None:
+    """
+    Задаёт вопрос и возвращает ответ. В пакетном режиме — через терминал
+    (TTY_PATH), а если его нет, возвращает None.
+    """
+    if not SCRIPT_MODE:
+        return input(question)
+    try:
+        with (
+            open(TTY_PATH, "w", encoding="utf-8") as out,
+            open(TTY_PATH, "r", encoding="utf-8") as tty,
+        ):
+            out.write(question)
+            out.flush()
+            return tty.readline()
+    except OSError:
+        return None
+
+
 def confirm_action(action_name: str):
     """
     Декоратор с параметром.
     Перед выполнением функции спрашивает подтверждение действия action_name.
     Если пользователь вводит не 'y' — действие отменяется.
+    При включённом AUTO_CONFIRM действие выполняется без вопроса.
+    В пакетном режиме без терминала действие не выполняется.
     """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            answer = input(f'Вы уверены, что хотите выполнить "{action_name}"? [y/n]: '
-            ).strip().lower()
-            if answer != "y":
+            if AUTO_CONFIRM:
+                return func(*args, **kwargs)
+            answer = _ask(
+                f'Вы уверены, что хотите выполнить "{action_name}"? [y/n]: '
+            )
+            if answer is None:
+                print(f'Операция "{action_name}" отменена: подтвердить её '
+                      "негде, запустите скрипт с --yes.")
+                return None
+            if answer.strip().lower() != "y":
                 print("Операция отменена.")
                 return None
             return func(*args, **kwargs)
@@ -37,13 +82,11 @@ def confirm_action(action_name: str):
 
 def log_time(func):
     """
-    Замеряет время выполнения функции и печатает его в консоль.
+    Замеряет время выполнения функции и записывает его в метрики
+    (гистограмма с именем функции, см. команду stats).
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        start = time.monotonic()
-        result = func(*args, **kwargs)
-        elapsed = time.monotonic() - start  # [web:413][web:415]
-        print(f'Функция {func.__name__} выполнилась за {elapsed:.3f} секунд.')
-        return result
+        with metrics.timed(func.__name__):
+            return func(*args, **kwargs)
     return wrapper
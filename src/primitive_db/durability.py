@@ -0,0 +1,116 @@
+# src/primitive_db/durability.py
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# режимы долговечности записи:
+#   fsync — каждая запись сбрасывается на диск до возврата из команды;
+#   group — сброс журналов и каталогов копится и выполняется раз
+#           в GROUP_COMMIT_MS миллисекунд одним заходом;
+#   off   — без fsync: файлы по-прежнему подменяются атомарно, но
+#           последние изменения могут пропасть при сбое питания.
+DURABILITY_MODES = ("fsync", "group", "off")
+
+DURABILITY = "fsync"
+GROUP_COMMIT_MS = 50
+
+_pending: set[str] = set()
+_lock = threading.Lock()
+_timer: threading.Timer | None = None
+_last_sync = 0.0
+
+
+def set_durability(mode: str, group_commit_ms: int | None = None) -> None:
+    global DURABILITY, GROUP_COMMIT_MS
+    if mode not in DURABILITY_MODES:
+        raise ValueError(f"Неизвестный режим долговечности: {mode}")
+    flush_pending()
+    DURABILITY = mode
+    if group_commit_ms is not None:
+        GROUP_COMMIT_MS = group_commit_ms
+
+
+def _fsync_path(path: str) -> None:
+    """fsync файла или каталога по пути (без изменения содержимого)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def flush_pending() -> None:
+    """Сбрасывает на диск всё, что накопил групповой режим."""
+    global _timer, _last_sync
+    with _lock:
+        paths = sorted(_pending)
+        _pending.clear()
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        _last_sync = time.monotonic()
+    for path in paths:
+        _fsync_path(path)
+
+
+def sync(path: Path) -> None:
+    """
+    Делает запись в path долговечной по текущему режиму:
+    сразу, в ближайшем групповом сбросе или никак.
+    """
+    global _timer
+    if DURABILITY == "off":
+        return
+    if DURABILITY == "fsync":
+        _fsync_path(str(path))
+        return
+
+    with _lock:
+        _pending.add(str(path))
+        due = _last_sync + GROUP_COMMIT_MS / 1000 - time.monotonic()
+        if due <= 0:
+            flush_now = True
+        else:
+            flush_now = False
+            if _timer is None:
+                _timer = threading.Timer(due, flush_pending)
+                _timer.daemon = True
+                _timer.start()
+    if flush_now:
+        flush_pending()
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = "w"):
+    """
+    Открывает временный файл рядом с path; после успешной записи
+    подменяет им path через os.replace. При сбое посередине path
+    остаётся прежним целиком, а не обрезанным.
+    Перед подменой файл сбрасывается на диск (кроме режима off),
+    иначе после сбоя питания на месте path мог бы оказаться пустой файл.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    encoding = None if "b" in mode else "utf-8"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+            f.flush()
+            if DURABILITY != "off":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    # запись о подмене живёт в каталоге
+    sync(path.parent)
+
+
+atexit.register(flush_pending)
@@ -1,16 +1,43 @@
 # src/primitive_db/engine.py
 
+import copy
+import json
+import re
 import shlex  # для аккуратного разбора строки на части
-from pathlib import Path
 
-import prompt
-from prettytable import PrettyTable  # для красивого вывода 
-
-from .core import create_table, delete, drop_table, insert, select, update
-from .utils import load_metadata, load_table_data, save_metadata, save_table_data
+from . import metrics, output
+from .aggregates import AGGREGATES
+from .buffer import TableBuffer
+from .compressed import DEFAULT_CODEC, check_compression
+from .core import (
+    create_index,
+    create_table,
+    delete,
+    drop_index,
+    drop_table,
+    insert,
+    insert_many,
+    select_cache,
+    update,
+)
+from .decorators import set_auto_confirm
+from .locks import lock_stats
+from .planner import analyze, execute_plan, plan_select
+from .predicates import is_keyword, parse_where, tokenize
+from .utils import (
+    STORAGE_FORMATS,
+    empty_trash,
+    move_to_trash,
+    recover_trash,
+    remove_stale_files,
+    write_snapshot,
+)
 
 META_FILE = "db_meta.json"
 
+# части select после имени таблицы
+SELECT_CLAUSES = ("where", "group", "limit", "offset")
+
 
 def print_help() -> None:
     """Prints the help message for the current mode."""
@@ -19,6 +46,11 @@ def print_help() -> None:
     print("<command> create_table <имя_таблицы> <столбец1:тип> .. - создать таблицу")
     print("<command> list_tables - показать список всех таблиц")
     print("<command> drop_table <имя_таблицы> - удалить таблицу")
+    print(
+    "<command> create_index <имя_таблицы> <столбец> [hash|sorted] "
+    "- создать индекс по столбцу"
+         )
+    print("<command> drop_index <имя_таблицы> <столбец> - удалить индекс")
 
     print("\n***Операции с данными***")
     print("Функции:")
@@ -26,20 +58,77 @@ def print_help() -> None:
     "<command> insert into <имя_таблицы> values"
     "(<значение1>, <значение2>, ...) - создать запись."
          )
+    print(
+    "<command> insert into <имя_таблицы> values (...), (...), ... "
+    "- создать несколько записей."
+         )
+    print(
+    "<command> import <имя_таблицы> <файл.csv|файл.jsonl> "
+    "- загрузить записи из файла."
+         )
     print("<command> select from <имя_таблицы> - прочитать все записи.")
     print(
-    "<command> select from <имя_таблицы> where <столбец> = <значение>  "
+    "<command> select from <имя_таблицы> where <условие>  "
     "- прочитать записи по условию."
          )
+    print(
+    "    условие: <столбец> =|!=|<|<=|>|>= <значение>, "
+    "<столбец> in (<з1>, <з2>, ...),"
+         )
+    print(
+    "    <столбец> between <от> and <до>, <столбец> like 'шаблон%'; "
+    "объединяются через and, or, not и скобки."
+         )
+    print(
+    "<command> select from <имя_таблицы> ... limit <N> offset <M> "
+    "- прочитать часть записей."
+         )
+    print(
+    "<command> select count(*), sum(<столбец>), avg(..), min(..), max(..) "
+    "from <имя_таблицы> [where <условие>] [group by <столбец>] - агрегаты."
+         )
+    print(
+    "<command> select from <таблица1> join <таблица2> on <таблица1>.<столбец> "
+    "= <таблица2>.<столбец> [where <условие>] - соединить таблицы."
+         )
+    print(
+    "<command> output <table|plain|tsv|jsonl|pager> "
+    "- режим вывода результатов select."
+         )
     print("<command> update <имя_таблицы> set <столбец1> = <новое_значение1> "
-          "where <столбец_условия> = <значение_условия> - обновить запись.")
+          "where <условие> - обновить запись.")
     print(
-    "<command> delete from <имя_таблицы> where <столбец> = <значение> "
+    "<command> delete from <имя_таблицы> where <условие> "
     "- удалить запись."
          )
 
     print("<command> info <имя_таблицы> - вывести информацию о таблице.")
+    print(
+    "<command> explain [analyze] select ... - план запроса "
+    "(analyze: выполнить и показать время и строки по операторам)."
+         )
+    print(
+    "<command> compact <имя_таблицы> - свернуть журнал изменений "
+    "в файл таблицы."
+         )
+    print(
+    "<command> convert <имя_таблицы> --format "
+    "<json|binary|segmented|compressed> [--codec zlib|lzma] [--level 0-9] "
+    "- перевести таблицу в другой формат хранения."
+         )
     
+    print("<command> cache_stats - статистика кэша результатов select.")
+    print("<command> checkpoint - записать на диск все накопленные изменения.")
+    print(
+    "<command> begin | commit | rollback - транзакция: insert/update/delete "
+    "до commit только в памяти, commit пишет их одной записью на таблицу."
+         )
+    print("<command> lock_stats - счётчики ожидания блокировок таблиц.")
+    print(
+    "<command> stats [json [<файл>] | reset] - метрики: время по фазам, "
+    "прочитанные строки и байты."
+         )
+
     print("\nОбщие команды:")
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация\n")
@@ -80,221 +169,776 @@ def parse_condition(condition: str) -> dict:
 
     return {key: value}
 
-def run() -> None:
-    while True:
-        # 1. Загружаем актуальные метаданные из файла
-        metadata = load_metadata(META_FILE)
+def parse_values(text: str) -> list[list[str]]:
+    """
+    Разбирает часть команды insert после values:
+    '("Sergei", 28, true), ("Anna", 30, false)'
+    -> [['Sergei', '28', 'true'], ['Anna', '30', 'false']].
+    Кавычки снимаются, запятые и скобки внутри кавычек сохраняются.
+    Одна запись может быть записана и без скобок: 'Sergei, 28, true'.
+    """
+    text = text.strip()
+    if not text.startswith("("):
+        text = f"({text})"
+
+    rows: list[list[str]] = []
+    row: list[str] | None = None
+    token: list[str] = []
+    quoted = False
+    quote = ""
+
+    def finish_token() -> None:
+        nonlocal quoted
+        value = "".join(token)
+        row.append(value if quoted else value.strip())
+        token.clear()
+        quoted = False
+
+    for ch in text:
+        if quote:
+            if ch == quote:
+                quote = ""
+            else:
+                token.append(ch)
+        elif row is None:
+            # между записями допустимы только пробелы и запятые
+            if ch == "(":
+                row = []
+            elif ch != "," and not ch.isspace():
+                raise ValueError(f"Некорректные значения: {text!r}")
+        elif ch in "\"'":
+            # пробелы перед кавычкой не входят в значение
+            if not "".join(token).strip():
+                token.clear()
+            quote = ch
+            quoted = True
+        elif quoted and ch.isspace():
+            # и пробелы после закрывающей кавычки тоже
+            continue
+        elif ch == ",":
+            finish_token()
+        elif ch == ")":
+            finish_token()
+            rows.append(row)
+            row = None
+        elif ch == "(":
+            raise ValueError(f"Некорректные значения: {text!r}")
+        else:
+            token.append(ch)
 
-        # 2. Запрашиваем команду
-        user_input = prompt.string(">>>Введите команду: ").strip()
-        if not user_input:
+    if quote or row is not None or not rows:
+        raise ValueError(f"Некорректные значения: {text!r}")
+    return rows
+
+def parse_items(tokens: list, pos: int) -> tuple[list[tuple], int]:
+    """
+    Разбирает список select до слова from: count(*), sum(age), name.
+    Возвращает (элементы, позиция слова from).
+    """
+    items = []
+    while pos < len(tokens) and not is_keyword(tokens[pos], "from"):
+        kind, value = tokens[pos]
+        if kind != "word":
+            raise ValueError(f"Некорректное значение: {value}. Попробуйте снова.")
+        if tokens[pos + 1:pos + 2] == [("punct", "(")]:
+            func = value.lower()
+            inner = tokens[pos + 2:pos + 4]
+            if (
+                func not in AGGREGATES
+                or len(inner) != 2
+                or inner[0][0] != "word"
+                or inner[1] != ("punct", ")")
+            ):
+                raise ValueError(f"Некорректный агрегат: {value}(...)")
+            column = None if inner[0][1] == "*" else inner[0][1]
+            if column is None and func != "count":
+                raise ValueError(f"{func}(*) не поддерживается.")
+            items.append((func, column))
+            pos += 4
+        else:
+            items.append(("column", value))
+            pos += 1
+        if tokens[pos:pos + 1] == [("punct", ",")]:
+            pos += 1
+        elif pos < len(tokens) and not is_keyword(tokens[pos], "from"):
+            raise ValueError(f"Ожидалась запятая, а не {tokens[pos][1]!r}.")
+    return items, pos
+
+def parse_select(text: str) -> dict:
+    """
+    Разбирает select [<агрегаты> | <столбцы>] from <таблица>
+    [where <условие>] [group by <столбец>] [limit N] [offset M] в словарь
+    {"items", "columns", "table", "where", "group_by", "limit", "offset"}.
+    items — None для обычного select; columns — список столбцов
+    (проекция) или None, если нужны все.
+    """
+    tokens = tokenize(text)
+    items, pos = parse_items(tokens, 1)
+    if pos + 1 >= len(tokens) or tokens[pos + 1][0] != "word":
+        raise ValueError(f"Некорректное значение: {text}. Попробуйте снова.")
+
+    query = {
+        "items": items or None,
+        "columns": None,
+        "table": tokens[pos + 1][1],
+        "join": None,
+        "where": None,
+        "group_by": None,
+        "limit": None,
+        "offset": 0,
+    }
+    pos += 2
+
+    # join <таблица> on <таблица>.<столбец> = <таблица>.<столбец>
+    if pos < len(tokens) and is_keyword(tokens[pos], "join"):
+        clause = tokens[pos + 1:pos + 6]
+        if (
+            len(clause) != 5
+            or clause[0][0] != "word"
+            or not is_keyword(clause[1], "on")
+            or clause[2][0] != "word"
+            or clause[3] != ("op", "=")
+            or clause[4][0] != "word"
+        ):
+            raise ValueError(
+                "Ожидалось join <таблица> on <таблица>.<столбец> = "
+                "<таблица>.<столбец>."
+            )
+        if items:
+            raise ValueError("Агрегаты и список столбцов с join не поддерживаются.")
+        query["join"] = {"table": clause[0][1], "on": (clause[2][1], clause[4][1])}
+        pos += 6
+
+    seen = set()
+    while pos < len(tokens):
+        kind, value = tokens[pos]
+        keyword = value.lower() if kind == "word" else None
+        if keyword not in SELECT_CLAUSES or keyword in seen:
+            raise ValueError(f"Некорректное значение: {value}. Попробуйте снова.")
+        seen.add(keyword)
+
+        if keyword == "where":
+            query["where"], pos = parse_where(tokens, pos + 1, SELECT_CLAUSES)
             continue
 
-        # 3. Разбираем строку на команду и аргументы
-        try:
-            args = shlex.split(user_input)
-        except ValueError:
-            # строка некорректно разбита (например, незакрытые кавычки)
-            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+        if keyword == "group":
+            by = tokens[pos + 1:pos + 3]
+            if len(by) != 2 or not is_keyword(by[0], "by") or by[1][0] != "word":
+                raise ValueError("Ожидалось group by <столбец>.")
+            query["group_by"] = by[1][1]
+            pos += 3
             continue
 
-        command = args[0]
+        if pos + 1 >= len(tokens) or tokens[pos + 1][0] != "int" \
+                or tokens[pos + 1][1] < 0:
+            raise ValueError(f"Некорректное значение {keyword}.")
+        query[keyword] = tokens[pos + 1][1]
+        pos += 2
+
+    if query["group_by"] is not None and not items:
+        raise ValueError("group by используется только с агрегатами.")
+    if items and query["group_by"] is None and all(
+        func == "column" for func, _ in items
+    ):
+        # select name, age from ... — проекция, а не агрегаты
+        columns = [column for _, column in items]
+        for column in columns:
+            if columns.count(column) > 1:
+                raise ValueError(f"Столбец {column} указан дважды.")
+        query["items"], query["columns"] = None, columns
+    return query
+
+def parse_where_clause(text: str) -> tuple:
+    """Разбирает условие после первого слова where в команде."""
+    tokens = tokenize(text)
+    for pos, token in enumerate(tokens):
+        if is_keyword(token, "where"):
+            return parse_where(tokens, pos + 1)[0]
+    raise ValueError(f"Некорректное значение: {text}. Попробуйте снова.")
+
+def print_stats(args: list[str]) -> None:
+    """Метрики процесса: таблица, JSON (на экран или в файл) или сброс."""
+    if args == ["reset"]:
+        metrics.reset()
+        print("Метрики сброшены.")
+        return
+
+    data = metrics.snapshot()
+    data["cache"] = select_cache.stats()
+    data["locks"] = lock_stats()
+
+    if args[:1] == ["json"] and len(args) <= 2:
+        text = json.dumps(data, ensure_ascii=False, indent=2)
+        if len(args) == 2:
+            with open(args[1], "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+            print(f"Метрики записаны в {args[1]}.")
+        else:
+            print(text)
+        return
+    if args:
+        print(f"Некорректное значение: {' '.join(args)}. Попробуйте снова.")
+        return
+
+    # импорт здесь: prettytable нужен только при выводе таблицей
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.field_names = ["фаза", "count", "total_ms", "avg_ms", "p50_ms",
+                         "p95_ms", "p99_ms", "max_ms"]
+    for phase, summary in data["phases"].items():
+        table.add_row([phase, *summary.values()])
+    print(table)
+    for name, value in data["counters"].items():
+        print(f"{name}: {value}")
+
+def run() -> None:
+    """Интерактивный режим: команды по одной из prompt."""
+    # импорт здесь: prompt нужен только интерактивному режиму
+    import prompt
 
-        # 4. Обработка команды
+    # таблицы и метаданные живут в памяти между командами и
+    # перечитываются с диска, только если файлы изменились
+    buffer = TableBuffer()
+    recover_trash(buffer.load_metadata(META_FILE))
 
-        if command == "exit":
+    while True:
+        user_input = prompt.string(">>>Введите команду: ")
+        if not execute(user_input, buffer):
             break
-            
-        elif command == "help":
-            print_help()
 
-        elif command == "list_tables":
-            if metadata:
-                for name in metadata.keys():
-                    print(f"- {name}")
-            else:
- 
-                print("Таблиц нет.")
 
-        elif command == "create_table":
-            # ожидается: create_table <имя> <столбец1:тип> ...
-            if len(args) < 3:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+def run_script(lines, auto_confirm: bool = False) -> None:
+    """
+    Пакетный режим: выполняет команды из lines (файл или stdin) подряд.
+    Таблицы загружаются один раз и остаются в памяти, изменения
+    сбрасываются на диск в конце или по команде checkpoint.
+    Пустые строки и комментарии (# или --) пропускаются.
+    """
+    set_auto_confirm(auto_confirm, script=True)
+    buffer = TableBuffer(flush_every=0)
+    recover_trash(buffer.load_metadata(META_FILE))
+
+    try:
+        for line in lines:
+            line = line.strip()
+            if line.endswith(";"):
+                line = line[:-1].rstrip()
+            if not line or line.startswith(("#", "--")):
                 continue
+            if not execute(line, buffer):
+                break
+    finally:
+        if buffer.transaction is not None:
+            # скрипт кончился без commit — изменения транзакции отменяются
+            finish_transaction(buffer, buffer.load_metadata(META_FILE), False)
+        buffer.flush_all()
+
+
+# команды, которые меняют таблицу (args[позиция] — её имя)
+WRITE_COMMANDS = {
+    "create_table": 1,
+    "drop_table": 1,
+    "create_index": 1,
+    "drop_index": 1,
+    "insert": 2,
+    "import": 1,
+    "update": 1,
+    "delete": 2,
+    "compact": 1,
+    "convert": 1,
+}
+
+# изменяющие команды, разрешённые внутри транзакции: остальные
+# (create_table, import, compact, ...) пишут на диск сразу
+TRANSACTION_COMMANDS = {"insert", "update", "delete"}
+
+def finish_transaction(buffer: TableBuffer, metadata: dict, commit: bool) -> None:
+    """commit или rollback открытой транзакции."""
+    try:
+        tables = buffer.commit() if commit else buffer.rollback(metadata)
+    except ValueError as e:
+        print(e)
+        return
+    # результаты select по изменённым таблицам сбрасываются один раз
+    select_cache.end_deferred()
+    if not commit:
+        print("Транзакция отменена.")
+    elif tables:
+        print(f"Транзакция зафиксирована. Изменены таблицы: {', '.join(tables)}.")
+    else:
+        print("Транзакция зафиксирована.")
+
+def split_explain(user_input: str) -> tuple[bool, str]:
+    """explain [analyze] <запрос> -> (analyze ли, текст запроса)."""
+    parts = user_input.split(None, 1)
+    text = parts[1] if len(parts) > 1 else ""
+    words = text.split(None, 1)
+    if words and words[0].lower() == "analyze":
+        return True, words[1] if len(words) > 1 else ""
+    return False, text
+
+def lock_plan(args: list[str], user_input: str) -> tuple[list[str], bool]:
+    """
+    Какие таблицы команда читает или меняет: (имена, нужна ли
+    исключительная блокировка). Для некорректной команды — пустой список,
+    ошибку выведет сама команда.
+    """
+    command = args[0]
+    if command in WRITE_COMMANDS:
+        pos = WRITE_COMMANDS[command]
+        return args[pos:pos + 1], True
+    if command == "info":
+        return args[1:2], False
+    if command == "explain":
+        text = split_explain(user_input)[1]
+        if not text.lower().startswith("select"):
+            return [], False
+        return lock_plan(["select"], text)
+    if command == "select":
+        try:
+            query = parse_select(user_input)
+        except ValueError:
+            return [], False
+        names = [query["table"]]
+        if query["join"] is not None:
+            names.append(query["join"]["table"])
+        return names, False
+    return [], False
+
+def execute(user_input: str, buffer: TableBuffer) -> bool:
+    """
+    Выполняет одну команду. Возвращает False, если пора выходить.
+    """
+    # 1. Пропускаем пустую команду
+    user_input = user_input.strip()
+    if not user_input:
+        return True
 
-            table_name = args[1]
-            columns = args[2:]
-
-            old_metadata = metadata.copy()
-            metadata = create_table(metadata, table_name, columns)
+    with metrics.command(user_input):
+        return _execute(user_input, buffer)
 
-            # если метаданные изменились — сохраняем
-            if metadata != old_metadata:
-                save_metadata(META_FILE, metadata)
+def _execute(user_input: str, buffer: TableBuffer) -> bool:
+    # 2. Разбираем строку на команду и аргументы
+    with metrics.timed("parse"):
+        try:
+            args = shlex.split(user_input)
+        except ValueError:
+            # строка некорректно разбита (например, незакрытые кавычки)
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
+        table_names, exclusive = lock_plan(args, user_input)
+
+    if (
+        buffer.transaction is not None
+        and exclusive
+        and args[0] not in TRANSACTION_COMMANDS
+    ):
+        print(
+            f"Команда {args[0]} недоступна внутри транзакции: "
+            "сначала commit или rollback."
+        )
+        return True
+
+    # 3. Блокируем таблицы команды: читатели не мешают друг другу,
+    # писатель работает с таблицей один
+    try:
+        with buffer.locks.hold(table_names, exclusive):
+            # метаданные читаются под блокировкой: их могли поменять
+            # другие процессы
+            metadata = buffer.load_metadata(META_FILE)
+            if buffer.transaction is not None and exclusive:
+                # до первого изменения таблицы запоминается, как её откатить
+                for table_name in table_names:
+                    buffer.touch(table_name)
+            keep_going = dispatch(args, user_input, metadata, buffer)
+    except TimeoutError as e:
+        print(f"Ошибка: {e}")
+        return True
+    # в пакетном режиме таблица, чьи изменения уже на диске, не должна
+    # ждать конца скрипта: читатели других процессов ждали бы её блокировку
+    buffer.release_saved()
+    return keep_going
+
+def dispatch(
+    args: list[str], user_input: str, metadata: dict, buffer: TableBuffer
+) -> bool:
+    """Обработка разобранной команды. Возвращает False, если пора выходить."""
+    command = args[0]
+
+    if command == "exit":
+        if buffer.transaction is not None:
+            finish_transaction(buffer, metadata, False)
+        buffer.flush_all()
+        return False
+        
+    elif command == "help":
+        print_help()
+
+    elif command == "output":
+        # output <table|plain|tsv|jsonl|pager>
+        if len(args) != 2 or args[1] not in output.OUTPUT_MODES:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
+        output.set_output_mode(args[1])
+        print(f"Режим вывода: {args[1]}")
 
-        elif command == "drop_table":
-            # ожидается: drop_table <имя_таблицы>
-            if len(args) != 2:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+    elif command == "checkpoint":
+        if buffer.transaction is not None:
+            print("Внутри транзакции изменения пишутся на диск по commit.")
+            return True
+        buffer.flush_all()
 
-            table_name = args[1]
-            old_metadata = metadata.copy()
-            metadata = drop_table(metadata, table_name)
+    elif command == "begin":
+        try:
+            buffer.begin(metadata)
+        except ValueError as e:
+            print(e)
+            return True
+        select_cache.defer_invalidation()
+        print("Транзакция начата.")
+
+    elif command in ("commit", "rollback"):
+        finish_transaction(buffer, metadata, command == "commit")
+
+    elif command == "cache_stats":
+        for name, value in select_cache.stats().items():
+            print(f"{name}: {value}")
+
+    elif command == "lock_stats":
+        for name, value in lock_stats().items():
+            print(f"{name}: {value}")
+
+    elif command == "stats":
+        # stats | stats json [файл] | stats reset
+        print_stats(args[1:])
+
+    elif command == "list_tables":
+        if metadata:
+            for name in metadata.keys():
+                print(f"- {name}")
+        else:
+ 
+            print("Таблиц нет.")
 
-            if metadata != old_metadata:
-                # сохраняем обновлённые метаданные
-                save_metadata(META_FILE, metadata)
+    elif command == "create_table":
+        # ожидается: create_table <имя> <столбец1:тип> ...
+        if len(args) < 3:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-                # удаляем файл с данными таблицы, если он есть
-                data_path = Path("data") / f"{table_name}.json"
-                if data_path.exists():
-                    data_path.unlink()
-                
- # ===== CRUD по данным =====
+        table_name = args[1]
+        columns = args[2:]
 
-        elif command == "insert":
-            # ожидаем: insert into <имя_таблицы> values (<значение1>, <значение2>, ...)
-            if len(args) < 4 or args[1] != "into" or "values" not in args:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+        old_metadata = metadata.copy()
+        metadata = create_table(metadata, table_name, columns)
 
-            table_name = args[2]
+        # если метаданные изменились — сохраняем
+        if metadata != old_metadata:
+            buffer.save_metadata(META_FILE, metadata, table_name)
 
-            values_index = args.index("values") + 1
-            raw_values = args[values_index:]
+    elif command == "drop_table":
+        # ожидается: drop_table <имя_таблицы>
+        if len(args) != 2:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
+
+        table_name = args[1]
+        old_metadata = metadata.copy()
+        metadata = drop_table(metadata, table_name)
+
+        if metadata != old_metadata:
+            # файлы -> корзина, затем метаданные без таблицы (момент
+            # удаления), затем корзина стирается; прерванное сбоем
+            # удаление доводит до конца recover_trash при запуске
+            buffer.discard(table_name)
+            trash = move_to_trash(table_name)
+            buffer.save_metadata(META_FILE, metadata, table_name)
+            empty_trash(trash)
+
+    elif command in ("create_index", "drop_index"):
+        # create_index <имя_таблицы> <столбец> [hash|sorted]
+        # drop_index <имя_таблицы> <столбец>
+        max_args = 4 if command == "create_index" else 3
+        if not 3 <= len(args) <= max_args:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            # убираем запятые и крайние скобки
-            cleaned = []
-            for v in raw_values:
-                v = v.strip()
-                if v.endswith(","):
-                    v = v[:-1]
-                v = v.lstrip("(").rstrip(")")
-                cleaned.append(v)
+        old_metadata = copy.deepcopy(metadata)
+        if command == "create_index":
+            metadata = create_index(metadata, *args[1:])
+        else:
+            metadata = drop_index(metadata, *args[1:])
 
-            table_data = load_table_data(table_name)
+        if metadata is not None and metadata != old_metadata:
+            buffer.save_metadata(META_FILE, metadata, args[1])
+            
+ # ===== CRUD по данным =====
 
-            table_data = insert(metadata, table_name, table_data, cleaned)
-            if table_data is None:
-                # декоратор handle_db_errors уже вывел сообщение
-                continue
+    elif command == "insert":
+        # ожидаем: insert into <имя_таблицы> values (<значение1>, <значение2>, ...)
+        if len(args) < 4 or args[1] != "into" or "values" not in args:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            save_table_data(table_name, table_data)
-            new_id = table_data[-1]["ID"]
-            print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
+        table_name = args[2]
 
-        elif command == "select":
-            # select from <имя_таблицы>
-            # select from <имя_таблицы> where <условие>
-            if len(args) < 3 or args[1] != "from":
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+        # значения берём из исходной строки: в кавычках могут быть
+        # пробелы, запятые и скобки
+        values_match = re.search(r"\bvalues\b", user_input)
+        try:
+            rows = parse_values(user_input[values_match.end():])
+        except ValueError as e:
+            print(e)
+            return True
 
-            table_name = args[2]
-            table_data = load_table_data(table_name)
-
-            where_clause = None
-            if "where" in args:
-                where_index = args.index("where") + 1
-                condition_str = " ".join(args[where_index:])
-                try:
-                    where_clause = parse_condition(condition_str)
-                except ValueError as e:
-                    print(e)
-                    continue
-
-            rows = select(table_name, table_data, where_clause)
-            if rows is None:
-                # декоратор обработал ошибку
-                continue
+        table_data = buffer.get(table_name, metadata.get(table_name))
 
-            if not rows:
-                print("Записей не найдено.")
-            else:
-                table = PrettyTable()
-                table.field_names = list(rows[0].keys())
-                for row in rows:
-                    table.add_row([row[col] for col in table.field_names])
-                print(table)
-                
-        elif command == "update":
-            # update <имя_таблицы> set <...> where <...>
-            if len(args) < 6 or args[2] != "set" or "where" not in args:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+        if len(rows) == 1:
+            table_data = insert(metadata, table_name, table_data, rows[0])
+        else:
+            table_data = insert_many(metadata, table_name, table_data, rows)
+        if table_data is None:
+            # декоратор handle_db_errors уже вывел сообщение
+            return True
+
+        # сначала счётчик ID, потом данные: при сбое между ними
+        # ID просто пропадёт, но никогда не будет выдан повторно
+        buffer.mark_metadata(META_FILE, metadata, table_name)
+        buffer.save(table_name)
+        new_id = table_data[-1]["ID"]
+        if len(rows) == 1:
+            print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
+        else:
+            first_id = new_id - len(rows) + 1
+            print(
+                f"Записи с ID={first_id}..{new_id} ({len(rows)} шт.) успешно "
+                f'добавлены в таблицу "{table_name}".'
+            )
+
+    elif command == "import":
+        # import <имя_таблицы> <файл.csv|файл.jsonl>
+        if len(args) != 3:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            table_name = args[1]
-            where_pos = args.index("where")
+        table_name, path = args[1], args[2]
 
-            set_str = " ".join(args[3:where_pos])
-            where_str = " ".join(args[where_pos + 1:])
+        if table_name not in metadata:
+            print(f'Таблица "{table_name}" не существует.')
+            return True
 
-            try:
-                set_clause = parse_condition(set_str)
-                where_clause = parse_condition(where_str)
-            except ValueError as e:
-                print(e)
-                continue
+        table_data = buffer.get(table_name, metadata[table_name])
+        columns = dict(list(metadata[table_name]["columns"].items())[1:])
+        imported = 0
+        try:
+            # импорт здесь: csv нужен только команде import
+            from .importer import iter_chunks
+
+            for chunk in iter_chunks(path, columns):
+                if insert_many(metadata, table_name, table_data, chunk) is None:
+                    break
+                # каждая пачка сохраняется сразу: счётчик ID, затем данные
+                buffer.mark_metadata(META_FILE, metadata, table_name)
+                buffer.save(table_name)
+                buffer.flush(table_name)
+                imported += len(chunk)
+        except (OSError, ValueError) as e:
+            print(f"Ошибка импорта: {e}")
+
+        print(f'Импортировано записей в таблицу "{table_name}": {imported}.')
+
+    elif command == "select":
+        # select [<агрегаты> | <столбцы>] from <имя_таблицы> [where <условие>]
+        # [group by <столбец>] [limit N] [offset M]
+        if len(args) < 3 or "from" not in args:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            table_data = load_table_data(table_name)
-            table_data = update(table_data, set_clause, where_clause)
-            if table_data is None:
-                # декоратор обработал ошибку
-                continue
+        try:
+            query = parse_select(user_input)
+        except ValueError as e:
+            print(e)
+            return True
+
+        # планировщик выбирает путь: статистика, кэш, индекс или просмотр
+        plan = plan_select(query, metadata, buffer)
+        if plan is None:
+            # ошибка уже напечатана
+            return True
+        rows, field_names = execute_plan(plan, metadata, buffer)
+        if rows is None:
+            # декоратор обработал ошибку
+            return True
+
+        output.print_rows(rows, field_names)
+
+    elif command == "explain":
+        # explain [analyze] select ...
+        analyze_mode, text = split_explain(user_input)
+        if not text.lower().startswith("select"):
+            print("explain поддерживает только select.")
+            return True
 
-            save_table_data(table_name, table_data)
-            print(f'Записи в таблице "{table_name}" успешно обновлены.')
+        try:
+            query = parse_select(text)
+        except ValueError as e:
+            print(e)
+            return True
+
+        plan = plan_select(query, metadata, buffer)
+        if plan is None:
+            return True
+        if analyze_mode and not analyze(plan, metadata, buffer):
+            return True
+        print("\n".join(plan.lines()))
+
+    elif command == "update":
+        # update <имя_таблицы> set <...> where <...>
+        if len(args) < 6 or args[2] != "set" or "where" not in args:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-        elif command == "delete":
-            # delete from <имя_таблицы> where <...>
-            if len(args) < 5 or args[1] != "from" or "where" not in args:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+        table_name = args[1]
+        where_pos = args.index("where")
 
-            table_name = args[2]
-            where_pos = args.index("where")
-            where_str = " ".join(args[where_pos + 1:])
+        set_str = " ".join(args[3:where_pos])
 
-            try:
-                where_clause = parse_condition(where_str)
-            except ValueError as e:
-                print(e)
-                continue
+        try:
+            set_clause = parse_condition(set_str)
+            where_clause = parse_where_clause(user_input)
+        except ValueError as e:
+            print(e)
+            return True
+
+        table_data = buffer.get(table_name, metadata.get(table_name))
+        table_data = update(table_data, set_clause, where_clause)
+        if table_data is None:
+            # декоратор обработал ошибку
+            return True
+
+        buffer.save(table_name)
+        print(f'Записи в таблице "{table_name}" успешно обновлены.')
+
+    elif command == "delete":
+        # delete from <имя_таблицы> where <...>
+        if len(args) < 5 or args[1] != "from" or "where" not in args:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            table_data = load_table_data(table_name)
-            table_data = delete(table_data, where_clause)
-            if table_data is None:
-                # декоратор обработал ошибку
-                continue
+        table_name = args[2]
 
-            save_table_data(table_name, table_data)
-            print(f'Записи в таблице "{table_name}" успешно удалены.')
+        try:
+            where_clause = parse_where_clause(user_input)
+        except ValueError as e:
+            print(e)
+            return True
 
+        table_data = buffer.get(table_name, metadata.get(table_name))
+        table_data = delete(table_data, where_clause)
+        if table_data is None:
+            # декоратор обработал ошибку
+            return True
 
-        elif command == "info":
-            # info <имя_таблицы>
-            if len(args) != 2:
-                print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-                continue
+        buffer.save(table_name)
+        print(f'Записи в таблице "{table_name}" успешно удалены.')
 
-            table_name = args[1]
 
-            if table_name not in metadata:
-                print(f'Таблица "{table_name}" не существует.')
-                continue
+    elif command == "info":
+        # info <имя_таблицы>
+        if len(args) != 2:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
+
+        table_name = args[1]
+
+        if table_name not in metadata:
+            print(f'Таблица "{table_name}" не существует.')
+            return True
+
+        table_meta = metadata[table_name]
+        schema = table_meta["columns"]
+        # число записей — из статистики, таблица читается только без неё
+        rows = buffer.row_count(table_name, table_meta)
+
+        cols_str = ", ".join(f"{name}:{typ}" for name, typ in schema.items())
+        print(f"Таблица: {table_name}")
+        print(f"Столбцы: {cols_str}")
+        print(f"Количество записей: {rows}")
+        print(f"Формат хранения: {table_meta.get('format', 'json')}")
+        compression = table_meta.get("compression")
+        if compression:
+            print(f"Сжатие: {compression['codec']}, уровень {compression['level']}")
+        indexes = metadata[table_name].get("indexes", {})
+        if indexes:
+            idx_str = ", ".join(f"{col}:{kind}" for col, kind in indexes.items())
+            print(f"Индексы: {idx_str}")
+
+    elif command == "compact":
+        # compact <имя_таблицы>
+        if len(args) != 2:
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
-            schema = metadata[table_name]
-            table_data = load_table_data(table_name)
+        table_name = args[1]
 
-            cols_str = ", ".join(f"{name}:{typ}" for name, typ in schema.items())
-            print(f"Таблица: {table_name}")
-            print(f"Столбцы: {cols_str}")
-            print(f"Количество записей: {len(table_data)}")
+        if table_name not in metadata:
+            print(f'Таблица "{table_name}" не существует.')
+            return True
 
-        else:
-            print(f"Функции {command} нет. Попробуйте снова.")
+        buffer.compact(table_name, metadata[table_name])
+        print(f'Журнал таблицы "{table_name}" свёрнут в снимок.')
 
+    elif command == "convert":
+        # convert <имя_таблицы> --format <json|binary|segmented|compressed>
+        # [--codec zlib|lzma] [--level 0-9]
+        if len(args) < 4 or len(args) % 2 or args[2] != "--format":
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
 
+        table_name, fmt = args[1], args[3]
+        options = dict(zip(args[4::2], args[5::2]))
+        if set(options) - {"--codec", "--level"} or (
+            options and fmt != "compressed"
+        ):
+            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+            return True
+
+        if table_name not in metadata:
+            print(f'Таблица "{table_name}" не существует.')
+            return True
+        if fmt not in STORAGE_FORMATS:
+            print(f"Некорректное значение: {fmt}. Попробуйте снова.")
+            return True
+
+        compression = None
+        if fmt == "compressed":
+            settings = {"codec": options.get("--codec", DEFAULT_CODEC)}
+            level = options.get("--level")
+            if level is not None:
+                settings["level"] = int(level) if level.isdigit() else level
+            try:
+                compression = check_compression(settings)
+            except ValueError as e:
+                print(e)
+                return True
+
+        # новый снимок -> метаданные -> удаление старых файлов:
+        # при сбое на любом шаге таблица читается целиком
+        table_data = buffer.get(table_name, metadata[table_name])
+        write_snapshot(table_name, table_data, fmt, compression=compression)
+        metadata[table_name]["format"] = fmt
+        if compression is not None:
+            metadata[table_name]["compression"] = compression
+        else:
+            metadata[table_name].pop("compression", None)
+        metadata[table_name]["stats"] = table_data.stats()
+        buffer.save_metadata(META_FILE, metadata, table_name)
+        buffer.discard(table_name)
+        remove_stale_files(table_name, fmt)
+        print(f'Таблица "{table_name}" переведена в формат {fmt}.')
 
+    else:
+        print(f"Функции {command} нет. Попробуйте снова.")
 
+    return True
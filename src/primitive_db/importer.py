@@ -0,0 +1,97 @@
+# src/primitive_db/importer.py
+
+import csv
+import json
+from itertools import islice
+from pathlib import Path
+
+# сколько строк файла вставляется и сохраняется за один раз
+CHUNK_SIZE = 10_000
+
+IMPORT_FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+
+
+def _csv_rows(f, column_names: list[str]):
+    """
+    Строки CSV-файла в порядке столбцов таблицы.
+    Первая строка файла — заголовок с именами столбцов; столбец ID,
+    если он есть, игнорируется: ID выдаёт счётчик таблицы.
+    """
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip() for name in header]
+
+    missing = [name for name in column_names if name not in header]
+    if missing:
+        raise ValueError(f"В заголовке CSV нет столбцов: {', '.join(missing)}")
+
+    positions = [header.index(name) for name in column_names]
+    for line_no, record in enumerate(reader, start=2):
+        if not record:
+            continue
+        if len(record) != len(header):
+            raise ValueError(f"Строка {line_no}: ожидалось {len(header)} значений.")
+        yield [record[pos] for pos in positions]
+
+
+def _json_type_ok(value, type_name: str) -> bool:
+    """Значение JSON подходит столбцу: int без bool, bool, str."""
+    if type_name == "int":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if type_name == "bool":
+        return isinstance(value, bool)
+    return isinstance(value, str)
+
+
+def _jsonl_rows(f, columns: dict[str, str]):
+    """
+    Строки JSONL-файла (по объекту на строку) в порядке столбцов таблицы.
+    Значения не приводятся, а проверяются: у каждого должен быть
+    JSON-тип своего столбца (null, 1.7 в int-столбце и т. п. — ошибка).
+    """
+    for line_no, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"Строка {line_no}: некорректный JSON ({e})") from e
+        if not isinstance(record, dict):
+            raise ValueError(f"Строка {line_no}: ожидался JSON-объект.")
+
+        values = []
+        for name, type_name in columns.items():
+            if name not in record:
+                raise ValueError(f"Строка {line_no}: нет столбца '{name}'")
+            value = record[name]
+            if not _json_type_ok(value, type_name):
+                raise ValueError(
+                    f"Строка {line_no}: значение {json.dumps(value)} "
+                    f"столбца '{name}' не типа {type_name}."
+                )
+            values.append(value)
+        yield values
+
+
+def iter_chunks(path: str, columns: dict[str, str], chunk_size: int = CHUNK_SIZE):
+    """
+    Читает CSV или JSONL-файл потоково и отдаёт строки пачками
+    по chunk_size, не загружая весь файл в память.
+    columns — столбцы таблицы без ID: {имя: тип}.
+    """
+    fmt = IMPORT_FORMATS.get(Path(path).suffix.lower())
+    if fmt is None:
+        raise ValueError(f"Неподдерживаемый формат файла: {path}")
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = _csv_rows(f, list(columns)) if fmt == "csv" else _jsonl_rows(
+            f, columns
+        )
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            yield chunk
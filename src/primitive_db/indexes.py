@@ -0,0 +1,134 @@
+# src/primitive_db/indexes.py
+
+from bisect import bisect_left, bisect_right, insort
+from math import inf
+from typing import Any
+
+INDEX_KINDS = {"hash", "sorted"}
+
+
+class HashIndex:
+    """
+    Хэш-индекс по столбцу: значение -> множество ID строк.
+    Поиск по равенству за O(1).
+    """
+
+    kind = "hash"
+
+    def __init__(self, column: str):
+        self.column = column
+        self.buckets: dict[Any, set[int]] = {}
+
+    def add(self, value: Any, row_id: int) -> None:
+        self.buckets.setdefault(value, set()).add(row_id)
+
+    def add_many(self, values, ids) -> None:
+        for value, row_id in zip(values, ids):
+            self.add(value, row_id)
+
+    def remove(self, value: Any, row_id: int) -> None:
+        bucket = self.buckets.get(value)
+        if bucket is None:
+            return
+        bucket.discard(row_id)
+        if not bucket:
+            del self.buckets[value]
+
+    def lookup(self, value: Any) -> list[int]:
+        return sorted(self.buckets.get(value, ()))
+
+
+class SortedIndex:
+    """
+    Упорядоченный индекс по столбцу: отсортированный список пар (значение, ID).
+    Поиск по равенству и по диапазону за O(log n).
+    """
+
+    kind = "sorted"
+
+    def __init__(self, column: str):
+        self.column = column
+        self.entries: list[tuple[Any, int]] = []
+
+    def add(self, value: Any, row_id: int) -> None:
+        insort(self.entries, (value, row_id))
+
+    def add_many(self, values, ids) -> None:
+        """
+        Добавляет пачку пар (multi-row insert, import): insort на каждую
+        строку сдвигал бы весь список. Новые пары дописываются в конец,
+        и список сортируется один раз — Timsort сливает два готовых
+        упорядоченных куска за O(n + k).
+        """
+        new = sorted(zip(values, ids))
+        if not new:
+            return
+        entries = self.entries
+        tail_sorted = not entries or entries[-1] <= new[0]
+        entries.extend(new)
+        if not tail_sorted:
+            entries.sort()
+
+    def remove(self, value: Any, row_id: int) -> None:
+        pos = bisect_left(self.entries, (value, row_id))
+        if pos < len(self.entries) and self.entries[pos] == (value, row_id):
+            del self.entries[pos]
+
+    def lookup(self, value: Any) -> list[int]:
+        return self.range(value, value)
+
+    def range(
+        self,
+        low: Any = None,
+        high: Any = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ) -> list[int]:
+        """
+        Возвращает ID строк, у которых значение лежит между low и high.
+        None означает, что граница не задана.
+        """
+        entries = self.entries
+        try:
+            if low is None:
+                start = 0
+            elif include_low:
+                start = bisect_left(entries, (low,))
+            else:
+                start = _bisect_after(entries, low)
+
+            if high is None:
+                stop = len(entries)
+            elif include_high:
+                stop = _bisect_after(entries, high)
+            else:
+                stop = bisect_left(entries, (high,))
+        except TypeError:
+            # значение другого типа, чем в столбце, — совпадений нет
+            return []
+
+        return sorted(row_id for _, row_id in entries[start:stop])
+
+
+def _bisect_after(entries: list[tuple[Any, int]], value: Any) -> int:
+    """Позиция первой пары, значение которой строго больше value."""
+    return bisect_right(entries, (value, inf))
+
+
+def build_index(kind: str, column: str, values, ids) -> HashIndex | SortedIndex:
+    """
+    Строит индекс kind ("hash" или "sorted") по столбцу column.
+    values и ids — значения столбца и ID строк в одном порядке.
+    """
+    if kind == "hash":
+        index = HashIndex(column)
+        for value, row_id in zip(values, ids):
+            index.add(value, row_id)
+        return index
+
+    if kind == "sorted":
+        index = SortedIndex(column)
+        index.entries = sorted(zip(values, ids))
+        return index
+
+    raise ValueError(f"Неизвестный тип индекса: {kind}")
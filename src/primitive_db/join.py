@@ -0,0 +1,265 @@
+# src/primitive_db/join.py
+
+from array import array
+from pathlib import Path
+
+from .predicates import (
+    columns_of,
+    compile_where,
+    conjuncts,
+    join_all,
+    map_columns,
+)
+
+# сколько памяти (в байтах) может занимать хэш-таблица стороны построения;
+# если больше — обе стороны раскладываются по разделам на диске
+JOIN_MEMORY_LIMIT = 64 * 1024 * 1024
+
+# примерный объём одной записи хэш-таблицы: ключ, список позиций, слот словаря
+ENTRY_BYTES = 100
+
+# сколько позиций копится в памяти для раздела перед дописыванием в файл
+SPILL_CHUNK = 65_536
+
+
+def _split_ref(ref: str, names: tuple[str, str]) -> tuple[str, str]:
+    """'users.ID' -> ('users', 'ID'); таблица должна участвовать в join."""
+    table_name, dot, column = ref.partition(".")
+    if not dot or table_name not in names:
+        raise ValueError(f"Ожидалось <таблица>.<столбец> из {names}: {ref}")
+    return table_name, column
+
+
+def _qualifier(left_name, left, right_name, right):
+    """
+    Функция, приводящая имя столбца в условии к виду <таблица>.<столбец>.
+    Имя без таблицы допустимо, если столбец есть только в одной из таблиц.
+    """
+    def qualify(column: str) -> str:
+        if "." in column:
+            table_name, column_name = _split_ref(column, (left_name, right_name))
+            schema = left.schema if table_name == left_name else right.schema
+            if column_name not in schema:
+                raise KeyError(column)
+            return column
+        owners = [
+            name for name, table in ((left_name, left), (right_name, right))
+            if column in table.schema
+        ]
+        if len(owners) != 1:
+            if not owners:
+                raise KeyError(column)
+            raise ValueError(f"Столбец {column} есть в обеих таблицах: "
+                             f"укажите {left_name}.{column} или {right_name}.{column}")
+        return f"{owners[0]}.{column}"
+
+    return qualify
+
+
+def _split_where(where, left_name, left, right_name, right):
+    """
+    Делит условие на части: условия на одну таблицу проверяются до
+    соединения (и могут использовать её индексы), остальное — на строках
+    результата. Возвращает (условие левой, условие правой, остаток).
+    """
+    if where is None:
+        return None, None, None
+
+    where = map_columns(where, _qualifier(left_name, left, right_name, right))
+    own: dict[str, list] = {left_name: [], right_name: []}
+    rest = []
+    for part in conjuncts(where):
+        tables = {column.split(".", 1)[0] for column in columns_of(part)}
+        if len(tables) == 1:
+            table_name = tables.pop()
+            own[table_name].append(
+                map_columns(part, lambda column: column.split(".", 1)[1])
+            )
+        else:
+            rest.append(part)
+
+    left_pred = compile_where(join_all(own[left_name]), left.schema)
+    right_pred = compile_where(join_all(own[right_name]), right.schema)
+    schema = {
+        f"{name}.{column}": type_name
+        for name, table in ((left_name, left), (right_name, right))
+        for column, type_name in table.schema.items()
+    }
+    residual = compile_where(join_all(rest), schema)
+    return left_pred, right_pred, residual
+
+
+def _positions(table_data, predicate):
+    if predicate is None:
+        return iter(range(len(table_data)))
+    return predicate.positions(table_data)
+
+
+def _row_maker(left_name, left, right_name, right):
+    """Собирает строку результата из позиций строк обеих таблиц."""
+    parts = []
+    for table_name, table in ((left_name, left), (right_name, right)):
+        parts.append([
+            (f"{table_name}.{column}", table.columns[column],
+             table.schema[column] == "bool")
+            for column in table.schema
+        ])
+    left_cols, right_cols = parts
+
+    def make(left_pos: int, right_pos: int) -> dict:
+        row = {}
+        for name, values, is_bool in left_cols:
+            value = values[left_pos]
+            row[name] = bool(value) if is_bool else value
+        for name, values, is_bool in right_cols:
+            value = values[right_pos]
+            row[name] = bool(value) if is_bool else value
+        return row
+
+    return make
+
+
+def hash_join(
+    left_name: str,
+    left,
+    right_name: str,
+    right,
+    on: tuple[str, str],
+    where=None,
+    memory_limit: int = JOIN_MEMORY_LIMIT,
+):
+    """
+    Соединяет таблицы по равенству on = ("a.col", "b.col").
+
+    Хэш-таблица строится по меньшей таблице (после её условий where),
+    другая таблица просматривается потоково, строки результата отдаются
+    генератором. Если хэш-таблица не помещается в memory_limit, обе
+    стороны раскладываются по хэшу ключа на разделы во временных файлах
+    (хранятся только позиции строк) и соединяются по разделу за раз.
+    """
+    if left_name == right_name:
+        raise ValueError("Соединение таблицы с самой собой не поддерживается.")
+
+    names = (left_name, right_name)
+    refs = dict(_split_ref(ref, names) for ref in on)
+    if len(refs) != 2:
+        raise ValueError("В on нужен столбец из каждой таблицы.")
+    left_col, right_col = refs[left_name], refs[right_name]
+    for table, column in ((left, left_col), (right, right_col)):
+        if column not in table.schema:
+            raise KeyError(column)
+    if left.schema[left_col] != right.schema[right_col]:
+        raise ValueError(
+            f"Типы столбцов {left_name}.{left_col} и {right_name}.{right_col} "
+            "не совпадают."
+        )
+
+    left_pred, right_pred, residual = _split_where(
+        where, left_name, left, right_name, right
+    )
+    make = _row_maker(left_name, left, right_name, right)
+
+    # строим по меньшей стороне, вторую читаем потоково
+    if len(right) <= len(left):
+        build, build_col, build_pred = right, right_col, right_pred
+        probe, probe_col, probe_pred = left, left_col, left_pred
+
+        def emit(probe_pos, build_pos):
+            return make(probe_pos, build_pos)
+    else:
+        build, build_col, build_pred = left, left_col, left_pred
+        probe, probe_col, probe_pred = right, right_col, right_pred
+
+        def emit(probe_pos, build_pos):
+            return make(build_pos, probe_pos)
+
+    build_positions = array("q", _positions(build, build_pred))
+    probe_positions = _positions(probe, probe_pred)
+    build_keys = build.columns[build_col]
+    probe_keys = probe.columns[probe_col]
+
+    if len(build_positions) * ENTRY_BYTES <= memory_limit:
+        pairs = _join_in_memory(
+            build_positions, build_keys, probe_positions, probe_keys
+        )
+    else:
+        partitions = -(-len(build_positions) * ENTRY_BYTES // memory_limit) * 2
+        pairs = _join_spilled(
+            build_positions, build_keys, probe_positions, probe_keys, partitions
+        )
+
+    rows = (emit(probe_pos, build_pos) for probe_pos, build_pos in pairs)
+    if residual is not None:
+        test = residual.bind_row()
+        rows = (row for row in rows if test(row))
+    return rows
+
+
+def _build_table(positions, keys) -> dict:
+    table: dict = {}
+    for pos in positions:
+        table.setdefault(keys[pos], []).append(pos)
+    return table
+
+
+def _join_in_memory(build_positions, build_keys, probe_positions, probe_keys):
+    """Пары (позиция probe, позиция build) с равными ключами."""
+    table = _build_table(build_positions, build_keys)
+    for probe_pos in probe_positions:
+        matches = table.get(probe_keys[probe_pos])
+        if matches:
+            for build_pos in matches:
+                yield probe_pos, build_pos
+
+
+def _spill(positions, keys, directory: Path, prefix: str, partitions: int) -> None:
+    """Раскладывает позиции по файлам разделов по хэшу ключа."""
+    chunks = [array("q") for _ in range(partitions)]
+    paths = [directory / f"{prefix}_{part}" for part in range(partitions)]
+
+    def write(part: int) -> None:
+        with paths[part].open("ab") as f:
+            chunks[part].tofile(f)
+        del chunks[part][:]
+
+    for pos in positions:
+        part = hash(keys[pos]) % partitions
+        chunks[part].append(pos)
+        if len(chunks[part]) >= SPILL_CHUNK:
+            write(part)
+    for part in range(partitions):
+        write(part)
+
+
+def _read_partition(path: Path):
+    """Позиции раздела порциями по SPILL_CHUNK."""
+    with path.open("rb") as f:
+        while True:
+            chunk = array("q")
+            chunk.frombytes(f.read(SPILL_CHUNK * chunk.itemsize))
+            if not chunk:
+                break
+            yield from chunk
+
+
+def _join_spilled(
+    build_positions, build_keys, probe_positions, probe_keys, partitions: int
+):
+    """
+    Соединение с разделами на диске: строки с равными ключами попадают
+    в раздел с одним номером, поэтому разделы соединяются независимо,
+    и в памяти одновременно держится хэш-таблица только одного раздела.
+    """
+    # импорт здесь: временные файлы нужны только большому соединению
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="primitive_db_join_") as tmp:
+        directory = Path(tmp)
+        _spill(build_positions, build_keys, directory, "build", partitions)
+        del build_positions
+        _spill(probe_positions, probe_keys, directory, "probe", partitions)
+
+        for part in range(partitions):
+            build_part = _read_partition(directory / f"build_{part}")
+            probe_part = _read_partition(directory / f"probe_{part}")
+            yield from _join_in_memory(build_part, build_keys, probe_part, probe_keys)
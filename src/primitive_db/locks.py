@@ -0,0 +1,191 @@
+# src/primitive_db/locks.py
+
+import fcntl
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from .utils import DATA_DIR
+
+# файлы блокировок: data/.locks/tables/<таблица>.lock и data/.locks/metadata.lock
+LOCK_DIR = DATA_DIR / ".locks"
+
+# сколько секунд ждать блокировку, прежде чем сдаться
+LOCK_TIMEOUT = 10.0
+
+# счётчики конкуренции за блокировки в этом процессе
+_stats = {"acquired": 0, "contended": 0, "timeouts": 0, "wait_seconds": 0.0}
+
+
+def set_lock_timeout(seconds: float) -> None:
+    global LOCK_TIMEOUT
+    LOCK_TIMEOUT = seconds
+
+
+def lock_stats() -> dict:
+    """
+    Счётчики блокировок: сколько взято, сколько раз пришлось ждать,
+    сколько раз ожидание кончилось по таймауту и сколько секунд ушло на ожидание.
+    """
+    stats = dict(_stats)
+    stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+    return stats
+
+
+def record_wait(seconds: float, timed_out: bool) -> None:
+    """Учитывает в счётчиках ожидание, которое вёл вызывающий (сервер)."""
+    _stats["contended"] += 1
+    _stats["wait_seconds"] += seconds
+    if timed_out:
+        _stats["timeouts"] += 1
+
+
+def _open_lock(path: Path) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+
+def _flock(fd: int, exclusive: bool, timeout: float, what: str) -> None:
+    """
+    Берёт flock, опрашивая его с нарастающей паузой. Если за timeout
+    секунд взять не удалось — TimeoutError.
+    """
+    op = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+    try:
+        fcntl.flock(fd, op)
+        _stats["acquired"] += 1
+        return
+    except BlockingIOError:
+        _stats["contended"] += 1
+
+    start = time.monotonic()
+    delay = 0.001
+    while True:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+        try:
+            fcntl.flock(fd, op)
+        except BlockingIOError:
+            waited = time.monotonic() - start
+            if waited >= timeout:
+                _stats["timeouts"] += 1
+                _stats["wait_seconds"] += waited
+                raise TimeoutError(
+                    f"{what} занята другим процессом дольше {timeout:g} с."
+                ) from None
+            continue
+        _stats["acquired"] += 1
+        _stats["wait_seconds"] += time.monotonic() - start
+        return
+
+
+@contextmanager
+def metadata_lock(timeout: float | None = None):
+    """Исключительная блокировка на чтение-изменение-запись метаданных."""
+    fd = _open_lock(LOCK_DIR / "metadata.lock")
+    try:
+        _flock(fd, True, LOCK_TIMEOUT if timeout is None else timeout, "Метаданные")
+        yield
+    finally:
+        os.close(fd)
+
+
+class TableLocks:
+    """
+    Блокировки таблиц, которые держит один сеанс (REPL или пакетный режим).
+
+    Читатели берут разделяемую блокировку и не мешают друг другу,
+    писатель — исключительную, поэтому читатель видит таблицу либо до,
+    либо после изменения целиком. Блокировки берутся в порядке имён,
+    чтобы два процесса не ждали друг друга по кругу.
+
+    Если keep_exclusive, исключительные блокировки держатся до release_all():
+    так пакетный режим не отдаёт таблицу другим процессам, пока его
+    изменения лежат только в памяти.
+    """
+
+    def __init__(self, keep_exclusive: bool = False):
+        self.keep_exclusive = keep_exclusive
+        # имя таблицы -> (дескриптор файла блокировки, исключительная ли)
+        self._held: dict[str, tuple[int, bool]] = {}
+
+    def acquire(self, table_name: str, exclusive: bool) -> None:
+        held = self._held.get(table_name)
+        if held is not None and (held[1] or not exclusive):
+            return
+        if held is None:
+            fd = _open_lock(LOCK_DIR / "tables" / f"{table_name}.lock")
+        else:
+            fd = held[0]
+        try:
+            _flock(fd, exclusive, LOCK_TIMEOUT, f'Таблица "{table_name}"')
+        except BaseException:
+            if held is None:
+                os.close(fd)
+            raise
+        self._held[table_name] = (fd, exclusive)
+
+    def try_acquire(
+        self, table_names, exclusive: bool
+    ) -> tuple[list[str], str | None]:
+        """
+        Берёт блокировки таблиц без ожидания (сервер ждёт их в цикле
+        событий, а не в потоке, где выполняются команды).
+        Возвращает (взятые этим вызовом, занятая таблица); если какая-то
+        таблица занята другим процессом, взятые отпускаются.
+        """
+        acquired = []
+        op = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | fcntl.LOCK_NB
+        for table_name in sorted(set(table_names)):
+            held = self._held.get(table_name)
+            if held is not None and (held[1] or not exclusive):
+                continue
+            if held is None:
+                fd = _open_lock(LOCK_DIR / "tables" / f"{table_name}.lock")
+            else:
+                fd = held[0]
+            try:
+                fcntl.flock(fd, op)
+            except BlockingIOError:
+                if held is None:
+                    os.close(fd)
+                for name in acquired:
+                    self.release(name)
+                return [], table_name
+            _stats["acquired"] += 1
+            self._held[table_name] = (fd, exclusive)
+            if held is None:
+                acquired.append(table_name)
+        return acquired, None
+
+    def release(self, table_name: str) -> None:
+        held = self._held.pop(table_name, None)
+        if held is not None:
+            # закрытие дескриптора снимает flock
+            os.close(held[0])
+
+    def held(self) -> list[str]:
+        """Имена таблиц, чьи блокировки держит сеанс."""
+        return list(self._held)
+
+    def release_all(self) -> None:
+        for table_name in list(self._held):
+            self.release(table_name)
+
+    @contextmanager
+    def hold(self, table_names, exclusive: bool):
+        """Держит блокировки таблиц на время одной команды."""
+        acquired = []
+        try:
+            for table_name in sorted(set(table_names)):
+                was_held = table_name in self._held
+                self.acquire(table_name, exclusive)
+                if not was_held:
+                    acquired.append(table_name)
+            yield
+        finally:
+            for table_name in acquired:
+                held = self._held.get(table_name)
+                if held is not None and not (held[1] and self.keep_exclusive):
+                    self.release(table_name)
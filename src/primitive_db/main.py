@@ -1,10 +1,128 @@
 #!/usr/bin/env python3
 
-from .engine import run
+import argparse
+import sys
 
+from .durability import DURABILITY_MODES, GROUP_COMMIT_MS, set_durability
+from .engine import run, run_script
+from .locks import LOCK_TIMEOUT, set_lock_timeout
+from .metrics import SLOW_QUERY_MS, set_slow_log
+from .output import OUTPUT_MODES, set_output_mode
+from .parallel import PARALLEL_THRESHOLD, set_parallel
 
-def main() -> None:
-    run()
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="database",
+        description="Примитивная файловая база данных.",
+    )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["serve"],
+        help="serve — запустить сервер (нужен --socket или --port)",
+    )
+    parser.add_argument("--socket", help="serve: путь к Unix-сокету")
+    parser.add_argument("--port", type=int, help="serve: TCP-порт")
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="serve: адрес для --port"
+    )
+    parser.add_argument(
+        "-c",
+        dest="one_shot",
+        metavar="КОМАНДА",
+        help="выполнить одну команду и выйти",
+    )
+    parser.add_argument(
+        "-f",
+        "--file",
+        help="выполнить команды из файла (по одной на строку) и выйти",
+    )
+    parser.add_argument(
+        "-y",
+        "--yes",
+        action="store_true",
+        help="подтверждать опасные действия без вопроса",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        choices=sorted(OUTPUT_MODES),
+        default="table",
+        help="режим вывода результатов select",
+    )
+    parser.add_argument(
+        "-d",
+        "--durability",
+        choices=DURABILITY_MODES,
+        default="fsync",
+        help="fsync — сброс на диск при каждой записи, group — групповой сброс "
+        "раз в --group-commit-ms, off — без fsync",
+    )
+    parser.add_argument(
+        "--group-commit-ms",
+        type=int,
+        default=GROUP_COMMIT_MS,
+        help="интервал группового сброса на диск, мс",
+    )
+    parser.add_argument(
+        "--lock-timeout",
+        type=float,
+        default=LOCK_TIMEOUT,
+        help="сколько секунд ждать таблицу, занятую другим процессом",
+    )
+    parser.add_argument(
+        "--parallel-threshold",
+        type=int,
+        default=PARALLEL_THRESHOLD,
+        help="с какого числа строк просмотр таблицы делится между процессами",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="число процессов для параллельного просмотра (0 — по числу ядер)",
+    )
+    parser.add_argument(
+        "--slow-log",
+        help="файл журнала медленных команд (JSON по строке на команду)",
+    )
+    parser.add_argument(
+        "--slow-ms",
+        type=float,
+        default=SLOW_QUERY_MS,
+        help="порог медленной команды для --slow-log, мс",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    set_output_mode(args.output)
+    set_durability(args.durability, args.group_commit_ms)
+    set_lock_timeout(args.lock_timeout)
+    set_parallel(args.parallel_threshold, args.workers)
+    set_slow_log(args.slow_log, args.slow_ms)
+
+    if args.command == "serve":
+        # импорт здесь: asyncio нужен только серверу
+        from .server import serve
+
+        try:
+            serve(args.socket, args.host, args.port)
+        except ValueError as e:
+            print(e)
+    elif args.one_shot is not None:
+        # database -c "select from users": без интерактивного цикла
+        run_script([args.one_shot], auto_confirm=args.yes)
+    elif args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            run_script(f, auto_confirm=args.yes)
+    elif not sys.stdin.isatty():
+        # команды пришли через канал: database < script.sql
+        run_script(sys.stdin, auto_confirm=args.yes)
+    else:
+        run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+# src/primitive_db/metrics.py
+
+import json
+import time
+from contextlib import contextmanager
+
+# Метрики процесса:
+#   гистограммы длительностей по фазам выполнения команды
+#   (command, parse, load, where, save, snapshot, serialize, ...);
+#   счётчики (rows_scanned, bytes_read, bytes_written, cache_hits, ...).
+# Смотреть: команда stats; выгрузка в JSON: stats json [файл].
+
+# журнал медленных команд (JSON по строке на команду); None — выключен
+SLOW_QUERY_LOG: str | None = None
+SLOW_QUERY_MS = 100.0
+
+# корзины гистограммы: [0, 1) мкс, [1, 2), [2, 4), ... до ~2^39 мкс
+_BUCKETS = 40
+
+
+class Histogram:
+    """Гистограмма длительностей с корзинами по степеням двойки (в мкс)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * _BUCKETS
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = min(int(seconds * 1_000_000).bit_length(), _BUCKETS - 1)
+        self.buckets[bucket] += 1
+
+    def percentile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает доля q значений (в с)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bucket, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= target:
+                return min((1 << bucket) / 1_000_000, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        def ms(seconds: float) -> float:
+            return round(seconds * 1000, 3)
+
+        return {
+            "count": self.count,
+            "total_ms": ms(self.total),
+            "avg_ms": ms(self.total / self.count) if self.count else 0.0,
+            "p50_ms": ms(self.percentile(0.50)),
+            "p95_ms": ms(self.percentile(0.95)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+
+_histograms: dict[str, Histogram] = {}
+_counters: dict[str, int] = {}
+
+# фазы и счётчики текущей команды (для журнала медленных команд)
+_current: dict | None = None
+
+
+def set_slow_log(path: str | None, threshold_ms: float | None = None) -> None:
+    global SLOW_QUERY_LOG, SLOW_QUERY_MS
+    SLOW_QUERY_LOG = path
+    if threshold_ms is not None:
+        SLOW_QUERY_MS = threshold_ms
+
+
+def record(phase: str, seconds: float) -> None:
+    """Записывает длительность фазы."""
+    histogram = _histograms.get(phase)
+    if histogram is None:
+        histogram = _histograms[phase] = Histogram()
+    histogram.record(seconds)
+    if _current is not None:
+        phases = _current["phases"]
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+
+def count(name: str, value: int = 1) -> None:
+    """Увеличивает счётчик (строки, байты, попадания в кэш)."""
+    _counters[name] = _counters.get(name, 0) + value
+    if _current is not None:
+        counters = _current["counters"]
+        counters[name] = counters.get(name, 0) + value
+
+
+@contextmanager
+def timed(phase: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+@contextmanager
+def collect():
+    """
+    Собирает фазы и счётчики, записанные внутри блока:
+    {"phases": {фаза: секунды}, "counters": {счётчик: значение}}.
+    Вложенные блоки учитываются и во внешних.
+    """
+    global _current
+    outer = _current
+    scope = _current = {"phases": {}, "counters": {}}
+    try:
+        yield scope
+    finally:
+        _current = outer
+        if outer is not None:
+            for name, groups in scope.items():
+                for key, value in groups.items():
+                    outer[name][key] = outer[name].get(key, 0) + value
+
+
+@contextmanager
+def command(text: str):
+    """
+    Замеряет команду целиком (фаза command). Если она шла дольше
+    SLOW_QUERY_MS, пишет её в журнал медленных команд вместе
+    с разбивкой по фазам и счётчиками.
+    """
+    start = time.perf_counter()
+    try:
+        with collect() as scope:
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        record("command", elapsed)
+        if SLOW_QUERY_LOG is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+            _log_slow(text, elapsed, scope)
+
+
+def _log_slow(text: str, elapsed: float, current: dict) -> None:
+    # импорт здесь: datetime нужен только журналу медленных команд
+    from datetime import datetime
+
+    entry = {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "command": text,
+        "ms": round(elapsed * 1000, 3),
+        "phases_ms": {
+            phase: round(seconds * 1000, 3)
+            for phase, seconds in current["phases"].items()
+        },
+        **current["counters"],
+    }
+    try:
+        with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError:
+        # журнал медленных команд не должен ломать саму команду
+        pass
+
+
+def snapshot() -> dict:
+    """Все метрики одним словарём (для stats json)."""
+    return {
+        "phases": {
+            phase: histogram.summary()
+            for phase, histogram in sorted(_histograms.items())
+        },
+        "counters": dict(sorted(_counters.items())),
+    }
+
+
+def reset() -> None:
+    _histograms.clear()
+    _counters.clear()
@@ -0,0 +1,95 @@
+# src/primitive_db/output.py
+
+import json
+import sys
+from itertools import chain, islice
+
+from . import metrics
+
+# режимы вывода select:
+#   table — одна таблица PrettyTable со всеми строками;
+#   plain, tsv, jsonl — строки печатаются по одной, по мере чтения;
+#   pager — PrettyTable по PAGE_SIZE строк за страницу.
+OUTPUT_MODES = {"table", "plain", "tsv", "jsonl", "pager"}
+STREAMING_MODES = {"plain", "tsv", "jsonl", "pager"}
+
+OUTPUT_MODE = "table"
+PAGE_SIZE = 20
+
+
+def set_output_mode(mode: str) -> None:
+    global OUTPUT_MODE
+    if mode not in OUTPUT_MODES:
+        raise ValueError(f"Неизвестный режим вывода: {mode}")
+    OUTPUT_MODE = mode
+
+
+def _tsv_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def print_rows(rows, field_names: list[str], mode: str | None = None) -> None:
+    """
+    Печатает строки select в режиме mode (по умолчанию OUTPUT_MODE).
+    rows может быть генератором: в потоковых режимах первая строка
+    печатается сразу, не дожидаясь конца просмотра таблицы.
+    """
+    with metrics.timed("serialize"):
+        _print_rows(rows, field_names, mode or OUTPUT_MODE)
+
+
+def _print_rows(rows, field_names: list[str], mode: str) -> None:
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        print("Записей не найдено.")
+        return
+
+    if mode == "table":
+        # импорт здесь: prettytable нужен только при выводе таблицей
+        from prettytable import PrettyTable
+
+        table = PrettyTable()
+        table.field_names = field_names
+        table.add_row([first[col] for col in field_names])
+        for row in rows:
+            table.add_row([row[col] for col in field_names])
+        print(table)
+        return
+
+    if mode == "pager":
+        _print_pages(first, rows, field_names)
+        return
+
+    if mode == "tsv":
+        print("\t".join(field_names))
+    for row in chain([first], rows):
+        if mode == "jsonl":
+            print(json.dumps(row, ensure_ascii=False))
+        elif mode == "tsv":
+            print("\t".join(_tsv_value(row[col]) for col in field_names))
+        else:
+            print(", ".join(f"{col}: {row[col]}" for col in field_names))
+
+
+def _print_pages(first: dict, rows, field_names: list[str]) -> None:
+    """
+    Печатает строки таблицами по PAGE_SIZE строк. В интерактивном
+    режиме (ввод и вывод — терминал) после каждой страницы ждёт Enter
+    (q — прекратить вывод).
+    """
+    from prettytable import PrettyTable
+
+    page = [first, *islice(rows, PAGE_SIZE - 1)]
+    while page:
+        table = PrettyTable()
+        table.field_names = field_names
+        for row in page:
+            table.add_row([row[col] for col in field_names])
+        print(table)
+
+        page = list(islice(rows, PAGE_SIZE))
+        if page and sys.stdin.isatty() and sys.stdout.isatty():
+            answer = input("-- Далее: Enter, выход: q -- ").strip().lower()
+            if answer == "q":
+                break
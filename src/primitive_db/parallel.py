@@ -0,0 +1,84 @@
+# src/primitive_db/parallel.py
+
+import os
+from array import array
+from itertools import chain
+
+# multiprocessing и concurrent.futures импортируются только для
+# параллельного просмотра: они заметно удлиняют запуск database
+
+# с какого числа строк просмотр без индекса делится между процессами
+PARALLEL_THRESHOLD = 500_000
+
+# сколько процессов просматривают части таблицы (0 — по числу ядер)
+PARALLEL_WORKERS = 0
+
+# таблица и условие текущего просмотра: процессы-исполнители получают
+# их при fork вместе с памятью родителя, без копирования через pickle
+_table = None
+_predicate = None
+
+
+def set_parallel(threshold: int | None = None, workers: int | None = None) -> None:
+    global PARALLEL_THRESHOLD, PARALLEL_WORKERS
+    if threshold is not None:
+        PARALLEL_THRESHOLD = threshold
+    if workers is not None:
+        PARALLEL_WORKERS = workers
+
+
+def worker_count() -> int:
+    return PARALLEL_WORKERS or os.cpu_count() or 1
+
+
+def can_parallelize(table_data) -> bool:
+    """
+    Стоит ли делить просмотр: таблица не меньше порога, есть больше
+    одного ядра и доступен fork (столбцы передаются без копирования).
+    """
+    return splits(len(table_data))
+
+
+def splits(rows: int) -> bool:
+    """Делится ли между процессами просмотр таблицы из rows строк."""
+    if rows < PARALLEL_THRESHOLD or worker_count() <= 1:
+        return False
+    import multiprocessing
+
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _scan_part(bounds: tuple[int, int]) -> array:
+    start, stop = bounds
+    return array("q", _predicate.positions(_table, start, stop))
+
+
+def parallel_positions(table_data, predicate, ranges=None):
+    """
+    Позиции строк, подходящих под условие: таблица (или её части ranges —
+    [(start, stop)] по порядку) делится на части по строкам, части
+    просматриваются в отдельных процессах, а результаты склеиваются
+    по порядку частей — то есть по порядку позиций (и ID).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    global _table, _predicate
+    workers = worker_count()
+    if ranges is None:
+        ranges = [(0, len(table_data))]
+    step = -(-sum(stop - start for start, stop in ranges) // workers)
+    parts = [
+        (part, min(part + step, stop))
+        for start, stop in ranges
+        for part in range(start, stop, step)
+    ]
+
+    _table, _predicate = table_data, predicate
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(_scan_part, parts))
+    finally:
+        _table = _predicate = None
+    return chain.from_iterable(results)
@@ -0,0 +1,388 @@
+# src/primitive_db/planner.py
+
+import time
+
+from . import metrics, output
+from .aggregates import check_items, label, stats_answerable
+from .core import (
+    aggregate,
+    aggregate_from_stats,
+    check_columns,
+    iter_select,
+    join_select,
+    select,
+    select_cache,
+    select_key,
+)
+from .decorators import handle_db_errors
+from .parallel import splits, worker_count
+from .predicates import (
+    access_path,
+    compile_where,
+    describe_access,
+    fetch,
+    may_match,
+    unparse,
+)
+
+# План select — дерево операторов. Планировщик выбирает, откуда взять
+# ответ: статистика таблицы (без чтения строк), кэш результатов, индекс
+# или бинарный поиск по ID, полный (или параллельный) просмотр.
+# execute_plan выполняет план функциями core; explain печатает план,
+# explain analyze выполняет его и добавляет фактические строки,
+# время операторов и поведение кэша.
+
+
+class PlanNode:
+    """
+    Оператор плана.
+
+    kind — вид оператора (load, scan, project, cache, aggregate, stats,
+    join, limit);
+    rows — оценка числа строк, которые оператор отдаёт или проверяет
+    (None — неизвестно без выполнения); phase — фаза метрик, время которой
+    относится к оператору. После analyze в actual — фактические значения.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        title: str,
+        detail: str = "",
+        children=(),
+        rows: int | None = None,
+        phase: str | None = None,
+    ):
+        self.kind = kind
+        self.title = title
+        self.detail = detail
+        self.children = list(children)
+        self.rows = rows
+        self.phase = phase
+        self.actual: dict | None = None
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def lines(self, depth: int = 0) -> list[str]:
+        text = "  " * depth + ("-> " if depth else "") + self.title
+        if self.detail:
+            text += f": {self.detail}"
+        if self.rows is not None:
+            text += f"  (оценка строк: {self.rows})"
+        if self.actual:
+            text += "  [" + ", ".join(
+                f"{name}: {value}" for name, value in self.actual.items()
+            ) + "]"
+        lines = [text]
+        for child in self.children:
+            lines.extend(child.lines(depth + 1))
+        return lines
+
+
+class Plan:
+    """
+    План запроса: kind — способ выполнения (stats, aggregate, select,
+    stream, join), query — разобранный select, root — дерево операторов,
+    predicate — условие, скомпилированное под схему таблицы.
+    """
+
+    def __init__(self, kind: str, query: dict, root: PlanNode, predicate=None):
+        self.kind = kind
+        self.query = query
+        self.root = root
+        self.predicate = predicate
+        # итоги explain analyze: время, строки результата, счётчики
+        self.totals: dict | None = None
+
+    def lines(self) -> list[str]:
+        lines = self.root.lines()
+        if self.totals is not None:
+            lines.append(
+                "Итого: " + ", ".join(
+                    f"{name}: {value}" for name, value in self.totals.items()
+                )
+            )
+        return lines
+
+
+# ===== построение плана =====
+
+@handle_db_errors
+def plan_select(query: dict, metadata: dict, buffer) -> Plan | None:
+    """
+    Строит план для разобранного select (см. engine.parse_select).
+    Столбцы и значения условия проверяются сразу: ошибка печатается,
+    и возвращается None.
+    """
+    if query["join"] is not None:
+        return _plan_join(query, metadata, buffer)
+
+    table_name = query["table"]
+    table_meta = metadata.get(table_name)
+    table_data = buffer.peek(table_name)
+    if table_meta is not None:
+        schema = table_meta["columns"]
+    else:
+        # таблица без метаданных: схема известна только по данным
+        table_data = buffer.get(table_name, table_meta)
+        schema = table_data.schema
+
+    items = query["items"]
+    if items is not None:
+        check_items(items, schema, query["group_by"])
+        if (
+            table_meta is not None
+            and query["where"] is None
+            and query["group_by"] is None
+            and stats_answerable(items, schema)
+        ):
+            root = PlanNode(
+                "stats",
+                "Ответ по статистике таблицы",
+                ", ".join(label(item) for item in items),
+                rows=1,
+                phase="stats",
+            )
+            return Plan("stats", query, _limit(query, root))
+
+    columns = query["columns"]
+    check_columns(columns, schema)
+    predicate = compile_where(query["where"], schema)
+    total = buffer.row_count(table_name, table_meta)
+    scan = _scan_node(table_name, predicate, table_meta, table_data, total)
+    if columns is not None:
+        # строки собираются только из нужных столбцов
+        scan = PlanNode("project", "Проекция", ", ".join(columns), [scan])
+
+    if items is not None:
+        detail = ", ".join(label(item) for item in items)
+        if query["group_by"] is not None:
+            detail += f", group by {query['group_by']}"
+        node = PlanNode("aggregate", "Хэш-агрегация", detail, [scan],
+                        phase="aggregate")
+        key = (
+            "aggregate",
+            tuple(items),
+            query["group_by"],
+            None if predicate is None else predicate.ast,
+        )
+        root = _cache_node(table_name, table_data, key, node)
+        return Plan("aggregate", query, _limit(query, root), predicate)
+
+    if output.OUTPUT_MODE in output.STREAMING_MODES:
+        # строки печатаются по мере просмотра, кэш не используется
+        return Plan("stream", query, _limit(query, scan), predicate)
+    if predicate is None:
+        # без условия строки читаются прямо из столбцов, кэш не нужен
+        return Plan("select", query, _limit(query, scan), predicate)
+    root = _cache_node(table_name, table_data, select_key(predicate, columns), scan)
+    return Plan("select", query, _limit(query, root), predicate)
+
+
+def _load_node(table_name: str, table_meta: dict | None, table_data) -> PlanNode:
+    if table_data is not None:
+        return PlanNode("load", "Таблица в памяти", table_name, phase="load")
+    fmt = "json" if table_meta is None else table_meta.get("format", "json")
+    return PlanNode("load", "Чтение с диска", f"{table_name} ({fmt})", phase="load")
+
+
+def _scan_node(
+    table_name: str, predicate, table_meta: dict | None, table_data, total: int
+) -> PlanNode:
+    """
+    Путь доступа к строкам: индекс, бинарный поиск по ID или просмотр
+    (у сегментированной таблицы в памяти — только подходящих сегментов).
+    """
+    load = _load_node(table_name, table_meta, table_data)
+    if predicate is None:
+        return PlanNode("scan", "Полный просмотр", "без условия", [load],
+                        rows=total, phase="where")
+
+    condition = unparse(predicate.ast)
+    if table_data is not None:
+        index_kinds = {
+            column: index.kind for column, index in table_data.indexes.items()
+        }
+        path = access_path(predicate.ast, index_kinds, table_data.ids_sorted)
+    else:
+        index_kinds = {} if table_meta is None else table_meta.get("indexes", {})
+        path = access_path(predicate.ast, index_kinds)
+
+    if path is not None:
+        # число кандидатов известно без просмотра, если таблица в памяти
+        candidates = None if table_data is None else len(fetch(path, table_data))
+        return PlanNode(
+            "scan",
+            "Поиск по индексу",
+            f"{describe_access(path)}; фильтр: {condition}",
+            [load],
+            rows=candidates,
+            phase="where",
+        )
+    detail = f"фильтр: {condition}"
+    zones = None if table_data is None else table_data.zones
+    if zones is not None:
+        kept = [zone for zone in zones if may_match(predicate.ast, zone)]
+        total = sum(zone["stop"] - zone["start"] for zone in kept)
+        detail = f"сегментов {len(kept)} из {len(zones)}; {detail}"
+    if splits(total):
+        return PlanNode(
+            "scan",
+            "Параллельный просмотр",
+            f"{worker_count()} процессов; {detail}",
+            [load],
+            rows=total,
+            phase="where",
+        )
+    return PlanNode("scan", "Полный просмотр", detail, [load],
+                    rows=total, phase="where")
+
+
+def _cache_node(table_name: str, table_data, key, child: PlanNode) -> PlanNode:
+    if table_data is None:
+        state = "таблица не в памяти, результата нет"
+    elif select_cache.contains(table_name, table_data.version, key):
+        state = "результат есть"
+    else:
+        state = "результата нет"
+    return PlanNode("cache", "Кэш результатов", state, [child])
+
+
+def _limit(query: dict, node: PlanNode) -> PlanNode:
+    if query["limit"] is None and not query["offset"]:
+        return node
+    parts = []
+    if query["limit"] is not None:
+        parts.append(f"limit {query['limit']}")
+    if query["offset"]:
+        parts.append(f"offset {query['offset']}")
+    return PlanNode("limit", "Limit", " ".join(parts), [node])
+
+
+def _plan_join(query: dict, metadata: dict, buffer) -> Plan | None:
+    names = (query["table"], query["join"]["table"])
+    for table_name in names:
+        if table_name not in metadata:
+            print(f'Таблица "{table_name}" не существует.')
+            return None
+    if names[0] == names[1]:
+        print("Соединение таблицы с самой собой не поддерживается.")
+        return None
+
+    sides = []
+    for table_name in names:
+        table_meta = metadata[table_name]
+        total = buffer.row_count(table_name, table_meta)
+        load = _load_node(table_name, table_meta, buffer.peek(table_name))
+        load.rows = total
+        sides.append((total, table_name, load))
+
+    # сторону выбирает то же правило, что и в hash_join: при равенстве — правая
+    left_rows, right_rows = sides[0][0], sides[1][0]
+    build = names[1] if right_rows <= left_rows else names[0]
+    on = query["join"]["on"]
+    detail = f"{on[0]} = {on[1]}; хэш-таблица по меньшей стороне"
+    detail += f" (по оценке — {build})"
+    if query["where"] is not None:
+        detail += f"; фильтр: {unparse(query['where'])}"
+    root = PlanNode("join", "Хэш-соединение", detail,
+                    [load for _, _, load in sides])
+    return Plan("join", query, _limit(query, root))
+
+
+# ===== выполнение =====
+
+def execute_plan(plan: Plan, metadata: dict, buffer) -> tuple:
+    """
+    Выполняет план. Возвращает (строки, имена столбцов); строки — None,
+    если декоратор core уже напечатал ошибку.
+    """
+    query = plan.query
+    table_name = query["table"]
+    table_meta = metadata.get(table_name)
+    limit, offset = query["limit"], query["offset"]
+
+    if plan.kind == "join":
+        names = (table_name, query["join"]["table"])
+        left, right = (buffer.get(name, metadata[name]) for name in names)
+        rows = join_select(
+            names[0], left, names[1], right,
+            query["join"]["on"], query["where"], limit, offset,
+        )
+        field_names = [
+            f"{name}.{column}"
+            for name, table in zip(names, (left, right))
+            for column in table.schema
+        ]
+        return rows, field_names
+
+    items = query["items"]
+    if plan.kind == "stats":
+        with metrics.timed("stats"):
+            stats = buffer.stats(table_name, table_meta)
+        rows = aggregate_from_stats(table_meta["columns"], stats, items)
+    else:
+        table_data = buffer.get(table_name, table_meta)
+        columns = query["columns"]
+        field_names = list(table_data.schema) if columns is None else columns
+        if plan.kind == "stream":
+            rows = iter_select(table_data, plan.predicate, limit, offset, columns)
+            return rows, field_names
+        if plan.kind == "select":
+            rows = select(
+                table_name, table_data, plan.predicate, limit, offset, columns
+            )
+            return rows, field_names
+        rows = aggregate(
+            table_name, table_data, items, plan.predicate, query["group_by"]
+        )
+
+    if rows is None:
+        return None, []
+    stop = None if limit is None else offset + limit
+    return rows[offset:stop], [label(item) for item in items]
+
+
+def analyze(plan: Plan, metadata: dict, buffer) -> bool:
+    """
+    explain analyze: выполняет план, не печатая строки, и записывает
+    в операторы фактическое время их фаз, число просмотренных строк
+    и попадания в кэш. False, если выполнение закончилось ошибкой.
+    """
+    start = time.perf_counter()
+    with metrics.collect() as scope:
+        rows, _ = execute_plan(plan, metadata, buffer)
+        if rows is None:
+            return False
+        # строки join и потокового select считаются при переборе
+        produced = sum(1 for _ in rows)
+    elapsed = time.perf_counter() - start
+
+    phases, counters = scope["phases"], scope["counters"]
+    for node in plan.root.walk():
+        actual = {}
+        if node.phase in phases:
+            actual["мс"] = round(phases[node.phase] * 1000, 3)
+        elif node.kind in ("scan", "join"):
+            # соединение и просмотр без условия идут при переборе строк
+            lazy = elapsed - phases.get("load", 0.0)
+            actual["мс"] = round(lazy * 1000, 3)
+        if node.kind == "scan":
+            actual["просмотрено строк"] = counters.get("rows_scanned", 0)
+        if node.kind == "cache":
+            actual["кэш"] = "попадание" if counters.get("cache_hits") else "промах"
+        node.actual = actual or None
+
+    plan.totals = {
+        "строк в результате": produced,
+        "мс": round(elapsed * 1000, 3),
+    }
+    for name in (
+        "rows_scanned", "segments_pruned", "bytes_read", "cache_hits", "cache_misses"
+    ):
+        if counters.get(name):
+            plan.totals[name] = counters[name]
+    return True
@@ -0,0 +1,687 @@
+# src/primitive_db/predicates.py
+
+import operator
+import re
+from bisect import bisect_left, bisect_right
+
+from . import metrics
+from .compressed import DictColumn
+from .table import column_range
+
+# Условие where разбирается в дерево из кортежей:
+#   ("cmp", op, столбец, значение)    op: = != < <= > >=
+#   ("in", столбец, (значения, ...))
+#   ("between", столбец, от, до)
+#   ("like", столбец, шаблон)
+#   ("and", левое, правое), ("or", левое, правое), ("not", условие)
+# Кортежи хэшируются, поэтому дерево годится как ключ кэша select.
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<space>\s+)
+  | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<op><=|>=|!=|<>|=|<|>)
+  | (?P<punct>[(),])
+  | (?P<int>-?\d+(?![^\s()=<>!,]))
+  | (?P<word>[^\s()=<>!,'"]+)
+    """,
+    re.VERBOSE,
+)
+
+_OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+def tokenize(text: str) -> list[tuple[str, object]]:
+    """
+    Разбивает текст на лексемы (вид, значение):
+    str — строка в кавычках, int — число, op — оператор сравнения,
+    punct — скобка или запятая, word — всё остальное (имена, ключевые слова).
+    """
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise ValueError(f"Некорректное условие: {text!r}")
+        kind = match.lastgroup
+        value = match.group()
+        pos = match.end()
+        if kind == "space":
+            continue
+        if kind == "str":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        elif kind == "int":
+            value = int(value)
+        elif kind == "op" and value == "<>":
+            value = "!="
+        tokens.append((kind, value))
+    return tokens
+
+
+def is_keyword(token, *words: str) -> bool:
+    kind, value = token
+    return kind == "word" and value.lower() in words
+
+
+class _Parser:
+    """Рекурсивный спуск по лексемам условия."""
+
+    def __init__(self, tokens: list, pos: int = 0):
+        self.tokens = tokens
+        self.pos = pos
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return ("end", None)
+
+    def take(self):
+        token = self.peek()
+        if token[0] == "end":
+            raise ValueError("Условие оборвалось.")
+        self.pos += 1
+        return token
+
+    def expect_punct(self, value: str) -> None:
+        token = self.take()
+        if token != ("punct", value):
+            raise ValueError(f"Ожидалось {value!r}, а не {token[1]!r}.")
+
+    def parse_or(self):
+        node = self.parse_and()
+        while is_keyword(self.peek(), "or"):
+            self.take()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_not()
+        while is_keyword(self.peek(), "and"):
+            self.take()
+            node = ("and", node, self.parse_not())
+        return node
+
+    def parse_not(self):
+        if is_keyword(self.peek(), "not"):
+            self.take()
+            return ("not", self.parse_not())
+        if self.peek() == ("punct", "("):
+            self.take()
+            node = self.parse_or()
+            self.expect_punct(")")
+            return node
+        return self.parse_comparison()
+
+    def parse_literal(self):
+        kind, value = self.take()
+        if kind in ("str", "int"):
+            return value
+        if kind == "word":
+            lowered = value.lower()
+            if lowered == "true":
+                return True
+            if lowered == "false":
+                return False
+            # как и раньше, слово без кавычек считается строкой
+            return value
+        raise ValueError(f"Ожидалось значение, а не {value!r}.")
+
+    def parse_comparison(self):
+        kind, column = self.take()
+        if kind != "word":
+            raise ValueError(f"Ожидалось имя столбца, а не {column!r}.")
+
+        negate = False
+        if is_keyword(self.peek(), "not"):
+            self.take()
+            negate = True
+
+        token = self.peek()
+        if token[0] == "op" and not negate:
+            self.take()
+            return ("cmp", token[1], column, self.parse_literal())
+
+        if is_keyword(token, "in"):
+            self.take()
+            self.expect_punct("(")
+            values = [self.parse_literal()]
+            while self.peek() == ("punct", ","):
+                self.take()
+                values.append(self.parse_literal())
+            self.expect_punct(")")
+            node = ("in", column, tuple(values))
+        elif is_keyword(token, "between"):
+            self.take()
+            low = self.parse_literal()
+            if not is_keyword(self.take(), "and"):
+                raise ValueError("В between ожидалось and.")
+            node = ("between", column, low, self.parse_literal())
+        elif is_keyword(token, "like"):
+            self.take()
+            node = ("like", column, str(self.parse_literal()))
+        else:
+            raise ValueError(f"Ожидался оператор после {column!r}.")
+
+        return ("not", node) if negate else node
+
+
+def parse_where(tokens: list, pos: int = 0, stop_words=()) -> tuple[tuple, int]:
+    """
+    Разбирает условие, начиная с лексемы pos.
+    Возвращает (дерево условия, позиция первой неразобранной лексемы).
+    Разбор останавливается на ключевых словах stop_words (limit, offset, ...).
+    """
+    end = len(tokens)
+    for i in range(pos, len(tokens)):
+        if tokens[i][0] == "word" and tokens[i][1].lower() in stop_words:
+            end = i
+            break
+
+    parser = _Parser(tokens[:end], pos)
+    if parser.peek()[0] == "end":
+        raise ValueError("Пустое условие where.")
+    node = parser.parse_or()
+    if parser.pos != end:
+        raise ValueError(f"Лишнее в условии: {tokens[parser.pos][1]!r}.")
+    return node, end
+
+
+def from_dict(where_clause: dict) -> tuple | None:
+    """Условие старого вида {столбец: значение} как дерево из равенств."""
+    return join_all(
+        [("cmp", "=", column, value) for column, value in where_clause.items()]
+    )
+
+
+def map_columns(node: tuple, rename) -> tuple:
+    """Копия дерева, в которой каждый столбец заменён на rename(столбец)."""
+    kind = node[0]
+    if kind in ("and", "or"):
+        return (kind, map_columns(node[1], rename), map_columns(node[2], rename))
+    if kind == "not":
+        return ("not", map_columns(node[1], rename))
+    if kind == "cmp":
+        return ("cmp", node[1], rename(node[2]), node[3])
+    return (kind, rename(node[1]), *node[2:])
+
+
+def columns_of(node: tuple) -> set[str]:
+    """Все столбцы, упомянутые в условии."""
+    kind = node[0]
+    if kind in ("and", "or"):
+        return columns_of(node[1]) | columns_of(node[2])
+    if kind == "not":
+        return columns_of(node[1])
+    return {_column_of(node)}
+
+
+def conjuncts(node: tuple) -> list[tuple]:
+    """Части условия, соединённые через and верхнего уровня."""
+    if node[0] == "and":
+        return conjuncts(node[1]) + conjuncts(node[2])
+    return [node]
+
+
+def join_all(nodes: list[tuple]) -> tuple | None:
+    """Обратно к conjuncts: соединяет условия через and."""
+    node = None
+    for part in nodes:
+        node = part if node is None else ("and", node, part)
+    return node
+
+
+# ===== проверка типов =====
+
+def _coerce(value, type_name: str, column: str):
+    """Приводит значение из условия к типу столбца."""
+    if type_name == "int":
+        if isinstance(value, bool):
+            raise ValueError(f"Столбец {column} имеет тип int: {value!r}")
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Столбец {column} имеет тип int: {value!r}") from None
+    if type_name == "bool":
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered in ("true", "1", "yes"):
+                return True
+            if lowered in ("false", "0", "no"):
+                return False
+            raise ValueError(f"Столбец {column} имеет тип bool: {value!r}")
+        return bool(value)
+    return str(value)
+
+
+def _typed(node: tuple, schema: dict[str, str]) -> tuple:
+    """Проверяет столбцы по схеме и приводит значения к их типам."""
+    kind = node[0]
+    if kind in ("and", "or"):
+        return (kind, _typed(node[1], schema), _typed(node[2], schema))
+    if kind == "not":
+        return ("not", _typed(node[1], schema))
+
+    column = node[1] if kind != "cmp" else node[2]
+    if column not in schema:
+        raise KeyError(column)
+    type_name = schema[column]
+
+    if kind == "cmp":
+        return ("cmp", node[1], column, _coerce(node[3], type_name, column))
+    if kind == "in":
+        values = tuple(_coerce(value, type_name, column) for value in node[2])
+        return ("in", column, values)
+    if kind == "between":
+        low = _coerce(node[2], type_name, column)
+        high = _coerce(node[3], type_name, column)
+        return ("between", column, low, high)
+    if type_name != "str":
+        raise ValueError(f"like применим только к строкам, а {column} — {type_name}")
+    return node
+
+
+def _like_regex(pattern: str):
+    """Шаблон like (% — любая строка, _ — один символ) в регулярное выражение."""
+    parts = []
+    for ch in pattern:
+        if ch == "%":
+            parts.append(".*")
+        elif ch == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(ch))
+    return re.compile("".join(parts), re.DOTALL)
+
+
+class Predicate:
+    """
+    Скомпилированное условие where.
+
+    ast — дерево условия с проверенными столбцами и приведёнными значениями
+    (годится как ключ кэша). bind(table) превращает дерево в замыкание
+    pos -> bool над массивами столбцов конкретной таблицы; candidates(table)
+    сужает просмотр по индексам и отсортированному столбцу ID, ranges(table)
+    — по зонам сегментов.
+    """
+
+    def __init__(self, ast: tuple):
+        self.ast = ast
+
+    # ===== проверка одной строки =====
+
+    def bind(self, table_data):
+        return _bind(self.ast, table_data)
+
+    def bind_row(self):
+        """Проверка строки-словаря (например, строки результата join)."""
+        return _bind_row(self.ast)
+
+    # ===== выбор строк =====
+
+    def candidates(self, table_data) -> list[int] | None:
+        """
+        Отсортированные позиции строк, которые могут подойти под условие,
+        если их можно получить без полного просмотра; иначе None.
+        """
+        return _candidates(self.ast, table_data)
+
+    def needs_scan(self, table_data) -> bool:
+        """Нужен ли просмотр столбцов (нет пути доступа без него)."""
+        index_kinds = {
+            column: index.kind for column, index in table_data.indexes.items()
+        }
+        return access_path(self.ast, index_kinds, table_data.ids_sorted) is None
+
+    def ranges(self, table_data) -> list[tuple[int, int]]:
+        """
+        Части таблицы (start, stop), которые нужно просмотреть: зоны
+        сегментов, чьи min/max не исключают условие. У несегментированной
+        таблицы — она вся.
+        """
+        zones = table_data.zones
+        if zones is None:
+            return [(0, len(table_data))]
+        kept = [
+            (zone["start"], zone["stop"])
+            for zone in zones if may_match(self.ast, zone)
+        ]
+        metrics.count("segments_pruned", len(zones) - len(kept))
+        return kept
+
+    def positions(self, table_data, start: int = 0, stop: int | None = None):
+        """
+        Лениво перебирает позиции строк, подходящих под условие.
+        start/stop ограничивают просмотр частью таблицы
+        (так её части просматриваются параллельно).
+        """
+        if stop is None:
+            stop = len(table_data)
+        candidates = self.candidates(table_data)
+        if candidates is not None:
+            test = self.bind(table_data)
+            part = candidates[bisect_left(candidates, start):
+                              bisect_left(candidates, stop)]
+            metrics.count("rows_scanned", len(part))
+            return (pos for pos in part if test(pos))
+
+        metrics.count("rows_scanned", stop - start)
+
+        ast = self.ast
+        if ast[0] == "and" and ast[1][0] not in ("and", "or", "not"):
+            # первое условие проверяется прямо по массиву столбца,
+            # остальные — только для прошедших строк
+            first = _scan(ast[1], table_data, start, stop)
+            rest = _bind(ast[2], table_data)
+            return (pos for pos in first if rest(pos))
+        if ast[0] not in ("and", "or", "not"):
+            return _scan(ast, table_data, start, stop)
+
+        test = self.bind(table_data)
+        return (pos for pos in range(start, stop) if test(pos))
+
+
+def compile_where(where, schema: dict[str, str]) -> Predicate | None:
+    """
+    Компилирует условие (дерево из parse_where или словарь старого вида)
+    под схему таблицы. Неизвестный столбец — KeyError, значение не того
+    типа — ValueError.
+    """
+    if where is None:
+        return None
+    if isinstance(where, Predicate):
+        return where
+    if isinstance(where, dict):
+        where = from_dict(where)
+        if where is None:
+            return None
+    return Predicate(_typed(where, schema))
+
+
+def _value_test(node: tuple):
+    """Проверка одного значения столбца для листа дерева."""
+    kind = node[0]
+    if kind == "cmp":
+        op, value = _OPERATORS[node[1]], node[3]
+        return lambda x: op(x, value)
+    if kind == "in":
+        values = frozenset(node[2])
+        return lambda x: x in values
+    if kind == "between":
+        low, high = node[2], node[3]
+        return lambda x: low <= x <= high
+    match = _like_regex(node[2]).fullmatch
+    return lambda x: match(x) is not None
+
+
+def _column_of(node: tuple) -> str:
+    return node[2] if node[0] == "cmp" else node[1]
+
+
+def _code_test(node: tuple, column):
+    """
+    Проверка номера значения для столбца со словарём (DictColumn):
+    =, != и in сравнивают номера, не собирая строк. None — лист
+    проверяется по самим значениям.
+    """
+    if not isinstance(column, DictColumn):
+        return None
+    kind = node[0]
+    if kind == "in":
+        codes = frozenset(column.code(value) for value in node[2]) - {None}
+        return lambda code: code in codes
+    if kind == "cmp" and node[1] in ("=", "!="):
+        # значения нет в словаре — номер None не равен ни одному номеру
+        expected = column.code(node[3])
+        if node[1] == "=":
+            return lambda code: code == expected
+        return lambda code: code != expected
+    return None
+
+
+def _scan(node: tuple, table_data, start: int, stop: int):
+    """Просмотр массива столбца (позиции start..stop) для листа дерева."""
+    column = table_data.columns[_column_of(node)]
+    code_test = _code_test(node, column)
+    if code_test is not None:
+        codes = enumerate(column.codes[start:stop], start)
+        if node[0] == "cmp" and node[1] == "=":
+            expected = column.code(node[3])
+            return (pos for pos, code in codes if code == expected)
+        return (pos for pos, code in codes if code_test(code))
+
+    values = enumerate(column_range(column, start, stop), start)
+    if node[0] == "cmp" and node[1] == "=":
+        value = node[3]
+        return (pos for pos, x in values if x == value)
+    test = _value_test(node)
+    return (pos for pos, x in values if test(x))
+
+
+def _bind(node: tuple, table_data):
+    kind = node[0]
+    if kind == "and":
+        left, right = _bind(node[1], table_data), _bind(node[2], table_data)
+        return lambda pos: left(pos) and right(pos)
+    if kind == "or":
+        left, right = _bind(node[1], table_data), _bind(node[2], table_data)
+        return lambda pos: left(pos) or right(pos)
+    if kind == "not":
+        inner = _bind(node[1], table_data)
+        return lambda pos: not inner(pos)
+
+    column = table_data.columns[_column_of(node)]
+    code_test = _code_test(node, column)
+    if code_test is not None:
+        codes = column.codes
+        return lambda pos: code_test(codes[pos])
+    if kind == "cmp" and node[1] == "=":
+        value = node[3]
+        return lambda pos: column[pos] == value
+    test = _value_test(node)
+    return lambda pos: test(column[pos])
+
+
+def _bind_row(node: tuple):
+    kind = node[0]
+    if kind == "and":
+        left, right = _bind_row(node[1]), _bind_row(node[2])
+        return lambda row: left(row) and right(row)
+    if kind == "or":
+        left, right = _bind_row(node[1]), _bind_row(node[2])
+        return lambda row: left(row) or right(row)
+    if kind == "not":
+        inner = _bind_row(node[1])
+        return lambda row: not inner(row)
+    column = _column_of(node)
+    test = _value_test(node)
+    return lambda row: test(row[column])
+
+
+# ===== индексы и отсортированный столбец ID =====
+
+def _id_range(table_data, low, high, include_low=True, include_high=True):
+    """Позиции строк с ID в диапазоне: бинарный поиск по столбцу ID."""
+    ids = table_data.columns["ID"]
+    size = len(table_data)
+    if low is None:
+        start = 0
+    else:
+        start = (bisect_left if include_low else bisect_right)(ids, low, 0, size)
+    if high is None:
+        stop = size
+    else:
+        stop = (bisect_right if include_high else bisect_left)(ids, high, 0, size)
+    return list(range(start, max(start, stop)))
+
+
+def _range_bounds(node: tuple):
+    """Границы (low, high, include_low, include_high) для сравнения/between."""
+    if node[0] == "between":
+        return node[2], node[3], True, True
+    op, value = node[1], node[3]
+    return {
+        "=": (value, value, True, True),
+        "<": (None, value, True, False),
+        "<=": (None, value, True, True),
+        ">": (value, None, False, True),
+        ">=": (value, None, True, True),
+    }.get(op)
+
+
+def access_path(node: tuple, index_kinds: dict, ids_sorted: bool = True):
+    """
+    Путь доступа к строкам для условия без полного просмотра — дерево
+    ("id_range", лист) | ("index", вид, лист) | ("union", части) |
+    ("smallest", части); None, если нужен полный просмотр.
+    index_kinds — {столбец: "hash" | "sorted"}; ids_sorted — упорядочен
+    ли столбец ID (тогда диапазоны ID ищутся бинарным поиском).
+    """
+    kind = node[0]
+    if kind == "and":
+        # берётся часть с меньшим числом кандидатов, остальное — фильтр
+        parts = tuple(
+            part for part in (access_path(node[1], index_kinds, ids_sorted),
+                              access_path(node[2], index_kinds, ids_sorted))
+            if part is not None
+        )
+        if not parts:
+            return None
+        return parts[0] if len(parts) == 1 else ("smallest", parts)
+    if kind == "or":
+        left = access_path(node[1], index_kinds, ids_sorted)
+        right = access_path(node[2], index_kinds, ids_sorted)
+        if left is None or right is None:
+            return None
+        return ("union", (left, right))
+    if kind in ("not", "like"):
+        return None
+
+    column = _column_of(node)
+    if kind == "in":
+        parts = tuple(
+            access_path(("cmp", "=", column, value), index_kinds, ids_sorted)
+            for value in node[2]
+        )
+        if any(part is None for part in parts):
+            return None
+        return ("union", parts)
+
+    if _range_bounds(node) is None:
+        return None
+    if column == "ID" and ids_sorted:
+        return ("id_range", node)
+    index_kind = index_kinds.get(column)
+    if index_kind == "sorted" or (
+        index_kind == "hash" and kind == "cmp" and node[1] == "="
+    ):
+        return ("index", index_kind, node)
+    return None
+
+
+def fetch(path: tuple, table_data) -> list[int]:
+    """Отсортированные позиции строк-кандидатов по пути доступа."""
+    kind = path[0]
+    if kind == "union":
+        return sorted(set().union(*(fetch(part, table_data) for part in path[1])))
+    if kind == "smallest":
+        return min((fetch(part, table_data) for part in path[1]), key=len)
+    node = path[-1]
+    if kind == "id_range":
+        return _id_range(table_data, *_range_bounds(node))
+    index = table_data.indexes[_column_of(node)]
+    if index.kind == "sorted":
+        ids = index.range(*_range_bounds(node))
+    else:
+        ids = index.lookup(node[3])
+    positions = table_data.positions_by_ids(ids)
+    if not table_data.ids_sorted:
+        # строки лежат не по порядку ID: позиции по ID не отсортированы
+        positions.sort()
+    return positions
+
+
+def describe_access(path: tuple) -> str:
+    """Путь доступа словами (для explain)."""
+    kind = path[0]
+    if kind == "union":
+        return "объединение: " + "; ".join(describe_access(p) for p in path[1])
+    if kind == "smallest":
+        return "меньшее из: " + "; ".join(describe_access(p) for p in path[1])
+    node = path[-1]
+    if kind == "id_range":
+        return f"бинарный поиск по ID ({unparse(node)})"
+    return f"индекс {path[1]} по {_column_of(node)} ({unparse(node)})"
+
+
+def may_match(node: tuple, zone: dict) -> bool:
+    """
+    Могут ли строки зоны подойти под условие, судя по min/max её
+    столбцов. not и like (и столбцы без min/max) проверить нельзя —
+    для них ответ «могут».
+    """
+    kind = node[0]
+    if kind == "and":
+        return may_match(node[1], zone) and may_match(node[2], zone)
+    if kind == "or":
+        return may_match(node[1], zone) or may_match(node[2], zone)
+    if kind in ("not", "like"):
+        return True
+
+    column = _column_of(node)
+    if column not in zone["min"]:
+        return True
+    low, high = zone["min"][column], zone["max"][column]
+    if kind == "in":
+        return any(low <= value <= high for value in node[2])
+    if kind == "between":
+        return node[2] <= high and node[3] >= low
+    op, value = node[1], node[3]
+    if op == "=":
+        return low <= value <= high
+    if op == "!=":
+        return not low == high == value
+    if op == "<":
+        return low < value
+    if op == "<=":
+        return low <= value
+    if op == ">":
+        return high > value
+    return high >= value
+
+
+def unparse(node: tuple) -> str:
+    """Дерево условия обратно в текст (для explain)."""
+    kind = node[0]
+    if kind in ("and", "or"):
+        return f"({unparse(node[1])} {kind} {unparse(node[2])})"
+    if kind == "not":
+        return f"not {unparse(node[1])}"
+    if kind == "cmp":
+        return f"{node[2]} {node[1]} {_literal(node[3])}"
+    if kind == "in":
+        return f"{node[1]} in ({', '.join(_literal(v) for v in node[2])})"
+    if kind == "between":
+        return f"{node[1]} between {_literal(node[2])} and {_literal(node[3])}"
+    return f"{node[1]} like {_literal(node[2])}"
+
+
+def _literal(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return '"' + value.replace('"', '\\"') + '"'
+    return str(value)
+
+
+def _candidates(node: tuple, table_data) -> list[int] | None:
+    index_kinds = {column: index.kind for column, index in table_data.indexes.items()}
+    path = access_path(node, index_kinds, table_data.ids_sorted)
+    if path is None:
+        return None
+    return fetch(path, table_data)
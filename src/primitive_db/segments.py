@@ -0,0 +1,246 @@
+# src/primitive_db/segments.py
+
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from pathlib import Path
+
+from .binary import open_binary, write_binary
+from .durability import atomic_open, sync
+from .table import TableData, column_range
+
+# Формат "segmented": каталог data/<таблица>/ с файлами сегментов
+# seg_NNNNNN.bin (каждый — таблица в двоичном формате, см. binary.py)
+# и манифестом manifest.json:
+#   {"segment_rows": ..., "next_file": ...,
+#    "segments": [{"file": ..., "rows": ..., "min": {...}, "max": {...}}]}
+# Сегмент — диапазон ID: от своего min ID до min ID следующего сегмента.
+# min/max по int- и str-столбцам (зоны) позволяют просмотру пропускать
+# сегменты, а свёртке журнала — переписывать только изменённые сегменты.
+MANIFEST = "manifest.json"
+
+# сколько строк пишется в один сегмент
+SEGMENT_ROWS = 65536
+
+
+def set_segment_rows(rows: int) -> None:
+    global SEGMENT_ROWS
+    SEGMENT_ROWS = rows
+
+
+class ChainedColumn:
+    """
+    Столбец только для чтения, сцепленный из столбцов сегментов.
+    starts — позиция первой строки каждого сегмента.
+    """
+
+    def __init__(self, parts: list, starts: list[int]):
+        self.parts = parts
+        self.starts = starts
+        self.size = starts[-1] + len(parts[-1])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, pos: int):
+        if pos < 0:
+            pos += self.size
+        if not 0 <= pos < self.size:
+            raise IndexError(pos)
+        part = bisect_right(self.starts, pos) - 1
+        return self.parts[part][pos - self.starts[part]]
+
+    def __iter__(self):
+        return chain.from_iterable(self.parts)
+
+    def range(self, start: int, stop: int):
+        """Значения на позициях start..stop — только из нужных сегментов."""
+        first = max(bisect_right(self.starts, start) - 1, 0)
+        last = bisect_left(self.starts, stop)
+        return chain.from_iterable(
+            column_range(
+                self.parts[part],
+                max(start - self.starts[part], 0),
+                stop - self.starts[part],
+            )
+            for part in range(first, last)
+        )
+
+
+def _read_manifest(path: Path) -> dict:
+    with path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _zone(data: TableData, start: int, stop: int) -> tuple[dict, dict]:
+    """min/max int- и str-столбцов на позициях start..stop."""
+    minimum, maximum = {}, {}
+    for name, type_name in data.schema.items():
+        if type_name == "bool":
+            continue
+        values = list(column_range(data.columns[name], start, stop))
+        minimum[name], maximum[name] = min(values), max(values)
+    return minimum, maximum
+
+
+def _part(data: TableData, start: int, stop: int) -> TableData:
+    """Строки start..stop отдельной таблицей (содержимое одного сегмента)."""
+    columns = {}
+    for name, type_name in data.schema.items():
+        values = column_range(data.columns[name], start, stop)
+        if type_name == "int":
+            columns[name] = array("q", values)
+        elif type_name == "bool":
+            columns[name] = bytearray(values)
+        else:
+            columns[name] = list(values)
+    part = TableData.from_columns(data.schema, columns, stop - start)
+    part.ids_sorted = data.ids_sorted
+    return part
+
+
+def _bounds(data: TableData, segments: list[dict]) -> list[tuple[int, int]]:
+    """
+    Позиции строк каждого сегмента манифеста в таблице data,
+    отсортированной по ID: от его min ID до min ID следующего.
+    """
+    ids, size = data.columns["ID"], len(data)
+    starts = [0] + [
+        bisect_left(ids, segment["min"]["ID"], 0, size) for segment in segments[1:]
+    ]
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def write_segmented(
+    directory: Path, data: TableData, dirty_ids: set[int] | None = None
+) -> int:
+    """
+    Записывает таблицу сегментами. Если известны ID изменённых строк
+    (dirty_ids) и уже есть манифест, переписываются только сегменты,
+    в диапазоны ID которых попали изменения; новые строки в конце
+    таблицы дописываются в последний сегмент или в новые. Иначе
+    таблица переписывается целиком. Новые сегменты пишутся в новые
+    файлы, манифест подменяется атомарно, и только потом стираются
+    файлы, на которые он больше не ссылается.
+    Возвращает число записанных байт.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST
+    old = _read_manifest(manifest_path) if manifest_path.exists() else None
+    next_file = 0 if old is None else old["next_file"]
+    size = len(data)
+
+    if old is None or dirty_ids is None or not data.ids_sorted or not old["segments"]:
+        plan = [(None, 0, size)]
+    else:
+        segments = old["segments"]
+        lows = [segment["min"]["ID"] for segment in segments]
+        dirty = {max(bisect_right(lows, row_id) - 1, 0) for row_id in dirty_ids}
+        plan = []
+        for number, (segment, (start, stop)) in enumerate(
+            zip(segments, _bounds(data, segments))
+        ):
+            if number in dirty or stop - start != segment["rows"]:
+                plan.append((None, start, stop))
+            else:
+                plan.append((segment, start, stop))
+
+    written = 0
+    new_segments, zones = [], []
+    for segment, start, stop in plan:
+        if segment is not None:
+            new_segments.append(segment)
+            zones.append(
+                {"start": start, "stop": stop,
+                 "min": segment["min"], "max": segment["max"]}
+            )
+            continue
+        # изменённый диапазон режется на сегменты по SEGMENT_ROWS строк;
+        # опустевший сегмент просто исчезает из манифеста
+        for part_start in range(start, stop, SEGMENT_ROWS):
+            part_stop = min(part_start + SEGMENT_ROWS, stop)
+            name = f"seg_{next_file:06d}.bin"
+            next_file += 1
+            path = directory / name
+            write_binary(path, _part(data, part_start, part_stop))
+            written += path.stat().st_size
+            minimum, maximum = _zone(data, part_start, part_stop)
+            new_segments.append(
+                {"file": name, "rows": part_stop - part_start,
+                 "min": minimum, "max": maximum}
+            )
+            zones.append(
+                {"start": part_start, "stop": part_stop,
+                 "min": minimum, "max": maximum}
+            )
+
+    manifest = {
+        "segment_rows": SEGMENT_ROWS,
+        "next_file": next_file,
+        "segments": new_segments,
+    }
+    with atomic_open(manifest_path, "w") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    written += manifest_path.stat().st_size
+
+    referenced = {segment["file"] for segment in new_segments}
+    for path in directory.glob("seg_*.bin"):
+        if path.name not in referenced:
+            path.unlink()
+    sync(directory)
+
+    # зоны годятся и для таблицы в памяти: её строки лежат в том же порядке
+    data.zones = zones
+    return written
+
+
+def open_segmented(
+    directory: Path, schema: dict[str, str] | None = None, name: str = ""
+) -> TableData:
+    """
+    Открывает сегментированную таблицу: каждый сегмент — через mmap,
+    столбцы сегментов сцепляются в ChainedColumn. Статистика таблицы
+    и зоны берутся из манифеста.
+    """
+    manifest = _read_manifest(directory / MANIFEST)
+    segments = manifest["segments"]
+    parts = [
+        open_binary(directory / segment["file"], schema, name)
+        for segment in segments
+    ]
+    if not parts:
+        return TableData(schema or {"ID": "int"}, name=name)
+
+    starts = [0]
+    for part in parts[:-1]:
+        starts.append(starts[-1] + len(part))
+    file_schema = parts[0].schema
+    if len(parts) == 1:
+        columns = dict(parts[0].columns)
+    else:
+        columns = {
+            column: ChainedColumn([part.columns[column] for part in parts], starts)
+            for column in file_schema
+        }
+
+    table_data = TableData.from_columns(
+        file_schema, columns, starts[-1] + len(parts[-1]), name
+    )
+    table_data.ids_sorted = all(part.ids_sorted for part in parts) and all(
+        left["max"]["ID"] < right["min"]["ID"]
+        for left, right in zip(segments, segments[1:])
+    )
+    table_data.zones = [
+        {"start": start, "stop": start + segment["rows"],
+         "min": segment["min"], "max": segment["max"]}
+        for start, segment in zip(starts, segments)
+    ]
+    ints = [column for column, type_name in file_schema.items() if type_name == "int"]
+    table_data._stats = {
+        "min": {c: min(s["min"][c] for s in segments) for c in ints},
+        "max": {c: max(s["max"][c] for s in segments) for c in ints},
+    }
+    # mmap сегментов должны жить, пока на них ссылаются столбцы
+    table_data.source = [part.source for part in parts]
+    return table_data
@@ -0,0 +1,230 @@
+# src/primitive_db/server.py
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shlex
+import signal
+from concurrent.futures import ThreadPoolExecutor
+
+from . import locks, output
+from .buffer import TableBuffer
+from .decorators import set_auto_confirm
+from .engine import META_FILE, execute, lock_plan
+from .parallel import set_parallel
+from .utils import recover_trash
+
+# Протокол: по одному запросу на строку, по одному ответу на строку.
+# Запрос — команда в той же грамматике, что и в REPL, либо JSON:
+#   {"id": 1, "command": "select from users where age > 30", "output": "jsonl"}
+# Ответ — JSON: {"id": 1, "ok": true, "output": "<напечатанный текст>"}.
+# Запросы одного соединения можно слать, не дожидаясь ответов
+# (конвейером): ответы приходят в том же порядке.
+# JSON-запрос не зависит от состояния соединения: режим вывода — его
+# "output" или режим сервера по умолчанию, а команда output действует
+# только на этот запрос (клиент раздаёт соединения из пула кому угодно).
+# Режим соединения помнят только запросы-строки, как в REPL.
+
+# наибольшая длина строки запроса (insert с множеством строк бывает длинным)
+MAX_REQUEST = 64 * 1024 * 1024
+
+
+class Server:
+    """
+    Сервер держит таблицы в памяти (TableBuffer) между запросами всех
+    клиентов. Команды всех соединений выполняются по одной в отдельном
+    потоке (executor): буфер таблиц, метаданные, кэш и режим вывода общие
+    и однопоточные, поэтому выполнение сериализовано целиком, а не по
+    таблицам, и долгий просмотр задерживает команды других таблиц.
+    Цикл событий тем временем принимает соединения и запросы.
+
+    Блокировки файлов берутся как обычно, так что с теми же данными
+    могут работать и отдельные процессы database. Таблицу, занятую
+    другим процессом, сервер ждёт в цикле событий (см. run): поток
+    команд в это время выполняет команды по другим таблицам.
+    """
+
+    def __init__(self):
+        # запись сразу после команды: другие процессы видят изменения
+        self.buffer = TableBuffer(flush_every=1)
+        # один поток: команды не должны выполняться одновременно
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.requests = 0
+        self.connections = 0
+
+    async def run(self, command: str, mode: str) -> tuple[str, str, bool]:
+        """
+        Выполняет команду в потоке команд. Если её таблица занята другим
+        процессом, ждёт (не дольше LOCK_TIMEOUT) здесь, в цикле событий,
+        и повторяет попытку — поток не простаивает на блокировке.
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        delay = 0.001
+        waited = False
+        while True:
+            result, busy = await loop.run_in_executor(
+                self.executor, self.run_command, command, mode
+            )
+            elapsed = loop.time() - start
+            if busy is None:
+                if waited:
+                    locks.record_wait(elapsed, False)
+                return result
+            if elapsed >= locks.LOCK_TIMEOUT:
+                locks.record_wait(elapsed, True)
+                text = (f'Ошибка: Таблица "{busy}" занята другим процессом '
+                        f"дольше {locks.LOCK_TIMEOUT:g} с.\n")
+                return text, mode, True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+            waited = True
+
+    def run_command(
+        self, command: str, mode: str
+    ) -> tuple[tuple[str, str, bool] | None, str | None]:
+        """
+        Выполняет команду, если её таблицы свободны. Возвращает
+        ((вывод, режим вывода соединения, оставить ли соединение открытым),
+        None) или (None, имя занятой таблицы).
+        """
+        if command.split(None, 1)[:1] == ["begin"]:
+            # буфер таблиц общий для всех соединений: транзакция одного
+            # клиента захватила бы команды остальных
+            text = "Транзакции в режиме сервера не поддерживаются.\n"
+            return (text, mode, True), None
+
+        try:
+            args = shlex.split(command)
+            table_names, exclusive = lock_plan(args, command) if args else ([], False)
+        except ValueError:
+            # ошибку разбора выведет сама команда
+            table_names, exclusive = [], False
+        # блокировки берутся здесь без ожидания; execute увидит их взятыми
+        acquired, busy = self.buffer.locks.try_acquire(table_names, exclusive)
+        if busy is not None:
+            return None, busy
+
+        out = io.StringIO()
+        saved_mode = output.OUTPUT_MODE
+        output.OUTPUT_MODE = mode
+        try:
+            with contextlib.redirect_stdout(out):
+                keep_open = execute(command, self.buffer)
+            # команда output меняет режим только этого соединения
+            mode = output.OUTPUT_MODE
+        finally:
+            output.OUTPUT_MODE = saved_mode
+            for table_name in acquired:
+                self.buffer.locks.release(table_name)
+        self.requests += 1
+        return (out.getvalue(), mode, keep_open), None
+
+    async def handle(self, reader, writer) -> None:
+        self.connections += 1
+        default_mode = output.OUTPUT_MODE
+        # режим вывода запросов-строк этого соединения (команда output)
+        mode = default_mode
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    break
+                if not line:
+                    break
+
+                request_id, command, request_mode = None, line.decode("utf-8"), None
+                is_json = command.lstrip().startswith("{")
+                if is_json:
+                    try:
+                        request = json.loads(command)
+                        request_id = request.get("id")
+                        command = request["command"]
+                        request_mode = request.get("output")
+                    except (ValueError, KeyError, AttributeError) as e:
+                        response = {"id": None, "ok": False, "output": f"{e}\n"}
+                        writer.write(_encode(response))
+                        await writer.drain()
+                        continue
+
+                if request_mode is not None and request_mode not in output.OUTPUT_MODES:
+                    text = f"Неизвестный режим вывода: {request_mode}\n"
+                    keep_open, ok = True, False
+                else:
+                    try:
+                        if is_json:
+                            text, _, keep_open = await self.run(
+                                command, request_mode or default_mode
+                            )
+                        else:
+                            text, mode, keep_open = await self.run(command, mode)
+                        ok = True
+                    except Exception as e:  # сервер не должен падать от запроса
+                        text, keep_open, ok = f"Ошибка: {e}\n", True, False
+
+                writer.write(_encode({"id": request_id, "ok": ok, "output": text}))
+                await writer.drain()
+                if not keep_open:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+
+def _encode(response: dict) -> bytes:
+    return (json.dumps(response, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _serve(socket_path: str | None, host: str, port: int | None) -> None:
+    server = Server()
+    recover_trash(server.buffer.load_metadata(META_FILE))
+
+    if socket_path is not None:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(socket_path)
+        listener = await asyncio.start_unix_server(
+            server.handle, path=socket_path, limit=MAX_REQUEST
+        )
+        where = socket_path
+    else:
+        listener = await asyncio.start_server(
+            server.handle, host=host, port=port, limit=MAX_REQUEST
+        )
+        where = f"{host}:{port}"
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Сервер слушает {where}. Остановка: Ctrl+C.")
+    try:
+        async with listener:
+            await stop.wait()
+    finally:
+        # после команды, которая ещё выполняется в потоке сервера
+        await loop.run_in_executor(server.executor, server.buffer.flush_all)
+        server.executor.shutdown()
+        if socket_path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(socket_path)
+        print(f"Сервер остановлен. Обработано запросов: {server.requests}.")
+
+
+def serve(socket_path: str | None = None, host: str = "127.0.0.1", port=None) -> None:
+    """database serve --socket PATH | --port N"""
+    if (socket_path is None) == (port is None):
+        raise ValueError("Укажите ровно одно из --socket и --port.")
+    # у сервера нет терминала для вопросов: подтверждает сам запрос
+    set_auto_confirm(True)
+    # fork процесса с потоками (цикл событий и executor) небезопасен:
+    # в сервере просмотр не делится между процессами
+    set_parallel(workers=1)
+    asyncio.run(_serve(socket_path, host, port))
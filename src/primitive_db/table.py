@@ -0,0 +1,474 @@
+# src/primitive_db/table.py
+
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import count, islice
+
+from .indexes import build_index
+
+# общий счётчик версий: у каждой загрузки и каждого изменения таблицы
+# своя версия, поэтому по (имя, версия) можно кэшировать результаты запросов
+_versions = count(1)
+
+
+def _new_column(type_name: str):
+    """
+    Создаёт пустой столбец для типа type_name:
+    int -> array('q'), bool -> bytearray, str -> список интернированных строк.
+    """
+    if type_name == "int":
+        return array("q")
+    if type_name == "bool":
+        return bytearray()
+    return []
+
+
+def column_range(column, start: int, stop: int):
+    """
+    Значения столбца на позициях start..stop. Срез memoryview не копирует
+    данные; у сцепленных столбцов сегментов есть свой range, остальные
+    (строки поверх mmap) перебираются с пропуском.
+    """
+    if start == 0 and stop >= len(column):
+        return iter(column)
+    if isinstance(column, (memoryview, array, bytearray, list)):
+        return iter(column[start:stop])
+    if hasattr(column, "range"):
+        return column.range(start, stop)
+    return islice(column, start, stop)
+
+
+def _encode(type_name: str, value):
+    """Приводит значение к виду, в котором оно лежит в столбце."""
+    if type_name == "int":
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Ожидалось целое число: {value!r}")
+        if not -(2**63) <= value < 2**63:
+            raise ValueError(f"Число не помещается в 64 бита: {value}")
+        return value
+    if type_name == "bool":
+        return 1 if value else 0
+    return sys.intern(str(value))
+
+
+def infer_schema(row: dict) -> dict[str, str]:
+    """Угадывает схему по одной строке (для таблиц без метаданных)."""
+    schema: dict[str, str] = {}
+    for name, value in row.items():
+        if isinstance(value, bool):
+            schema[name] = "bool"
+        elif isinstance(value, int):
+            schema[name] = "int"
+        else:
+            schema[name] = "str"
+    return schema
+
+
+class TableData:
+    """
+    Таблица в памяти по столбцам: int хранится в array('q'),
+    bool — в bytearray, str — в списке интернированных строк.
+    Наружу строки отдаются как словари (итерация, row(pos)).
+
+    Все изменения идут через методы класса, чтобы каждая мутация
+    попадала в журнал (для data/<таблица>.log) и в индексы.
+
+    Столбцы могут быть и только для чтения (например, memoryview поверх
+    mmap двоичного файла) — перед первым изменением они копируются
+    в обычные array/bytearray/list.
+
+    zones — зоны сегментированной таблицы: [{"start", "stop", "min",
+    "max"}] по позициям строк, чтобы просмотр пропускал сегменты, которые
+    не могут подойти под условие. Строки, вставленные после загрузки,
+    попадают в хвостовую зону без min/max; обновление и удаление
+    сбрасывают зоны.
+    """
+
+    def __init__(self, schema: dict[str, str], rows=(), name: str = ""):
+        self.name = name
+        self.version = next(_versions)
+        self.schema = dict(schema)
+        self.columns = {name: _new_column(typ) for name, typ in self.schema.items()}
+        self.journal: list[dict] = []
+        self.indexes: dict = {}
+        self.storage = "json"
+        # кодек и уровень сжатия для формата compressed (из метаданных)
+        self.compression: dict | None = None
+        self.source = None
+        self.ids_sorted = True
+        self.zones: list[dict] | None = None
+        self._size = 0
+        self._mutable = True
+        # min/max int-столбцов; None — пересчитать при следующем запросе
+        self._stats: dict | None = None
+        for row in rows:
+            self._append(row)
+        if not self._size:
+            # у пустой таблицы статистика известна, вставки её дополнят
+            self._stats = {"min": {}, "max": {}}
+
+    @classmethod
+    def from_columns(
+        cls, schema: dict[str, str], columns: dict, size: int, name: str = ""
+    ):
+        """
+        Создаёт таблицу поверх готовых столбцов только для чтения.
+        """
+        table_data = cls(schema, name=name)
+        table_data.columns = columns
+        table_data._size = size
+        table_data._mutable = False
+        table_data._stats = None
+        return table_data
+
+    def copy(self) -> "TableData":
+        """
+        Копия таблицы вместе с журналом несохранённых изменений
+        (образ для отката транзакции). Столбцы только для чтения не
+        копируются: изменения всё равно идут в их изменяемые копии.
+        """
+        if self._mutable:
+            columns = {name: column[:] for name, column in self.columns.items()}
+        else:
+            columns = dict(self.columns)
+        table_data = TableData.from_columns(self.schema, columns, self._size, self.name)
+        table_data._mutable = self._mutable
+        table_data.source = self.source
+        table_data.storage = self.storage
+        table_data.compression = self.compression
+        table_data.ids_sorted = self.ids_sorted
+        table_data.zones = self.zones and [dict(zone) for zone in self.zones]
+        table_data.journal = list(self.journal)
+        if self._stats is not None:
+            table_data._stats = {key: dict(value) for key, value in self._stats.items()}
+        table_data.build_indexes(
+            {column: index.kind for column, index in self.indexes.items()}
+        )
+        return table_data
+
+    def _materialize(self) -> None:
+        """Копирует столбцы только для чтения в изменяемые."""
+        if self._mutable:
+            return
+        for name, column in self.columns.items():
+            if isinstance(column, (array, bytearray, list)):
+                # столбец уже изменяемый (например, распакованный из сжатого)
+                continue
+            type_name = self.schema[name]
+            if type_name == "int" and isinstance(column, memoryview):
+                values = array("q")
+                values.frombytes(column.cast("B"))
+            elif type_name == "int":
+                # столбец, сцепленный из сегментов
+                values = array("q", column)
+            elif type_name == "bool":
+                values = bytearray(column)
+            else:
+                values = [sys.intern(value) for value in column]
+            self.columns[name] = values
+        self.source = None
+        self._mutable = True
+
+    # ===== чтение =====
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for pos in range(self._size):
+            yield self.row(pos)
+
+    def __getitem__(self, pos: int) -> dict:
+        if pos < 0:
+            pos += self._size
+        if not 0 <= pos < self._size:
+            raise IndexError(pos)
+        return self.row(pos)
+
+    def row(self, pos: int, columns=None) -> dict:
+        """
+        Собирает строку с позиции pos в словарь: все столбцы или только
+        columns (остальные не читаются и не декодируются).
+        """
+        names = self.columns if columns is None else columns
+        return {name: self.value(name, pos) for name in names}
+
+    def value(self, name: str, pos: int):
+        """Значение столбца name в строке pos."""
+        value = self.columns[name][pos]
+        return bool(value) if self.schema[name] == "bool" else value
+
+    def nbytes(self) -> int:
+        """
+        Примерный объём памяти, занятый столбцами таблицы.
+        Столбцы поверх mmap не считаются: их страницы принадлежат кэшу ОС.
+        """
+        total = 0
+        for name, column in self.columns.items():
+            if hasattr(column, "codes"):
+                # столбец со словарём: номера и сами различные строки
+                total += len(column.codes) * column.codes.itemsize
+                column = column.values
+            if isinstance(column, list):
+                sample = column[:100]
+                avg = sum(map(sys.getsizeof, sample)) // len(sample) if sample else 0
+                total += len(column) * (8 + avg)
+            elif isinstance(column, array):
+                total += len(column) * column.itemsize
+            elif isinstance(column, bytearray):
+                total += len(column)
+        return total
+
+    def column_values(self, name: str):
+        """Значения столбца в исходных типах (bool для bool-столбцов)."""
+        column = self.columns[name]
+        if self.schema[name] == "bool":
+            return (bool(value) for value in column)
+        return iter(column)
+
+    def position(self, row_id: int) -> int | None:
+        """
+        Позиция строки с данным ID. ID выдаются по возрастанию,
+        поэтому столбец ID отсортирован и поиск идёт бинарный.
+        """
+        ids = self.columns["ID"]
+        if not self.ids_sorted:
+            # данные старых версий могли лежать не по порядку ID
+            for pos, value in enumerate(ids):
+                if value == row_id:
+                    return pos
+            return None
+
+        pos = bisect_left(ids, row_id, 0, self._size)
+        if pos < self._size and ids[pos] == row_id:
+            return pos
+        return None
+
+    def positions_by_ids(self, ids: list[int]) -> list[int]:
+        """Позиции строк с указанными ID (для поиска по индексу)."""
+        result = []
+        for row_id in ids:
+            pos = self.position(row_id)
+            if pos is not None:
+                result.append(pos)
+        return result
+
+    def stats_known(self) -> bool:
+        """Известны ли min/max без прохода по столбцам (см. stats)."""
+        return self._stats is not None
+
+    def stats(self) -> dict:
+        """
+        Статистика таблицы: {"rows": N, "min": {столбец: v}, "max": {...}}
+        по int-столбцам. Вставки обновляют её на ходу, обновления и удаления
+        сбрасывают, и тогда она пересчитывается одним проходом по столбцам
+        при следующем вызове.
+        """
+        if self._stats is None:
+            minimum: dict[str, int] = {}
+            maximum: dict[str, int] = {}
+            if self._size:
+                for name, type_name in self.schema.items():
+                    if type_name != "int":
+                        continue
+                    column = self.columns[name]
+                    if name == "ID" and self.ids_sorted:
+                        minimum[name], maximum[name] = column[0], column[-1]
+                    else:
+                        minimum[name], maximum[name] = min(column), max(column)
+            self._stats = {"min": minimum, "max": maximum}
+        return {
+            "rows": self._size,
+            "min": dict(self._stats["min"]),
+            "max": dict(self._stats["max"]),
+        }
+
+    def _extend_stats(self, values: dict[str, list]) -> None:
+        """Учитывает в статистике добавленные значения столбцов."""
+        if self._stats is None:
+            return
+        minimum, maximum = self._stats["min"], self._stats["max"]
+        for name, type_name in self.schema.items():
+            if type_name != "int" or not values[name]:
+                continue
+            low, high = min(values[name]), max(values[name])
+            minimum[name] = low if name not in minimum else min(minimum[name], low)
+            maximum[name] = high if name not in maximum else max(maximum[name], high)
+
+    def build_indexes(self, index_defs: dict[str, str]) -> None:
+        """
+        Строит индексы по определениям {столбец: тип} из метаданных.
+        Дальше индексы поддерживаются каждой мутацией инкрементально.
+        """
+        self.indexes = {
+            column: build_index(
+                kind, column, self.column_values(column), self.columns["ID"]
+            )
+            for column, kind in index_defs.items()
+            if column in self.columns
+        }
+
+    # ===== изменения =====
+
+    def _append(self, row: dict) -> None:
+        ids = self.columns["ID"]
+        if self._size and row["ID"] <= ids[self._size - 1]:
+            self.ids_sorted = False
+        # сначала кодируем все значения, чтобы ошибка не оставила
+        # столбцы разной длины
+        encoded = [_encode(self.schema[name], row[name]) for name in self.columns]
+        for column, value in zip(self.columns.values(), encoded):
+            column.append(value)
+        self._size += 1
+
+    def _grow_zones(self, count: int) -> None:
+        """Относит count строк, дописанных в конец, к хвостовой зоне."""
+        if not self.zones:
+            return
+        tail = self.zones[-1]
+        if tail["min"]:
+            tail = {"start": tail["stop"], "stop": tail["stop"], "min": {}, "max": {}}
+            self.zones.append(tail)
+        tail["stop"] += count
+
+    def append_row(self, row: dict) -> None:
+        """Добавляет строку и записывает вставку в журнал."""
+        self._materialize()
+        self.version = next(_versions)
+        self._append(row)
+        self._grow_zones(1)
+        self._extend_stats({name: [row[name]] for name in self.columns})
+        for column, index in self.indexes.items():
+            index.add(row[column], row["ID"])
+        self.journal.append({"op": "insert", "row": dict(row)})
+
+    def append_columns(self, values: dict[str, list]) -> None:
+        """
+        Добавляет сразу несколько строк, заданных по столбцам:
+        {столбец: [значения]}. Значения кодируются и дописываются
+        в массивы столбцов целиком, а не построчно.
+        """
+        count = len(values["ID"])
+        if not count:
+            return
+
+        # сначала кодируем всё, чтобы ошибка не оставила столбцы разной длины
+        encoded = {}
+        for name in self.columns:
+            column_values = values[name]
+            if len(column_values) != count:
+                raise ValueError(f"Неполный столбец {name} во вставке.")
+            type_name = self.schema[name]
+            encoded[name] = [_encode(type_name, value) for value in column_values]
+
+        self._materialize()
+        self.version = next(_versions)
+        new_ids = encoded["ID"]
+        if self._size and new_ids[0] <= self.columns["ID"][self._size - 1] or any(
+            a >= b for a, b in zip(new_ids, new_ids[1:])
+        ):
+            self.ids_sorted = False
+
+        for name, column in self.columns.items():
+            column.extend(encoded[name])
+        self._size += count
+        self._grow_zones(count)
+        self._extend_stats(encoded)
+
+        for column, index in self.indexes.items():
+            index.add_many(values[column], new_ids)
+
+        names = list(self.columns)
+        for row_values in zip(*(values[name] for name in names)):
+            self.journal.append({"op": "insert", "row": dict(zip(names, row_values))})
+
+    def _set(self, pos: int, changes: dict) -> None:
+        row_id = self.columns["ID"][pos]
+        for name, value in changes.items():
+            encoded = _encode(self.schema[name], value)
+            index = self.indexes.get(name)
+            if index is not None:
+                index.remove(self.value(name, pos), row_id)
+                index.add(value, row_id)
+            self.columns[name][pos] = encoded
+
+    def update_rows(self, positions: list[int], changes: dict) -> None:
+        """Применяет changes к строкам на позициях positions."""
+        if not positions:
+            return
+        for name, value in changes.items():
+            _encode(self.schema[name], value)
+        self._materialize()
+        self.version = next(_versions)
+        self.zones = None
+        if any(self.schema[name] == "int" for name in changes):
+            self._stats = None
+        for pos in positions:
+            self._set(pos, changes)
+        ids = self.columns["ID"]
+        self.journal.append(
+            {"op": "update", "ids": [ids[pos] for pos in positions], "set": changes}
+        )
+
+    def _compact(self, dead: set[int]) -> None:
+        """Физически убирает строки с позиций dead из всех столбцов."""
+        for name, column in self.columns.items():
+            kept = (value for pos, value in enumerate(column) if pos not in dead)
+            if isinstance(column, array):
+                self.columns[name] = array(column.typecode, kept)
+            elif isinstance(column, bytearray):
+                self.columns[name] = bytearray(kept)
+            else:
+                self.columns[name] = list(kept)
+        self._size -= len(dead)
+        self._stats = None
+
+    def delete_rows(self, positions: list[int]) -> None:
+        """Удаляет строки на позициях positions."""
+        if not positions:
+            return
+        self._materialize()
+        self.version = next(_versions)
+        self.zones = None
+        ids = self.columns["ID"]
+        deleted_ids = sorted(ids[pos] for pos in positions)
+        for column, index in self.indexes.items():
+            for pos in positions:
+                index.remove(self.value(column, pos), ids[pos])
+        self._compact(set(positions))
+        self.journal.append({"op": "delete", "ids": deleted_ids})
+
+    def replay(self, records: list[dict]) -> None:
+        """
+        Накатывает записи журнала на снимок таблицы.
+        Повторное применение тех же записей ничего не меняет,
+        поэтому снимок и журнал можно пересохранять без риска.
+        """
+        if not records:
+            return
+        self._materialize()
+        self.version = next(_versions)
+        self.zones = None
+        self._stats = None
+        dead: set[int] = set()
+
+        for record in records:
+            op = record["op"]
+            if op == "insert":
+                row = record["row"]
+                pos = self.position(row["ID"])
+                if pos is None:
+                    self._append(row)
+                else:
+                    self._set(pos, row)
+                    dead.discard(pos)
+            elif op == "update":
+                for pos in self.positions_by_ids(record["ids"]):
+                    if pos not in dead:
+                        self._set(pos, record["set"])
+            elif op == "delete":
+                dead.update(self.positions_by_ids(record["ids"]))
+
+        if dead:
+            self._compact(dead)
@@ -1,54 +1,369 @@
 # src/primitive_db/utils.py
 
 import json
+import os
+import shutil
 from pathlib import Path
 
+from . import metrics
+from .binary import open_binary, write_binary
+from .compressed import open_compressed, write_compressed
+from .durability import atomic_open, sync
+from .segments import MANIFEST, open_segmented, write_segmented
+from .table import TableData, infer_schema
+
 
 def load_metadata(filepath: str) -> dict:
     """
     Загружает данные из JSON-файла.
     Если файл не найден, возвращает пустой словарь {}.
+    Описания таблиц в старом формате ({столбец: тип})
+    приводятся к виду {"columns": {...}, "indexes": {...}}.
     """
     try:
         with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
+            metadata = json.load(f)
     except FileNotFoundError:
         return {}
 
+    for table_name, table_meta in metadata.items():
+        if not isinstance(table_meta.get("columns"), dict):
+            metadata[table_name] = {"columns": table_meta, "indexes": {}}
+    return metadata
+
 
 def save_metadata(filepath: str, data: dict) -> None:
     """
     Сохраняет переданные данные в JSON-файл.
+    Файл подменяется атомарно: после сбоя остаются либо старые,
+    либо новые метаданные целиком.
     """
-    with open(filepath, "w", encoding="utf-8") as f:
+    with atomic_open(Path(filepath), "w") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
         
         
 DATA_DIR = Path("data")
 
+# минимальный размер журнала (в байтах), при котором он сворачивается в снимок
+LOG_COMPACT_THRESHOLD = 1024 * 1024
+
+# форматы снимка таблицы и расширения их файлов;
+# segmented — каталог data/<таблица>/ с манифестом и сегментами
+STORAGE_FORMATS = {
+    "json": ".json",
+    "binary": ".bin",
+    "compressed": ".zbin",
+    "segmented": f"/{MANIFEST}",
+}
+
+# сюда переносятся файлы удаляемой таблицы до записи метаданных
+TRASH_DIR = DATA_DIR / ".trash"
+
+
+def snapshot_path(table_name: str, fmt: str) -> Path:
+    """Путь к снимку таблицы в формате fmt."""
+    return DATA_DIR / f"{table_name}{STORAGE_FORMATS[fmt]}"
+
+
+def log_path(table_name: str) -> Path:
+    """Путь к журналу изменений таблицы."""
+    return DATA_DIR / f"{table_name}.log"
 
-def load_table_data(table_name: str) -> list[dict]:
+
+def _remove(path: Path) -> None:
+    """Удаляет снимок; у сегментированного — весь каталог сегментов."""
+    if path.name == MANIFEST:
+        shutil.rmtree(path.parent)
+    else:
+        path.unlink()
+
+
+def table_files(table_name: str) -> list[Path]:
     """
-    Загружает данные таблицы из файла data/<table_name>.json.
-    Если файла нет, возвращает пустой список [].
+    Возвращает все файлы, в которых может храниться таблица:
+    снимки во всех форматах и журнал data/<table_name>.log.
     """
-    DATA_DIR.mkdir(exist_ok=True)
+    snapshots = [snapshot_path(table_name, fmt) for fmt in STORAGE_FORMATS]
+    return snapshots + [log_path(table_name)]
 
-    table_path = DATA_DIR / f"{table_name}.json"
-    if not table_path.exists():
+
+def _read_log(path: Path) -> list[dict]:
+    """
+    Читает журнал изменений (одна JSON-запись на строку).
+    Недописанная последняя строка (сбой во время записи) пропускается;
+    перед следующей записью её обрезает save_table_data.
+    Запись {"op": "batch", "records": [...]} — изменения одной транзакции
+    одной строкой: они применяются либо все, либо (если строка
+    недописана) ни одно.
+    """
+    if not path.exists():
         return []
 
-    with table_path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    records: list[dict] = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            record = json.loads(line)
+            if record["op"] == "batch":
+                records.extend(record["records"])
+            else:
+                records.append(record)
+    return records
+
 
+def load_table_data(table_name: str, table_meta: dict | None = None) -> TableData:
+    with metrics.timed("load"):
+        return _load_table_data(table_name, table_meta)
 
-def save_table_data(table_name: str, data: list[dict]) -> None:
+
+def _load_table_data(table_name: str, table_meta: dict | None) -> TableData:
     """
-    Сохраняет данные таблицы в файл data/<table_name>.json.
+    Загружает данные таблицы: снимок (data/<table_name>.json или,
+    для формата "binary", data/<table_name>.bin через mmap, для
+    "segmented" — сегменты из data/<table_name>/ через mmap, для
+    "compressed" — сжатый data/<table_name>.zbin)
+    плюс изменения из журнала data/<table_name>.log.
+    Если передано описание таблицы из метаданных, строит её индексы.
+    Если файлов нет, возвращает пустую таблицу.
     """
     DATA_DIR.mkdir(exist_ok=True)
 
-    table_path = DATA_DIR / f"{table_name}.json"
-    with table_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    fmt = "json" if table_meta is None else table_meta.get("format", "json")
+    table_path = snapshot_path(table_name, fmt)
+    records = _read_log(log_path(table_name))
+    for path in (table_path, log_path(table_name)):
+        if path.exists():
+            metrics.count("bytes_read", path.stat().st_size)
+
+    if fmt == "binary" and table_path.exists():
+        schema = None if table_meta is None else table_meta["columns"]
+        table_data = open_binary(table_path, schema, table_name)
+    elif fmt == "segmented" and table_path.exists():
+        schema = None if table_meta is None else table_meta["columns"]
+        table_data = open_segmented(table_path.parent, schema, table_name)
+    elif fmt == "compressed" and table_path.exists():
+        schema = None if table_meta is None else table_meta["columns"]
+        table_data = open_compressed(table_path, schema, table_name)
+    else:
+        rows: list[dict] = []
+        if fmt == "json" and table_path.exists():
+            with table_path.open("r", encoding="utf-8") as f:
+                rows = json.load(f)
+
+        if table_meta is not None:
+            schema = table_meta["columns"]
+        elif rows:
+            schema = infer_schema(rows[0])
+        elif records and records[0]["op"] == "insert":
+            schema = infer_schema(records[0]["row"])
+        else:
+            schema = {"ID": "int"}
+
+        table_data = TableData(schema, rows, table_name)
+        del rows
+
+    table_data.storage = fmt
+    if table_meta is not None:
+        table_data.compression = table_meta.get("compression")
+    table_data.replay(records)
+    if table_meta is not None:
+        table_data.build_indexes(table_meta.get("indexes", {}))
+    return table_data
+
+
+def save_table_data(
+    table_name: str, data: list[dict], atomic: bool = False
+) -> None:
+    """
+    Сохраняет изменения таблицы.
+    Для TableData в журнал дописываются только новые записи, и стоимость
+    сохранения зависит от размера изменения, а не от размера таблицы.
+    Если atomic, все записи пишутся одной строкой-пачкой (коммит
+    транзакции): после сбоя они либо все на диске, либо ни одной.
+    Обычный список сохраняется целиком как новый снимок.
+    """
+    if not isinstance(data, TableData):
+        compact_table(table_name, data)
+        return
+
+    if not data.journal:
+        return
+
+    DATA_DIR.mkdir(exist_ok=True)
+
+    path = log_path(table_name)
+    records = data.journal
+    if atomic and len(records) > 1:
+        records = [{"op": "batch", "records": records}]
+    with metrics.timed("save"):
+        written = 0
+        with path.open("a+b") as f:
+            if _trim_partial_line(f):
+                # обрезка должна дойти до диска раньше новых записей
+                sync(path)
+            for record in records:
+                line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+                f.write(line)
+                written += len(line)
+        metrics.count("bytes_written", written)
+        sync(path)
+    data.journal.clear()
+
+    # журнал сворачивается, когда он больше порога и не меньше снимка:
+    # так при массовой загрузке снимок переписывается O(log n) раз, а не
+    # каждые LOG_COMPACT_THRESHOLD байт
+    log_size = path.stat().st_size
+    table_path = snapshot_path(table_name, data.storage)
+    snapshot_size = table_path.stat().st_size if table_path.exists() else 0
+    if log_size >= max(LOG_COMPACT_THRESHOLD, snapshot_size):
+        compact_table(table_name, data)
+
 
+def _trim_partial_line(f) -> bool:
+    """
+    Обрезает журнал до последнего полного "\n": недописанная строка
+    (сбой во время записи) иначе склеилась бы со следующей записью,
+    и журнал перестал бы читаться. True, если что-то обрезано.
+    """
+    size = f.seek(0, os.SEEK_END)
+    if not size:
+        return False
+    f.seek(size - 1)
+    if f.read(1) == b"\n":
+        return False
+
+    keep, pos = 0, size
+    while pos > 0:
+        start = max(0, pos - 65536)
+        f.seek(start)
+        newline = f.read(pos - start).rfind(b"\n")
+        if newline >= 0:
+            keep = start + newline + 1
+            break
+        pos = start
+    f.truncate(keep)
+    return True
+
+
+def write_snapshot(
+    table_name: str,
+    data,
+    fmt: str,
+    dirty_ids: set[int] | None = None,
+    compression: dict | None = None,
+) -> None:
+    """
+    Записывает таблицу в снимок формата fmt.
+    JSON пишется по строке на запись, без сборки всего списка в памяти.
+    Сегментированный снимок с известными dirty_ids переписывается
+    только в изменённых сегментах. compression — кодек и уровень для
+    формата compressed (по умолчанию — из таблицы).
+    """
+    with metrics.timed("snapshot"):
+        written = _write_snapshot(table_name, data, fmt, dirty_ids, compression)
+    metrics.count("bytes_written", written)
+
+
+def _write_snapshot(
+    table_name: str, data, fmt: str, dirty_ids, compression
+) -> int:
+    DATA_DIR.mkdir(exist_ok=True)
+
+    if fmt not in STORAGE_FORMATS:
+        raise ValueError(f"Неизвестный формат хранения: {fmt}")
+
+    path = snapshot_path(table_name, fmt)
+    if fmt in ("binary", "segmented", "compressed"):
+        if not isinstance(data, TableData):
+            schema = infer_schema(data[0]) if data else {"ID": "int"}
+            data = TableData(schema, data)
+        if fmt == "segmented":
+            return write_segmented(path.parent, data, dirty_ids)
+        if fmt == "compressed":
+            write_compressed(path, data, compression or data.compression)
+            return path.stat().st_size
+        write_binary(path, data)
+        return path.stat().st_size
+
+    with atomic_open(path, "w") as f:
+        f.write("[")
+        for i, row in enumerate(data):
+            f.write(",\n" if i else "\n")
+            f.write(json.dumps(row, ensure_ascii=False))
+        f.write("\n]\n")
+    return path.stat().st_size
+
+
+def remove_stale_files(table_name: str, fmt: str) -> None:
+    """
+    Удаляет журнал и снимки таблицы во всех форматах, кроме fmt.
+    Вызывается, когда актуальный снимок в формате fmt уже записан.
+    """
+    keep = snapshot_path(table_name, fmt)
+    for path in table_files(table_name):
+        if path != keep and path.exists():
+            _remove(path)
+
+
+def compact_table(table_name: str, data) -> None:
+    """
+    Сворачивает журнал в снимок: записывает таблицу целиком
+    в снимок её формата и удаляет data/<table_name>.log.
+    Сегментированная таблица переписывает только сегменты,
+    в которых есть строки из журнала.
+    """
+    fmt = data.storage if isinstance(data, TableData) else "json"
+    dirty_ids = None
+    if fmt == "segmented":
+        dirty_ids = set()
+        for record in _read_log(log_path(table_name)) + data.journal:
+            if record["op"] == "insert":
+                dirty_ids.add(record["row"]["ID"])
+            else:
+                dirty_ids.update(record["ids"])
+    write_snapshot(table_name, data, fmt, dirty_ids)
+    if isinstance(data, TableData):
+        data.journal.clear()
+    remove_stale_files(table_name, fmt)
+
+
+def move_to_trash(table_name: str) -> Path:
+    """
+    Первый шаг удаления таблицы: её файлы переносятся в
+    data/.trash/<table_name>. Удалённой таблица становится, когда
+    записаны метаданные без неё; после этого корзину можно стереть.
+    """
+    trash = TRASH_DIR / table_name
+    trash.mkdir(parents=True, exist_ok=True)
+    for path in table_files(table_name):
+        if path.exists():
+            # сегментированная таблица переносится каталогом
+            source = path.parent if path.name == MANIFEST else path
+            os.replace(source, trash / source.name)
+    sync(DATA_DIR)
+    return trash
+
+
+def empty_trash(trash: Path) -> None:
+    shutil.rmtree(trash, ignore_errors=True)
+    try:
+        trash.parent.rmdir()
+    except OSError:
+        # в корзине есть другие таблицы
+        pass
+
+
+def recover_trash(metadata: dict) -> None:
+    """
+    Доводит до конца удаление таблиц, прерванное сбоем: если таблица
+    ещё есть в метаданных, её файлы возвращаются из корзины, иначе
+    корзина стирается.
+    """
+    if not TRASH_DIR.exists():
+        return
+    for trash in TRASH_DIR.iterdir():
+        if trash.name in metadata:
+            for path in trash.iterdir():
+                os.replace(path, DATA_DIR / path.name)
+        empty_trash(trash)